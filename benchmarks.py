@@ -0,0 +1,791 @@
+"""
+Бенчмарки System_Shell: сравнение новых реализаций команд со старыми.
+
+Запуск: python benchmarks.py ls --entries 500000
+Набор по всем командам со сравнением с базовыми результатами:
+python benchmarks.py suite --output results.json --baseline baseline.json
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from listing import iter_listing
+from streams import write_lines
+
+
+def legacy_ls(work_dir, flag_l=False):
+    """Реализация ls до перехода на os.scandir (для сравнения)."""
+    elems = os.listdir(work_dir)
+    if not flag_l:
+        print("\n".join(elems))
+    else:
+        for elem in elems:
+            full_path = os.path.join(work_dir, elem)
+            stat = os.stat(full_path)
+            print(
+                f"{elem} \t{stat.st_size}\t{datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')}\t{oct(stat.st_mode)[-3:]}"
+            )
+
+
+def scandir_ls(work_dir, flag_l=False, sort_by=None, limit=None):
+    write_lines(iter_listing(work_dir, flag_l, sort_by, limit))
+
+
+def make_flat_dir(root, entries):
+    for i in range(entries):
+        with open(os.path.join(root, f"file_{i:07d}.dat"), "wb") as f:
+            f.write(b"x" * (i % 512))
+
+
+def measure(func, *args, repeat=3):
+    """Возвращает лучшее время из repeat запусков и пиковую память одного запуска (в байтах)."""
+    best = float("inf")
+    real_stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(*args)
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            sys.stdout = real_stdout
+    return best, peak
+
+
+def report(name, seconds, peak):
+    print(f"{name:<28} {seconds * 1000:>10.1f} ms {peak / 1024 / 1024:>10.2f} MiB")
+
+
+def bench_ls(args):
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        print(f"Creating {args.entries} files in {root} ...")
+        make_flat_dir(root, args.entries)
+
+        cases = [
+            ("legacy ls", legacy_ls, (root,)),
+            ("scandir ls", scandir_ls, (root,)),
+            ("legacy ls -l", legacy_ls, (root, True)),
+            ("scandir ls -l", scandir_ls, (root, True)),
+            ("scandir ls -l -t", scandir_ls, (root, True, "time")),
+            ("scandir ls -S --limit 20", scandir_ls, (root, False, "size", 20)),
+        ]
+        for name, func, func_args in cases:
+            seconds, peak = measure(func, *func_args, repeat=args.repeat)
+            report(name, seconds, peak)
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_startup(args):
+    """Время запуска shell до приглашения и выхода, плюс самые тяжёлые импорты (-X importtime)."""
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "main.py")
+    workdir = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, main_py], input=b"exit\n", cwd=workdir,
+                           capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"{'startup (median)':<28} {times[len(times) // 2] * 1000:>10.1f} ms")
+
+        result = subprocess.run([sys.executable, "-X", "importtime", main_py], input=b"exit\n",
+                                cwd=workdir, capture_output=True, check=True)
+        imports = []
+        for line in result.stderr.decode().splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                imports.append((int(parts[1]), parts[2].rstrip()))
+        for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f} ms {name}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_daemon(args):
+    """Команда на процесс (main.py) против тонкого клиента к запущенному серверу."""
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+    workdir = tempfile.mkdtemp(prefix="shell_bench_")
+    socket_path = os.path.join(workdir, "shell.sock")
+    server = subprocess.Popen([sys.executable, os.path.join(src, "main.py"), "--serve", "--socket", socket_path],
+                              cwd=workdir, stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        cases = [
+            ("main.py -f (cold)", [sys.executable, os.path.join(src, "main.py"), "-f", "/dev/stdin"], b"ls\n"),
+            ("client.py (warm server)", [sys.executable, os.path.join(src, "client.py"), "-S", socket_path, "ls"], b""),
+        ]
+        for name, command, stdin in cases:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                subprocess.run(command, input=stdin, cwd=workdir, capture_output=True, check=True)
+                times.append(time.perf_counter() - start)
+            times.sort()
+            print(f"{name + ' (median)':<28} {times[len(times) // 2] * 1000:>10.1f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir)
+
+
+def bench_glob(args):
+    """Раскрытие шаблонов: globbing.expand (один проход scandir) против glob.glob."""
+    import glob
+    from globbing import expand
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        print(f"Creating {args.entries} files in {root} ...")
+        make_flat_dir(root, args.entries)
+        cases = [
+            ("glob.glob *.dat", lambda: glob.glob("*.dat", root_dir=root)),
+            ("expand *.dat", lambda: expand("*.dat", root)),
+            ("glob.glob **/*_00?1.dat", lambda: glob.glob("**/*_00?1.dat", root_dir=root, recursive=True)),
+            ("expand **/*_00?1.dat", lambda: expand("**/*_00?1.dat", root)),
+        ]
+        for name, func in cases:
+            seconds, peak = measure(func, repeat=args.repeat)
+            report(name, seconds, peak)
+    finally:
+        shutil.rmtree(root)
+
+
+def make_tree(root, dirs, files_per_dir, needle_every=7):
+    for d in range(dirs):
+        sub = os.path.join(root, f"dir_{d:04d}")
+        os.makedirs(sub)
+        for f in range(files_per_dir):
+            with open(os.path.join(sub, f"file_{f:04d}.log"), "w") as fh:
+                fh.write("INFO nothing to see here\n" * 200)
+                if f % needle_every == 0:
+                    fh.write("ERROR something happened\n")
+
+
+def serial_find(root, pattern):
+    import fnmatch
+    return [os.path.join(d, n) for d, _, names in os.walk(root) for n in names if fnmatch.fnmatch(n, pattern)]
+
+
+def serial_grep(root, pattern):
+    import re
+    regex = re.compile(pattern.encode())
+    found = []
+    for d, _, names in os.walk(root):
+        for n in names:
+            path = os.path.join(d, n)
+            with open(path, "rb") as f:
+                for lineno, line in enumerate(f, 1):
+                    if regex.search(line):
+                        found.append((path, lineno))
+    return found
+
+
+def bench_search(args):
+    """find/grep: параллельный обход и пул процессов против os.walk в одном потоке."""
+    from search import iter_grep, make_filter, parallel_walk
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        print(f"Creating {args.dirs} x {args.files} files in {root} ...")
+        make_tree(root, args.dirs, args.files)
+        files = make_filter(kind="f")
+        cases = [
+            ("os.walk find *_0001.log", lambda: serial_find(root, "*_0001.log")),
+            ("parallel find *_0001.log",
+             lambda: list(parallel_walk(root, select=make_filter(name="*_0001.log")))),
+            ("serial grep ERROR", lambda: serial_grep(root, "ERROR")),
+            ("pool grep ERROR", lambda: list(iter_grep(
+                ((shown, entry.path) for shown, entry in parallel_walk(root, select=files)), "ERROR"))),
+        ]
+        for name, func in cases:
+            seconds, peak = measure(func, repeat=args.repeat)
+            report(name, seconds, peak)
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_du(args):
+    """du: полный обход против повторного запуска с кэшем, где изменилась одна директория."""
+    from dirsize import SizeCache, dir_sizes
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        tree = os.path.join(root, "tree")
+        print(f"Creating {args.dirs} x {args.files} files in {tree} ...")
+        for d in range(args.dirs):
+            sub = os.path.join(tree, f"dir_{d // 100:03d}", f"dir_{d:05d}")
+            os.makedirs(sub)
+            for f in range(args.files):
+                with open(os.path.join(sub, f"file_{f:04d}"), "wb") as fh:
+                    fh.write(b"x" * f)
+
+        cache = SizeCache(os.path.join(root, "du_cache.db"))
+        changed = os.path.join(tree, "dir_000", "dir_00000")
+
+        def warm():
+            with open(os.path.join(changed, "touch"), "wb"):
+                pass
+            os.remove(os.path.join(changed, "touch"))
+            dir_sizes(tree, cache)
+
+        cases = [
+            ("du without cache", lambda: dir_sizes(tree)),
+            ("du cache, 1 dir changed", warm),
+        ]
+        dir_sizes(tree, cache)
+        for name, func in cases:
+            seconds, peak = measure(func, repeat=args.repeat)
+            report(name, seconds, peak)
+        cache.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_complete(args):
+    """Дополнение по Tab: построение индекса директории и время одного дополнения из кэша."""
+    from completion import PathIndex
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        print(f"Creating {args.entries} files in {root} ...")
+        make_flat_dir(root, args.entries)
+        index = PathIndex()
+        start = time.perf_counter()
+        index.get(root)
+        report("build index", time.perf_counter() - start, 0)
+
+        for prefix in ["file_00123", "file_0", ""]:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                index.complete(prefix, root)
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            report(f"complete '{prefix}' p50", samples[len(samples) // 2], 0)
+            report(f"complete '{prefix}' max", samples[-1], 0)
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_log(args):
+    """log --since/--until: бинарный поиск по mmap (с индексом и без) против линейного прохода."""
+    import logquery
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        path = os.path.join(root, "shell.log")
+        print(f"Writing {args.lines} log records to {path} ...")
+        start_time = datetime(2025, 1, 1)
+        with open(path, "w") as f:
+            for i in range(0, args.lines, 1000):
+                stamp = (start_time + timedelta(seconds=i // 10)).strftime("%Y-%m-%d %H:%M:%S")
+                f.write(f"[{stamp}] cp some/file/name.txt backup/ - SUCCESS\n" * 1000)
+        middle = (start_time + timedelta(seconds=args.lines // 20)).strftime("%Y-%m-%d %H:%M:%S").encode()
+        until = middle[:-2] + b"59"
+
+        def linear():
+            with open(path, "rb") as f:
+                return [line for line in f if middle <= line[1:20] <= until]
+
+        cases = [
+            ("linear scan", linear),
+            ("binary search", lambda: logquery.query(path, middle, until, index=False)),
+            ("binary search + index", lambda: logquery.query(path, middle, until, index=True)),
+        ]
+        for name, func in cases:
+            seconds, peak = measure(func, repeat=args.repeat)
+            report(name, seconds, peak)
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_history(args):
+    """history: запросы к SQLite-базе истории (FTS5, частичный индекс, индекс по времени) на большой истории."""
+    from history_store import HistoryStore
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        store = HistoryStore(os.path.join(root, ".history.db"))
+        print(f"Inserting {args.entries} history records ...")
+        start_time = datetime(2024, 1, 1)
+        commands = ["ls", "cd", "cat", "cp", "mv", "rm", "grep", "find"]
+        records = ({
+            "time": (start_time + timedelta(seconds=30 * i)).isoformat(),
+            "command": commands[i % len(commands)],
+            "args": [f"dir_{i % 997}/file_{i % 10007}.txt"],
+            "status": i % 49 != 0,
+        } for i in range(args.entries))
+        start = time.perf_counter()
+        with store.db:
+            store._insert(records)
+        report("insert", time.perf_counter() - start, 0)
+
+        since = (start_time + timedelta(seconds=30 * (args.entries - 1000))).isoformat()
+        cases = [
+            ("history 20", lambda: store.search(limit=20)),
+            ("history --failed", lambda: store.search(failed=True, limit=20)),
+            ("history --since (1000 records)", lambda: store.search(since=since, limit=None)),
+            ("history grep file_10006", lambda: store.search("file_10006", limit=20)),
+            ("history grep --failed", lambda: store.search("cp dir", failed=True, limit=20)),
+            ("history grep --failed (no match)", lambda: store.search("no such", failed=True, limit=20)),
+            ("history grep --since (no match)", lambda: store.search("file_1", since="2100-01-01", limit=20)),
+        ]
+        for name, func in cases:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            report(f"{name} p50", samples[len(samples) // 2], 0)
+        store.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_mv(args):
+    """mv между устройствами: shutil.move против move_engine (параллельная копия, staging, rename)."""
+    from move_engine import move_path
+
+    root = tempfile.mkdtemp(prefix="shell_bench_")
+    target = tempfile.mkdtemp(prefix="shell_bench_", dir=args.target)
+    try:
+        if os.stat(root).st_dev == os.stat(target).st_dev:
+            print(f"warning: {args.target} is on the same device, both cases are a rename")
+        template = os.path.join(root, "template")
+        print(f"Creating {args.dirs} x {args.files} files and a {args.big} MiB file in {template} ...")
+        make_tree(template, args.dirs, args.files)
+        with open(os.path.join(template, "big.bin"), "wb") as f:
+            f.write(os.urandom(args.big * 1024 * 1024))
+
+        cases = [
+            ("shutil.move", shutil.move),
+            ("move_path", lambda src, dst: move_path(src, dst, jobs=args.jobs, show_progress=False)),
+            ("move_path --verify", lambda src, dst: move_path(src, dst, jobs=args.jobs, verify=True,
+                                                              show_progress=False)),
+        ]
+        for name, func in cases:
+            best = float("inf")
+            for _ in range(args.repeat):
+                src = os.path.join(root, "src")
+                dst = os.path.join(target, "dst")
+                shutil.copytree(template, src)
+                start = time.perf_counter()
+                func(src, dst)
+                best = min(best, time.perf_counter() - start)
+                shutil.rmtree(dst)
+            report(name, best, 0)
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(target)
+
+
+def bench_pipe(args):
+    """
+    Конвейеры: время, пропускная способность (объём файла / время; для head —
+    эффективная, так как файл дочитывается не до конца) и пиковая память процесса shell.
+    """
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "main.py")
+    workdir = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        os.makedirs(os.path.join(workdir, "src"))
+        log = os.path.join(workdir, "big.log")
+        with open(log, "w") as f:
+            for i in range(args.lines):
+                f.write(f"{i} ERROR disk failure\n" if i % 1000 == 0 else f"{i} INFO request served\n")
+        size = os.path.getsize(log)
+        print(f"{args.lines} lines, {size / 1024 / 1024:.1f} MiB")
+
+        cases = [
+            ("cat | grep | head 20", "cat big.log | grep ERROR | head 20"),
+            ("cat | grep | tail 20", "cat big.log | grep ERROR | tail 20"),
+            ("cat | head 20", "cat big.log | head 20"),
+            ("grep (file, no pipe)", "grep ERROR big.log"),
+        ]
+        for name, line in cases:
+            script = os.path.join(workdir, "pipe.sh")
+            with open(script, "w") as f:
+                f.write(line + "\n")
+            start = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, main_py, "-f", script], cwd=workdir,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            _, _, usage = os.wait4(proc.pid, 0)
+            seconds = time.perf_counter() - start
+            print(f"{name:<28} {seconds * 1000:>10.1f} ms {size / 1024 / 1024 / seconds:>8.1f} MiB/s "
+                  f"{usage.ru_maxrss / 1024:>8.1f} MiB RSS")
+    finally:
+        shutil.rmtree(workdir)
+
+
+def make_script(path, lines):
+    """Скрипт из типичных команд: ls, cat, cp/rm, cd."""
+    pattern = ["ls", "cat data.txt", "cp data.txt copy.txt", "rm copy.txt", "cd .", "ls -l"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(pattern[i % len(pattern)] + "\n")
+        f.write("exit\n")
+
+
+def bench_script(args):
+    """Пакетный режим (main.py -f) против интерактивного цикла (main.py -i) на одном скрипте."""
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "main.py")
+    workdir = tempfile.mkdtemp(prefix="shell_bench_")
+    try:
+        os.makedirs(os.path.join(workdir, "src"))
+        with open(os.path.join(workdir, "data.txt"), "w") as f:
+            f.write("line\n" * 100)
+        script = os.path.join(workdir, "script.sh")
+        make_script(script, args.lines)
+
+        cases = [
+            ("interactive (-i)", [main_py, "-i"]),
+            ("script (-f)", [main_py, "-f", script, "--yes"]),
+        ]
+        for name, cmd in cases:
+            with open(script, "rb") as stdin, open(os.devnull, "wb") as devnull:
+                start = time.perf_counter()
+                subprocess.run([sys.executable] + cmd, stdin=stdin, stdout=devnull,
+                               stderr=devnull, cwd=workdir, check=False)
+                seconds = time.perf_counter() - start
+            print(f"{name:<28} {seconds * 1000:>10.1f} ms {args.lines / seconds:>10.0f} commands/s")
+    finally:
+        shutil.rmtree(workdir)
+
+
+# Параметры набора: full — масштаб реальной работы, quick — быстрый прогон для проверки
+SUITE_PRESETS = {
+    "full": {"entries": 100000, "depth": 6, "breadth": 3, "files": 10, "file_size": 2048,
+             "history": 100000, "repeat": 20, "heavy_repeat": 3},
+    "quick": {"entries": 10000, "depth": 4, "breadth": 2, "files": 5, "file_size": 64,
+              "history": 10000, "repeat": 10, "heavy_repeat": 2},
+}
+
+
+def reset_peak_rss():
+    """Сбрасывает пик RSS процесса (Linux, /proc/self/clear_refs), чтобы мерить его для каждого случая."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Пик RSS процесса в байтах: VmHWM из /proc/self/status, иначе ru_maxrss за всё время процесса."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * q + 0.5) - 1))]
+
+
+def make_deep_tree(root, depth, breadth, files):
+    """Дерево глубины depth: в каждой директории breadth поддиректорий и files файлов. Возвращает число файлов."""
+    count = 0
+    level = [root]
+    for d in range(depth + 1):
+        following = []
+        for path in level:
+            os.makedirs(path, exist_ok=True)
+            for f in range(files):
+                with open(os.path.join(path, f"file_{f:03d}.txt"), "wb") as fh:
+                    fh.write(b"x" * (64 * (f + 1)))
+            count += files
+            if d < depth:
+                following += [os.path.join(path, f"level{d}_{b}") for b in range(breadth)]
+        level = following
+    return count
+
+
+def make_big_file(path, size_mib):
+    block = b"".join(f"{i:08d} INFO request served in 12 ms\n".encode() for i in range(32768))
+    block = block[:1024 * 1024]
+    with open(path, "wb") as f:
+        for _ in range(size_mib):
+            f.write(block)
+
+
+def run_case(name, func, repeat, amount=1, unit="ops/s", setup=None):
+    """
+    Выполняет func repeat раз (вывод — в /dev/null) и возвращает p50/p99/среднее
+    время одного запуска, пропускную способность (amount за запуск / время)
+    и пиковый RSS процесса за время случая. setup(i) вызывается перед каждым
+    запуском и не входит во время. Если команда сообщила об ошибке
+    (core.last_status), прогон прерывается.
+    """
+    samples = []
+    real_stdout = sys.stdout
+    reset_peak_rss()
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            for i in range(repeat):
+                if setup is not None:
+                    setup(i)
+                start = time.perf_counter()
+                ok = func(i)
+                samples.append(time.perf_counter() - start)
+                if ok is False:
+                    raise RuntimeError(f"{name}: command failed")
+        finally:
+            sys.stdout = real_stdout
+    result = {
+        "runs": repeat,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "throughput": amount * len(samples) / sum(samples),
+        "unit": unit,
+        "peak_rss_mib": peak_rss() / 1024 / 1024,
+    }
+    print(f"{name:<24} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+          f"{result['throughput']:>12.1f} {unit:<9} {result['peak_rss_mib']:>7.1f} MiB RSS")
+    return result
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Сравнивает p50 и пропускную способность с базовыми. Регрессия — если p50
+    вырос или пропускная способность упала больше чем на threshold (доля).
+    Возвращает имена случаев с регрессией.
+    """
+    regressions = []
+    print(f"\n{'case':<24} {'p50 ms':>10} {'baseline':>10} {'change':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<24} {current['p50_ms']:>10.2f} {'-':>10} {'new':>8}")
+            continue
+        change = current["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        slower = change > threshold or current["throughput"] < base["throughput"] * (1 - threshold)
+        if slower:
+            regressions.append(name)
+        print(f"{name:<24} {current['p50_ms']:>10.2f} {base['p50_ms']:>10.2f} {change:>+7.0%}"
+              f"{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def bench_suite(args):
+    """
+    Набор бенчмарков команд через настоящий API ShellCommands (с логом,
+    историей, корзиной и журналом операций) на синтетических данных во
+    временной директории. Результаты сохраняются в JSON и сравниваются с базовыми.
+    """
+    import json
+    import platform
+    from operations import ShellCommands
+    from shell_core import System_Shell
+
+    params = dict(SUITE_PRESETS[args.scale])
+    for key in params:
+        if getattr(args, key, None) is not None:
+            params[key] = getattr(args, key)
+    repeat, heavy = params["repeat"], params["heavy_repeat"]
+
+    workdir = tempfile.mkdtemp(prefix="shell_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    core = None
+    try:
+        print(f"Preparing data in {workdir}: {params}")
+        os.makedirs("flat")
+        make_flat_dir(os.path.join(workdir, "flat"), params["entries"])
+        tree_files = make_deep_tree(os.path.join(workdir, "tree"), params["depth"], params["breadth"], params["files"])
+        make_big_file(os.path.join(workdir, "big.txt"), params["file_size"])
+
+        core = System_Shell()
+        core.assume_yes = True
+        commands = ShellCommands(core)
+        store = core.history_store
+        with store.db:
+            store._insert({
+                "time": (datetime(2025, 1, 1) + timedelta(seconds=i)).isoformat(),
+                "command": ["ls", "cd", "cat", "cp", "rm"][i % 5],
+                "args": [f"dir_{i % 101}/file_{i % 1009}.txt"],
+                "status": i % 100 != 0,
+            } for i in range(params["history"]))
+
+        def ran(method, *call_args, **kwargs):
+            def run(i):
+                method(*call_args, **kwargs)
+                return core.last_status
+            return run
+
+        def command(method, **kwargs):
+            """Вызов команды, аргументы которой зависят от номера запуска."""
+            def run(i):
+                method(**{key: value(i) if callable(value) else value for key, value in kwargs.items()})
+                return core.last_status
+            return run
+
+        def touch(i):
+            with open(f"victim_{i}", "wb") as f:
+                f.write(b"x")
+
+        def move_back(i):
+            if os.path.exists("tree_moved"):
+                os.rename("tree_moved", "tree")
+
+        entries = params["entries"]
+        mib = params["file_size"]
+        results = {
+            "ls": run_case("ls", ran(commands.ls, "flat"), repeat, entries, "entries/s"),
+            "ls -l": run_case("ls -l", ran(commands.ls, "flat", flag_l=True), repeat, entries, "entries/s"),
+            "cat": run_case("cat", ran(commands.cat, "big.txt"), heavy, mib, "MiB/s"),
+            "cp -r": run_case("cp -r", command(commands.cp, src=["tree"], dst=lambda i: f"copy_{i}", flag_r=True),
+                              heavy, tree_files, "files/s"),
+            "mv": run_case("mv", command(commands.mv, src=["tree"], dst="tree_moved"), repeat,
+                           setup=move_back),
+            "rm": run_case("rm", command(commands.rm, file=lambda i: [f"victim_{i}"]), repeat, setup=touch),
+            "undo (rm)": run_case("undo (rm)", ran(commands.undo), repeat),
+            "rm -r": run_case("rm -r", command(commands.rm, file=lambda i: [f"copy_{i}"], flag_r=True), heavy,
+                              tree_files, "files/s"),
+            "undo (rm -r)": run_case("undo (rm -r)", ran(commands.undo), heavy, tree_files, "files/s"),
+            "history": run_case("history", ran(commands.show_history), repeat),
+            "history grep": run_case("history grep", ran(commands.show_history, "grep", "file_100"), repeat),
+            "history --failed": run_case("history --failed", ran(commands.show_history, failed=True), repeat),
+        }
+    finally:
+        if core is not None:
+            core.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    report_data = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": params,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report_data, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("params") != params:
+            print(f"warning: baseline was recorded with different parameters: {baseline['meta'].get('params')}")
+        regressions = compare_results(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="System_Shell benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    ls_parser = sub.add_parser("ls", help="ls: os.listdir vs os.scandir")
+    ls_parser.add_argument("--entries", type=int, default=100000)
+    ls_parser.add_argument("--repeat", type=int, default=3)
+    ls_parser.set_defaults(func=bench_ls)
+
+    startup_parser = sub.add_parser("startup", help="shell startup time and import profile")
+    startup_parser.add_argument("--repeat", type=int, default=11)
+    startup_parser.add_argument("--top", type=int, default=10)
+    startup_parser.set_defaults(func=bench_startup)
+
+    daemon_parser = sub.add_parser("daemon", help="per-invocation startup vs client of a warm server")
+    daemon_parser.add_argument("--repeat", type=int, default=21)
+    daemon_parser.set_defaults(func=bench_daemon)
+
+    glob_parser = sub.add_parser("glob", help="glob expansion: scandir walk vs glob.glob")
+    glob_parser.add_argument("--entries", type=int, default=100000)
+    glob_parser.add_argument("--repeat", type=int, default=3)
+    glob_parser.set_defaults(func=bench_glob)
+
+    search_parser = sub.add_parser("search", help="find/grep: parallel walk and process pool")
+    search_parser.add_argument("--dirs", type=int, default=200)
+    search_parser.add_argument("--files", type=int, default=100)
+    search_parser.add_argument("--repeat", type=int, default=3)
+    search_parser.set_defaults(func=bench_search)
+
+    du_parser = sub.add_parser("du", help="du: full walk vs mtime-validated cache")
+    du_parser.add_argument("--dirs", type=int, default=2000)
+    du_parser.add_argument("--files", type=int, default=50)
+    du_parser.add_argument("--repeat", type=int, default=3)
+    du_parser.set_defaults(func=bench_du)
+
+    complete_parser = sub.add_parser("complete", help="tab completion latency in a large directory")
+    complete_parser.add_argument("--entries", type=int, default=100000)
+    complete_parser.add_argument("--repeat", type=int, default=200)
+    complete_parser.set_defaults(func=bench_complete)
+
+    log_parser = sub.add_parser("log", help="log time-range query: binary search vs linear scan")
+    log_parser.add_argument("--lines", type=int, default=2000000)
+    log_parser.add_argument("--repeat", type=int, default=3)
+    log_parser.set_defaults(func=bench_log)
+
+    history_parser = sub.add_parser("history", help="history search over a large SQLite history")
+    history_parser.add_argument("--entries", type=int, default=1000000)
+    history_parser.add_argument("--repeat", type=int, default=20)
+    history_parser.set_defaults(func=bench_history)
+
+    mv_parser = sub.add_parser("mv", help="cross-device mv: shutil.move vs move engine")
+    mv_parser.add_argument("--target", default="/dev/shm", help="directory on another filesystem")
+    mv_parser.add_argument("--dirs", type=int, default=50)
+    mv_parser.add_argument("--files", type=int, default=100)
+    mv_parser.add_argument("--big", type=int, default=256, help="size of one large file, MiB")
+    mv_parser.add_argument("--jobs", type=int, default=8)
+    mv_parser.add_argument("--repeat", type=int, default=3)
+    mv_parser.set_defaults(func=bench_mv)
+
+    pipe_parser = sub.add_parser("pipe", help="pipelines: throughput and peak memory")
+    pipe_parser.add_argument("--lines", type=int, default=2000000)
+    pipe_parser.set_defaults(func=bench_pipe)
+
+    script_parser = sub.add_parser("script", help="script mode vs interactive loop")
+    script_parser.add_argument("--lines", type=int, default=10000)
+    script_parser.set_defaults(func=bench_script)
+
+    suite_parser = sub.add_parser("suite", help="all commands through ShellCommands: p50/p99, RSS, JSON, baseline")
+    suite_parser.add_argument("--scale", choices=sorted(SUITE_PRESETS), default="full")
+    for option in ["entries", "depth", "breadth", "files", "file-size", "history", "repeat", "heavy-repeat"]:
+        suite_parser.add_argument(f"--{option}", type=int, help="override the preset value")
+    suite_parser.add_argument("--output", help="save results as JSON")
+    suite_parser.add_argument("--baseline", help="JSON results to compare with")
+    suite_parser.add_argument("--threshold", type=float, default=0.2,
+                              help="allowed slowdown before a case counts as a regression (0.2 = 20%%)")
+    suite_parser.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
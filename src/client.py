@@ -0,0 +1,86 @@
+"""
+Тонкий клиент сервера System_Shell (python src/main.py --serve).
+
+Не импортирует модули shell, поэтому запускается за время старта интерпретатора:
+    python src/client.py ls -l
+    python src/client.py -y < script.sh
+"""
+import os
+import sys
+import json
+import socket
+
+
+def default_socket_path():
+    """Путь к сокету по умолчанию: свой для каждого пользователя во временной директории."""
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f"system_shell-{os.getuid()}.sock")
+
+
+def send(wfile, message):
+    wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+def run_lines(socket_path, lines, assume_yes=False, fail_fast=False, out=None):
+    """
+    Выполняет строки в одной сессии сервера (cd действует на следующие строки)
+    и печатает вывод по мере поступления. Возвращает код завершения: 0 — все
+    команды успешны, 1 — были ошибки.
+    """
+    out = out or sys.stdout
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    failed = False
+    try:
+        with sock, sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+            send(wfile, {"cwd": os.getcwd(), "yes": assume_yes})
+            for line in lines:
+                if not line.strip():
+                    continue
+                if line.split()[0] == "exit":
+                    break
+                send(wfile, {"line": line})
+                for raw in rfile:
+                    message = json.loads(raw)
+                    if "out" in message:
+                        out.write(message["out"])
+                        out.flush()
+                    else:
+                        failed = failed or not message["status"]
+                        break
+                else:
+                    print("connection closed by server", file=sys.stderr)
+                    return 1
+                if failed and fail_fast:
+                    break
+    except ConnectionError:
+        # Сервер остановился между командами
+        print("connection closed by server", file=sys.stderr)
+        return 1
+    return 1 if failed else 0
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="System_Shell client")
+    parser.add_argument("-S", "--socket", default=default_socket_path(), help="server socket path")
+    parser.add_argument("-y", "--yes", action="store_true", help="answer 'yes' to confirmations")
+    parser.add_argument("--fail-fast", action="store_true", help="stop at the first failed command")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="command to run; without it commands are read from stdin")
+    options = parser.parse_args(argv)
+
+    lines = [" ".join(options.command)] if options.command else sys.stdin
+    try:
+        return run_lines(options.socket, lines, options.yes, options.fail_fast)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"no server on {options.socket}; start it with: python src/main.py --serve", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
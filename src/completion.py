@@ -0,0 +1,195 @@
+import os
+import bisect
+import threading
+from collections import OrderedDict
+
+
+class DirIndex:
+    """
+    Отсортированный список имён одной директории для поиска по префиксу через
+    bisect, множество имён поддиректорий и (inode, mtime) на момент чтения.
+    """
+
+    def __init__(self, ino, mtime_ns, names, dirs):
+        self.ino = ino
+        self.mtime_ns = mtime_ns
+        self.names = names
+        self.dirs = dirs
+
+    @classmethod
+    def build(cls, path):
+        st = os.stat(path)
+        names = []
+        dirs = set()
+        with os.scandir(path) as it:
+            for entry in it:
+                names.append(entry.name)
+                try:
+                    if entry.is_dir():
+                        dirs.add(entry.name)
+                except OSError:
+                    pass
+        names.sort()
+        return cls(st.st_ino, st.st_mtime_ns, names, dirs)
+
+    def matches(self, prefix, limit=None):
+        """
+        Имена, начинающиеся с prefix, в порядке сортировки. При превышении limit
+        возвращаются первые limit - 1 и последнее совпадение: общий префикс
+        первого и последнего имени равен общему префиксу всех, поэтому readline
+        дополняет строку так же, как по полному списку.
+        """
+        low = bisect.bisect_left(self.names, prefix)
+        high = bisect.bisect_left(self.names, prefix + "\U0010ffff", low)
+        if limit is not None and high - low > limit:
+            return self.names[low:low + limit - 1] + [self.names[high - 1]]
+        return self.names[low:high]
+
+    def add(self, name, is_dir):
+        index = bisect.bisect_left(self.names, name)
+        if index == len(self.names) or self.names[index] != name:
+            self.names.insert(index, name)
+        if is_dir:
+            self.dirs.add(name)
+        else:
+            self.dirs.discard(name)
+
+    def remove(self, name):
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            del self.names[index]
+        self.dirs.discard(name)
+
+
+class PathIndex:
+    """
+    Кэш DirIndex для последних max_dirs директорий (LRU). Запись
+    действительна, пока у директории не изменились inode и mtime; cp, mv, rm,
+    undo и redo обновляют её на месте через refresh(), не перечитывая директорию.
+    """
+
+    def __init__(self, max_dirs=64, max_matches=1000):
+        self.max_dirs = max_dirs
+        self.max_matches = max_matches
+        self._dirs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            index = self._dirs.get(path)
+            if index is not None and index.ino == st.st_ino and index.mtime_ns == st.st_mtime_ns:
+                self._dirs.move_to_end(path)
+                return index
+        index = DirIndex.build(path)
+        with self._lock:
+            self._dirs[path] = index
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return index
+
+    def warm(self, path):
+        """Строит индекс директории в фоне (после cd), чтобы первое дополнение было быстрым."""
+        def build():
+            try:
+                self.get(path)
+            except OSError:
+                pass
+        threading.Thread(target=build, name="completion-index", daemon=True).start()
+
+    def refresh(self, paths):
+        """Обновляет закэшированные индексы родителей paths по текущему состоянию путей."""
+        with self._lock:
+            for path in paths:
+                path = os.path.abspath(path)
+                parent, name = os.path.split(path)
+                index = self._dirs.get(parent)
+                if index is None:
+                    continue
+                try:
+                    st = os.stat(parent)
+                    is_dir = os.path.isdir(path)
+                    exists = os.path.lexists(path)
+                except OSError:
+                    del self._dirs[parent]
+                    continue
+                if exists:
+                    index.add(name, is_dir)
+                else:
+                    index.remove(name)
+                index.ino, index.mtime_ns = st.st_ino, st.st_mtime_ns
+                # Удалённая или перемещённая директория больше не нужна в кэше
+                if not exists:
+                    self._dirs.pop(path, None)
+
+    def complete(self, text, cwd):
+        """
+        Дополнения пути text относительно cwd: к директориям добавляется "/",
+        к остальным — пробел (readline в Python сам его не добавляет).
+        """
+        head, prefix = os.path.split(text)
+        try:
+            index = self.get(os.path.join(cwd, os.path.expanduser(head)))
+        except OSError:
+            return []
+        names = index.matches(prefix, self.max_matches)
+        if not prefix.startswith("."):
+            names = [name for name in names if not name.startswith(".")]
+        return [os.path.join(head, name) + ("/" if name in index.dirs else " ") for name in names]
+
+
+class Completer:
+    """Функция дополнения для readline: имена команд, флаги команды и пути."""
+
+    def __init__(self, core, commands, index):
+        self.core = core
+        self.commands = commands
+        self.index = index
+        self._matches = []
+
+    def candidates(self, line, begidx, text):
+        tokens = line[:begidx].split()
+        if "|" in tokens:
+            tokens = tokens[len(tokens) - tokens[::-1].index("|"):]
+        if not tokens:
+            return sorted(f"{name} " for name in list(self.commands) + ["exit"] if name.startswith(text))
+
+        spec = self.commands.get(tokens[0])
+        if text.startswith("-") and spec is not None:
+            flags = list(spec.flags) + list(spec.options) + ["--profile"]
+            return sorted(f"{flag} " for flag in flags if flag.startswith(text))
+        return self.index.complete(text, self.core.current_dir)
+
+    def complete(self, text, state):
+        if state == 0:
+            import readline
+            try:
+                self._matches = self.candidates(readline.get_line_buffer(), readline.get_begidx(), text)
+            except Exception:
+                self._matches = []
+        return self._matches[state] if state < len(self._matches) else None
+
+
+def setup_readline(completer):
+    """Подключает дополнение по Tab. Возвращает False, если модуль readline недоступен."""
+    try:
+        import readline
+    except ImportError:
+        return False
+    readline.set_completer(completer.complete)
+    readline.set_completer_delims(" \t\n|&")
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+    return True
+
+
+def load_readline_history(lines):
+    """Заменяет историю readline строками lines (от старых к новым)."""
+    import readline
+    readline.clear_history()
+    for line in lines:
+        readline.add_history(line)
@@ -1,24 +1,145 @@
-LOGGING_CONFIG = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "detailed": {
-            "format": "[%(asctime)s] %(message)s",
-            "datefmt": "%Y-%m-%d %H:%M:%S",
-        },
-        "simple": {"format": "%(asctime)s - %(levelname)s - %(message)s"},
-    },
-    "handlers": {
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": "src/shell.log",
-            "encoding": "utf-8",
-            "mode": "a",
-            "formatter": "detailed",
-            "level": "INFO",
-        }
-    },
-    "loggers": {
-        "shell_logger": {"handlers": ["file"], "level": "INFO", "propagate": False}
-    },
-}
+LOGGING_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "detailed": {
+            "format": "[%(asctime)s] %(message)s",
+            "datefmt": "%Y-%m-%d %H:%M:%S",
+        },
+        "simple": {"format": "%(asctime)s - %(levelname)s - %(message)s"},
+    },
+    "handlers": {
+        "file": {
+            "class": "log_pipeline.GzipRotatingFileHandler",
+            "filename": "src/shell.log",
+            "encoding": "utf-8",
+            "mode": "a",
+            "maxBytes": 5 * 1024 * 1024,
+            "backupCount": 5,
+            "compress": True,
+            "formatter": "detailed",
+            "level": "INFO",
+        }
+    },
+    "loggers": {
+        "shell_logger": {"handlers": ["file"], "level": "INFO", "propagate": False}
+    },
+}
+
+# Асинхронная запись лога: размер очереди, размер пачки и сколько ждать при заполненной очереди
+LOG_QUEUE_CONFIG = {
+    "enabled": True,
+    "maxsize": 10000,
+    "batch_size": 500,
+    "put_timeout": 0.05,
+}
+
+# Команда log: использовать ли разреженный индекс смещений (shell.log.idx)
+# и как часто (в секундах) log -f проверяет появление новых записей
+LOG_QUERY_CONFIG = {
+    "index": True,
+    "follow_interval": 0.25,
+}
+
+# История команд хранится в SQLite без ограничения числа записей; legacy —
+# старый файл .history, который переносится в базу при первом запуске.
+# load_entries — сколько последних записей держится в памяти (остальные только в базе);
+# search_limit — сколько последних совпадений показывают history grep,
+# --failed и --since без -n; readline_entries — сколько строк истории
+# загружается в readline для поиска по Ctrl-R
+HISTORY_CONFIG = {
+    "filename": ".history.db",
+    "legacy": ".history",
+    "load_entries": 1000,
+    "search_limit": 20,
+    "readline_entries": 1000,
+}
+
+# Параллельное копирование (cp -r): число потоков и период вывода прогресса в секундах
+COPY_CONFIG = {
+    "jobs": 8,
+    "progress_interval": 0.5,
+}
+
+# Контрольные суммы (hashsum, sync --checksum, mv --verify): файл постоянного кэша
+# сумм, алгоритм по умолчанию, число потоков и размер файла, с которого он читается через mmap
+HASH_CONFIG = {
+    "cache": ".digest_cache.db",
+    "algo": "sha256",
+    "jobs": 8,
+    "mmap_threshold": 1024 * 1024,
+}
+
+# Перемещение между устройствами (mv): директория журнала незавершённых перемещений
+# и проверять ли контрольные суммы копии перед удалением источника по умолчанию
+MOVE_CONFIG = {
+    "journal_dir": ".moves",
+    "verify": False,
+}
+
+# Корзина для rm: директория и имя файла SQLite-каталога внутри неё, квота в байтах,
+# максимальный срок хранения и задержка перед сжатием в секундах, способ сжатия
+# ("gzip" или "lzma") и период фонового обслуживания в секундах
+TRASH_CONFIG = {
+    "dirname": ".trash",
+    "index": ".index.db",
+    "quota": 1024 * 1024 * 1024,
+    "max_age": 30 * 24 * 3600,
+    "grace": 300,
+    "codec": "gzip",
+    "interval": 60,
+}
+
+# Журнал отменяемых операций (undo/redo): файл и число событий до сжатия в снимок
+OPERATIONS_CONFIG = {
+    "filename": ".operations",
+    "compact_every": 1000,
+}
+
+# Пакетное выполнение скриптов (main.py -f script.sh): как часто сбрасывать историю на диск
+SCRIPT_CONFIG = {
+    "flush_every": 500,
+}
+
+# Поиск (find/grep): потоки обхода дерева, процессы для проверки содержимого,
+# размер пачки файлов на процесс, сколько файлов проверять без пула, порог mmap в байтах
+# и как часто (в секундах) выводить накопленные результаты
+SEARCH_CONFIG = {
+    "walk_jobs": 8,
+    "grep_jobs": None,
+    "batch_size": 64,
+    "inline_files": 32,
+    "mmap_threshold": 1024 * 1024,
+    "flush_interval": 0.1,
+}
+
+# du: файл постоянного кэша размеров директорий и число потоков обхода
+DU_CONFIG = {
+    "cache": ".du_cache.db",
+    "jobs": 8,
+}
+
+# Дополнение по Tab: сколько директорий держать в кэше индекса и
+# сколько вариантов дополнения возвращать readline
+COMPLETION_CONFIG = {
+    "max_dirs": 64,
+    "max_matches": 1000,
+}
+
+# Фоновые задачи (команда &): число одновременно выполняемых задач и
+# сколько символов вывода задачи хранить до её завершения; stop_timeout —
+# сколько секунд сервер при остановке ждёт отменённые команды сессий
+JOBS_CONFIG = {
+    "workers": 4,
+    "output_limit": 1024 * 1024,
+    "stop_timeout": 10,
+}
+
+# Статистика команд (stats): раз в export_every команд (и при выходе) она
+# выгружается в лог строкой "metrics {JSON}"; --profile выводит profile_top
+# самых затратных функций, отсортированных по profile_sort
+METRICS_CONFIG = {
+    "export_every": 100,
+    "profile_top": 15,
+    "profile_sort": "cumulative",
+}
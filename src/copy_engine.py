@@ -0,0 +1,343 @@
+import os
+import sys
+import time
+import uuid
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+# Ошибки, при которых быстрый путь ядра недоступен и нужно перейти к следующему способу
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+# ioctl FICLONE (linux/fs.h): новый файл разделяет блоки данных с источником (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Способы создания копии файла: копирование данных, жёсткая ссылка, клон
+# с откатом к копированию ("reflink", cp --reflink=auto) и только клон (--reflink=always)
+COPY_MODES = ("copy", "link", "reflink", "reflink-always")
+
+
+def _kernel_copy(infd, outfd, size):
+    """
+    Копирует size байт средствами ядра без прохода данных через Python:
+    os.copy_file_range, затем os.sendfile. Возвращает None, если оба способа недоступны.
+    """
+    if hasattr(os, "copy_file_range"):
+        total = 0
+        try:
+            while total < size:
+                sent = os.copy_file_range(infd, outfd, min(size - total, COPY_CHUNK))
+                if sent == 0:
+                    break
+                total += sent
+            return total
+        except OSError as e:
+            if total or e.errno not in FALLBACK_ERRNOS:
+                raise
+
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        total = 0
+        try:
+            while total < size:
+                sent = os.sendfile(outfd, infd, total, min(size - total, COPY_CHUNK))
+                if sent == 0:
+                    break
+                total += sent
+            return total
+        except OSError as e:
+            if total or e.errno not in FALLBACK_ERRNOS:
+                raise
+
+    return None
+
+
+def clone_file(src, dst):
+    """
+    Создаёт dst как клон src (FICLONE) с метаданными src: данные не копируются,
+    пока один из файлов не изменят. Возвращает False, если ФС или платформа этого не умеют.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS | {errno.ENOTTY}:
+                raise
+            return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def reflink_supported(directory):
+    """Умеет ли ФС директории клонировать файлы: пробный клон двух временных файлов."""
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".reflink-probe-") as probe:
+        target = probe.name + ".clone"
+        try:
+            return clone_file(probe.name, target)
+        finally:
+            if os.path.lexists(target):
+                os.remove(target)
+
+
+def link_file(src, dst):
+    """Жёсткая ссылка dst на src; существующий dst атомарно заменяется."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        staging = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.link-{uuid.uuid4().hex[:8]}")
+        os.link(src, staging)
+        os.replace(staging, dst)
+
+
+def copy_file(src, dst, follow_symlinks=True, mode="copy"):
+    """
+    Копирует файл вместе с метаданными (как shutil.copy2). Возвращает число
+    записанных байт: для жёсткой ссылки и клона — 0.
+    При follow_symlinks=False символическая ссылка воссоздаётся как ссылка.
+    mode — один из COPY_MODES.
+    """
+    if not follow_symlinks and os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return 0
+    if mode == "link":
+        link_file(src, dst)
+        return 0
+    if mode in ("reflink", "reflink-always"):
+        if clone_file(src, dst):
+            return 0
+        if mode == "reflink-always":
+            os.remove(dst)
+            raise OSError(errno.EOPNOTSUPP, "reflink is not supported by the filesystem", dst)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = _kernel_copy(fsrc.fileno(), fdst.fileno(), size) if size else 0
+        if copied is None:
+            shutil.copyfileobj(fsrc, fdst, COPY_CHUNK)
+            copied = fdst.tell()
+    shutil.copystat(src, dst)
+    return copied
+
+
+def _copy_range(infd, outfd, offset, length, progress=None):
+    """Копирует диапазон байт между файлами по смещениям (copy_file_range или pread/pwrite)."""
+    done = 0
+    use_kernel = hasattr(os, "copy_file_range")
+    while done < length:
+        size = min(length - done, COPY_CHUNK)
+        sent = None
+        if use_kernel:
+            try:
+                sent = os.copy_file_range(infd, outfd, size, offset + done, offset + done)
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS:
+                    raise
+                use_kernel = False
+        if sent is None:
+            data = os.pread(infd, size, offset + done)
+            sent = os.pwrite(outfd, data, offset + done) if data else 0
+        if sent == 0:
+            break
+        done += sent
+        if progress is not None:
+            progress.add_bytes(sent)
+    return done
+
+
+def copy_file_chunked(src, dst, jobs=8, chunk_size=64 * 1024 * 1024, progress=None, cancel=None):
+    """
+    Копирует один большой файл параллельно: файл делится на куски по
+    chunk_size, и каждый кусок копируется в пуле потоков по своему смещению.
+    Небольшие файлы копируются обычным copy_file. Возвращает число байт.
+    """
+    size = os.stat(src).st_size
+    if jobs <= 1 or size < 2 * chunk_size:
+        copied = copy_file(src, dst)
+        if progress is not None:
+            progress.add_bytes(copied)
+        return copied
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fdst.truncate(size)
+
+        def job(offset):
+            if cancel is not None and cancel.is_set():
+                raise InterruptedError("cancelled")
+            return _copy_range(fsrc.fileno(), fdst.fileno(), offset, min(chunk_size, size - offset), progress)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            copied = sum(pool.map(job, range(0, size, chunk_size)))
+    shutil.copystat(src, dst)
+    return copied
+
+
+def plan_tree(src, dst, symlinks=False):
+    """
+    Обходит дерево src через os.scandir и возвращает список директорий
+    (родители раньше детей) и список файлов (src, dst, size) для копирования.
+    Символические ссылки разыменовываются, как в shutil.copytree по умолчанию;
+    при symlinks=True они попадают в список файлов и копируются как ссылки.
+    """
+    dirs = [(src, dst)]
+    files = []
+    stack = [(src, dst)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                dst_path = os.path.join(dst_dir, entry.name)
+                if symlinks and entry.is_symlink():
+                    files.append((entry.path, dst_path, 0))
+                elif entry.is_dir():
+                    dirs.append((entry.path, dst_path))
+                    stack.append((entry.path, dst_path))
+                else:
+                    files.append((entry.path, dst_path, entry.stat().st_size))
+    return dirs, files
+
+
+def _same_file_state(src, dst):
+    """Скопирован ли файл полностью: совпадают размер и mtime (copy_file копирует mtime)."""
+    try:
+        a = os.lstat(src)
+        b = os.lstat(dst)
+    except FileNotFoundError:
+        return False
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+class CopyProgress:
+    """Счётчики скопированных файлов и байт с периодическим выводом скорости."""
+
+    def __init__(self, total_files, total_bytes, interval=0.5, stream=None):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.interval = interval
+        self.stream = stream
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, nbytes):
+        with self._lock:
+            self.files += 1
+            self.bytes += nbytes
+
+    def add_bytes(self, nbytes):
+        """Учитывает часть файла (при копировании одного файла кусками)."""
+        with self._lock:
+            self.bytes += nbytes
+
+    def render(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (
+            f"{self.files}/{self.total_files} files, "
+            f"{self.bytes / 1024 / 1024:.1f}/{self.total_bytes / 1024 / 1024:.1f} MiB, "
+            f"{self.files / elapsed:.0f} files/s, {self.bytes / 1024 / 1024 / elapsed:.1f} MiB/s"
+        )
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.stream.write(f"\r{self.render()}")
+            self.stream.flush()
+
+    def start(self):
+        if self.stream is not None:
+            self._thread = threading.Thread(target=self._loop, name="copy-progress", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.stream.write(f"\r{self.render()}\n")
+            self.stream.flush()
+
+
+def parallel_copytree(src, dst, jobs=8, progress_interval=0.5, show_progress=None,
+                      cancel=None, progress_hook=None, symlinks=False, resume=False, mode="copy"):
+    """
+    Рекурсивно копирует src в dst: сначала в порядке обхода создаются все
+    директории, затем файлы копируются в пуле из jobs потоков. Как и
+    shutil.copytree, падает, если dst уже существует, а ошибки отдельных
+    файлов собирает в shutil.Error. Возвращает объект CopyProgress.
+
+    cancel — threading.Event: если он выставлен, новые файлы не запускаются
+    и после завершения начатых выбрасывается InterruptedError.
+    progress_hook(progress) вызывается сразу после создания счётчиков.
+    symlinks — копировать символические ссылки как ссылки (для mv).
+    resume — продолжить прерванное копирование: существующие директории
+    допускаются, а файлы с тем же размером и mtime, что у источника, пропускаются.
+    mode — способ создания файлов (COPY_MODES): progress.bytes считает только
+    реально записанные байты, поэтому для ссылок и клонов он меньше total_bytes.
+    """
+    dirs, files = plan_tree(src, dst, symlinks)
+
+    os.makedirs(dst, exist_ok=resume)
+    for _, dst_dir in dirs[1:]:
+        if not (resume and os.path.isdir(dst_dir)):
+            os.mkdir(dst_dir)
+
+    if show_progress is None:
+        show_progress = sys.stdout.isatty()
+    progress = CopyProgress(
+        len(files),
+        sum(size for _, _, size in files),
+        progress_interval,
+        sys.stdout if show_progress else None,
+    )
+    if progress_hook is not None:
+        progress_hook(progress)
+
+    errors = []
+    # Ограничиваем число задач в очереди пула, чтобы не держать миллионы Future
+    slots = threading.BoundedSemaphore(max(jobs, 1) * 4)
+
+    def job(src_path, dst_path):
+        try:
+            if resume and _same_file_state(src_path, dst_path):
+                progress.add(0)
+                return
+            if resume and os.path.lexists(dst_path):
+                os.remove(dst_path)
+            progress.add(copy_file(src_path, dst_path, follow_symlinks=not symlinks, mode=mode))
+        except OSError as e:
+            errors.append((src_path, dst_path, str(e)))
+        finally:
+            slots.release()
+
+    progress.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            for src_path, dst_path, _ in files:
+                slots.acquire()
+                if cancel is not None and cancel.is_set():
+                    slots.release()
+                    break
+                pool.submit(job, src_path, dst_path)
+    finally:
+        progress.stop()
+
+    if cancel is not None and cancel.is_set():
+        raise InterruptedError(f"cancelled after {progress.files}/{progress.total_files} files")
+
+    # Метаданные директорий копируем в конце, иначе создание файлов изменит mtime
+    for src_dir, dst_dir in reversed(dirs):
+        try:
+            shutil.copystat(src_dir, dst_dir)
+        except OSError as e:
+            errors.append((src_dir, dst_dir, str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+    return progress
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import socket
+import threading
+import socketserver
+from ansi import Colors
+from client import default_socket_path, send
+from jobs import JobContext, RoutedStdout
+
+
+class SocketOutput:
+    """
+    Вывод команд сессии: текст копится в буфере и отправляется клиенту
+    сообщениями {"out": ...} при flush() или когда буфер больше limit.
+    Если клиент отключился, вывод отбрасывается, а команда сессии отменяется.
+    """
+
+    def __init__(self, wfile, cancel_event, limit=64 * 1024):
+        self.wfile = wfile
+        self.cancel_event = cancel_event
+        self.limit = limit
+        self.closed = False
+        self._parts = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            full = self._size >= self.limit
+        if full:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            text = "".join(self._parts)
+            self._parts = []
+            self._size = 0
+            if not text or self.closed:
+                return
+            try:
+                send(self.wfile, {"out": text})
+            except OSError:
+                self.closed = True
+                self.cancel_event.set()
+
+    def isatty(self):
+        return False
+
+
+class Session(JobContext):
+    """
+    Сессия клиента сервера: своя текущая директория, -y, флаг отмены
+    (выставляется, когда клиент отключается) и свои фоновые задачи. Лог,
+    история, корзина и журналы — общие для всех сессий и защищены
+    блокировкой System_Shell.
+    """
+
+    def __init__(self, core, cwd=None, assume_yes=None):
+        super().__init__(core)
+        if cwd is not None and os.path.isdir(cwd):
+            self.current_dir = cwd
+        self.assume_yes = assume_yes
+        self._jobs = None
+
+    @property
+    def jobs(self):
+        """Фоновые задачи сессии: jobs, wait и kill не видят задачи других клиентов."""
+        if self._jobs is None:
+            from config import JOBS_CONFIG
+            from jobs import JobManager
+            self._jobs = JobManager(self, JOBS_CONFIG["workers"], JOBS_CONFIG["output_limit"])
+        return self._jobs
+
+    def notify_jobs(self):
+        """Показывает завершившиеся фоновые задачи сессии после очередной команды."""
+        if self._jobs is not None:
+            self._jobs.report()
+
+    def cancel(self):
+        """Отменяет текущую команду и фоновые задачи сессии (сервер останавливается)."""
+        self.cancel_event.set()
+        if self._jobs is not None:
+            for job in self._jobs.running():
+                self._jobs.kill(job.id)
+
+    def close(self):
+        """Дожидается фоновых задач отключившегося клиента; показать их вывод уже некому."""
+        if self._jobs is not None:
+            self._jobs.close(quiet=True)
+
+    def confirm(self, prompt):
+        if self.assume_yes is not None:
+            return self.assume_yes
+        print(f"{Colors.YELLOW}{prompt.strip()} n (daemon session; connect with -y){Colors.RESET}")
+        return False
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    """
+    Одно подключение — одна сессия. Протокол — JSON-строки:
+    клиент сначала присылает {"cwd": ..., "yes": ...}, затем по {"line": ...}
+    на команду; сервер отвечает потоком {"out": ...} и завершающим
+    {"status": bool, "cwd": ...} после каждой команды.
+    """
+
+    def handle(self):
+        from parser import ShellParser
+
+        server = self.server
+        hello = self._read()
+        if hello is None:
+            return
+        session = Session(server.core, hello.get("cwd"), True if hello.get("yes") else None)
+        output = SocketOutput(self.wfile, session.cancel_event)
+        parser = ShellParser(session)
+        self.session = session
+
+        server.stdout.route(output)
+        server.track(self)
+        try:
+            while not output.closed:
+                message = self._read()
+                if message is None:
+                    break
+                status = server.execute(parser, session, message.get("line", ""))
+                output.flush()
+                if output.closed:
+                    break
+                send(self.wfile, {"status": status, "cwd": session.current_dir})
+        except OSError:
+            session.cancel_event.set()
+        finally:
+            session.close()
+            server.stdout.unroute()
+            server.untrack(self)
+
+    def stop(self):
+        """Отменяет команду сессии и закрывает чтение: цикл сессии завершится после неё."""
+        self.session.cancel()
+        try:
+            self.request.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+
+    def _read(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+
+class ShellServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Сервер с одним «тёплым» System_Shell: лог, история, корзина и кэши
+    создаются один раз, а каждая сессия выполняется в своём потоке. При
+    закрытии сервер отменяет команды сессий и дожидается их потоков.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, core, socket_path):
+        self.core = core
+        self.socket_path = socket_path
+        # Активные сессии {обработчик: поток}: при остановке их нужно дождаться
+        self.handlers = {}
+        self._handlers_lock = threading.Lock()
+        self._check_stale(socket_path)
+        # Сокет доступен только владельцу
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, SessionHandler)
+        finally:
+            os.umask(umask)
+        if isinstance(sys.stdout, RoutedStdout):
+            self.stdout = sys.stdout
+        else:
+            self.stdout = RoutedStdout(sys.stdout)
+            sys.stdout = self.stdout
+
+    @staticmethod
+    def _check_stale(socket_path):
+        """Удаляет сокет, оставшийся от упавшего сервера; если сервер жив — ошибка."""
+        if not os.path.exists(socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+        else:
+            raise OSError(f"server is already running on {socket_path}")
+        finally:
+            probe.close()
+
+    def execute(self, parser, session, line):
+        """Выполняет строку в сессии и показывает её завершившиеся фоновые задачи."""
+        command = line.strip().split()
+        if not command or command[0].startswith("#"):
+            return True
+        session.last_status = True
+        try:
+            ok = parser.execute(command)
+        except Exception as e:
+            print(f"Unexpected error: {str(e)}")
+            ok = False
+        session.notify_jobs()
+        return bool(ok)
+
+    def track(self, handler):
+        with self._handlers_lock:
+            self.handlers[handler] = threading.current_thread()
+
+    def untrack(self, handler):
+        with self._handlers_lock:
+            self.handlers.pop(handler, None)
+
+    def stop_sessions(self, timeout=None):
+        """
+        Отменяет команды всех сессий и ждёт их потоки не дольше timeout секунд,
+        чтобы shell не закрыл базы истории, корзины и кэшей под работающей командой.
+        """
+        import time
+        from config import JOBS_CONFIG
+
+        timeout = JOBS_CONFIG["stop_timeout"] if timeout is None else timeout
+        with self._handlers_lock:
+            handlers = list(self.handlers.items())
+        for handler, _ in handlers:
+            handler.stop()
+        deadline = time.monotonic() + timeout
+        for _, thread in handlers:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def server_close(self):
+        self.stop_sessions()
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        if sys.stdout is self.stdout:
+            sys.stdout = self.stdout.default
+
+
+def serve(core, socket_path=None):
+    """Запускает сервер и обслуживает клиентов до Ctrl-C или SIGTERM."""
+    import signal
+
+    socket_path = socket_path or default_socket_path()
+    server = ShellServer(core, socket_path)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"System_Shell server listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
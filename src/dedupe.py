@@ -0,0 +1,109 @@
+import os
+import stat
+import uuid
+import errno
+from collections import defaultdict
+
+from copy_engine import clone_file, copy_file
+
+# Служебные файлы SQLite: пока они есть рядом с базой, она открыта или не сброшена на диск
+SQLITE_SIDE_FILES = ("-wal", "-shm", "-journal")
+
+
+def sqlite_in_use(path):
+    """Служебный файл SQLite или база, рядом с которой он есть: такие файлы нельзя заменять ссылками."""
+    if path.endswith(SQLITE_SIDE_FILES):
+        return True
+    return any(os.path.lexists(path + suffix) for suffix in SQLITE_SIDE_FILES)
+
+
+def find_duplicates(entries, cache, algo="sha256", jobs=8, on_error=None, cancel=None):
+    """
+    Группы одинаковых файлов среди entries — пар (путь, os.stat_result).
+    Файлы сначала группируются по устройству и размеру, и только в группах из
+    нескольких файлов считаются контрольные суммы (через DigestCache cache).
+    Пути, уже ссылающиеся на один inode, считаются одним файлом, открытые
+    базы SQLite (sqlite_in_use) пропускаются.
+
+    Возвращает список групп [(путь, stat), ...], отсортированных по пути:
+    первый файл группы остаётся, остальные — дубликаты.
+    """
+    from hashing import iter_digests
+
+    by_size = defaultdict(dict)
+    for path, st in entries:
+        by_size[(st.st_dev, st.st_size)].setdefault(st.st_ino, (path, st))
+
+    candidates = {}
+    for files in by_size.values():
+        if len(files) > 1:
+            candidates.update(item for item in files.values() if not sqlite_in_use(item[0]))
+
+    groups = defaultdict(list)
+    for path, digest, _, error in iter_digests(sorted(candidates), algo, cache, jobs, cancel=cancel):
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            continue
+        st = candidates[path]
+        groups[(st.st_dev, st.st_size, digest)].append((path, st))
+    return [sorted(files) for files in groups.values() if len(files) > 1]
+
+
+def _staging(path):
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.dedupe-{uuid.uuid4().hex[:8]}")
+
+
+def _replace(path, make):
+    """Создаёт новую версию path функцией make(staging) и атомарно ставит её на место."""
+    staging = _staging(path)
+    try:
+        make(staging)
+        os.replace(staging, path)
+    except BaseException:
+        if os.path.lexists(staging):
+            os.remove(staging)
+        raise
+
+
+def replace_with_link(keep, path, mode="link", expected=None):
+    """
+    Заменяет дубликат path жёсткой ссылкой (mode="link") или клоном
+    (mode="reflink") файла keep. expected — stat дубликата при поиске: если
+    файл с тех пор изменился, он не трогается (FileExistsError).
+    Возвращает запись для журнала операций с правами и временем path для undo.
+    """
+    st = os.lstat(path)
+    if expected is not None and (st.st_size, st.st_mtime_ns) != (expected.st_size, expected.st_mtime_ns):
+        raise FileExistsError(errno.EEXIST, "file changed since it was hashed", path)
+
+    def make(staging):
+        if mode == "link":
+            os.link(keep, staging)
+        elif clone_file(keep, staging):
+            # У клона свои метаданные: оставляем права и время дубликата
+            os.chmod(staging, stat.S_IMODE(st.st_mode))
+            os.utime(staging, ns=(st.st_atime_ns, st.st_mtime_ns))
+        else:
+            os.remove(staging)
+            raise OSError(errno.EOPNOTSUPP, "reflink is not supported by the filesystem", path)
+
+    _replace(path, make)
+    return {
+        "path": path,
+        "src_path": keep,
+        "mode": mode,
+        "st_mode": stat.S_IMODE(st.st_mode),
+        "atime_ns": st.st_atime_ns,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+
+def restore_copy(item):
+    """Отменяет замену: path снова становится отдельной копией с прежними правами и временем."""
+    def make(staging):
+        copy_file(item["path"], staging)
+        os.chmod(staging, item["st_mode"])
+        os.utime(staging, ns=(item["atime_ns"], item["mtime_ns"]))
+
+    _replace(item["path"], make)
@@ -0,0 +1,182 @@
+import os
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    ino INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    own_bytes INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+UNITS = ["B", "K", "M", "G", "T", "P"]
+
+
+def _subtree(path):
+    """Границы диапазона ключей для всех путей внутри path (для запроса по индексу)."""
+    return path + os.sep, path + chr(ord(os.sep) + 1)
+
+
+def human_size(size):
+    """1536 → '1.5K', как du -h."""
+    value = float(size)
+    for unit in UNITS:
+        if value < 1024 or unit == UNITS[-1]:
+            if unit == "B":
+                return f"{int(value)}"
+            return f"{value:.1f}{unit}" if value < 10 else f"{value:.0f}{unit}"
+        value /= 1024
+
+
+class SizeCache:
+    """
+    Постоянный кэш du в SQLite: для каждой директории — размер файлов
+    непосредственно в ней и список поддиректорий. Запись действительна, пока у
+    директории не изменились inode и mtime (они меняются при создании,
+    удалении и переименовании записей в ней). Изменение размера файла на месте
+    mtime директории не меняет, поэтому cp/mv/rm сбрасывают затронутые записи явно.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def load(self, root):
+        """Записи для root и всех директорий внутри него: {path: (ino, mtime_ns, own, files, subdirs)}."""
+        low, high = _subtree(root)
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT path, ino, mtime_ns, own_bytes, files, subdirs FROM dirs "
+                "WHERE path = ? OR (path >= ? AND path < ?)",
+                (root, low, high),
+            ).fetchall()
+        return {path: (ino, mtime, own, files, json.loads(subdirs))
+                for path, ino, mtime, own, files, subdirs in rows}
+
+    def update(self, rows, stale=()):
+        """Сохраняет пересчитанные директории и удаляет исчезнувшие одной транзакцией."""
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, ino, mtime, own, files, json.dumps(subdirs))
+                 for path, (ino, mtime, own, files, subdirs) in rows],
+            )
+            self.db.executemany("DELETE FROM dirs WHERE path = ?", [(path,) for path in stale])
+
+    def invalidate(self, paths):
+        """Сбрасывает записи для путей, их поддеревьев и родительских директорий."""
+        with self._lock, self.db:
+            for path in paths:
+                path = os.path.abspath(path)
+                low, high = _subtree(path)
+                self.db.execute(
+                    "DELETE FROM dirs WHERE path IN (?, ?) OR (path >= ? AND path < ?)",
+                    (path, os.path.dirname(path), low, high),
+                )
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+def scan_dir(path):
+    """Читает одну директорию: (размер файлов в ней, число файлов, имена поддиректорий)."""
+    own = 0
+    files = 0
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    own += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+            except OSError:
+                continue
+    return own, files, subdirs
+
+
+def dir_sizes(root, cache=None, jobs=8, on_error=None, cancel=None):
+    """
+    Считает размеры всех директорий дерева root (видимый размер файлов, как
+    du --apparent-size). Уровни дерева обходятся в пуле потоков; для каждой
+    директории сначала проверяется кэш по (inode, mtime), и только при промахе
+    она читается через os.scandir.
+
+    Возвращает (totals, records, stats): полный размер каждой директории,
+    записи (own, files, subdirs) и счётчики {"scanned", "cached"}.
+    Если выставлен cancel (threading.Event), обход прерывается InterruptedError
+    между уровнями; уже прочитанные директории сохраняются в кэш.
+    """
+    root = os.path.abspath(root)
+    cached = cache.load(root) if cache is not None else {}
+
+    def visit(path):
+        try:
+            st = os.lstat(path)
+            hit = cached.get(path)
+            if hit is not None and hit[0] == st.st_ino and hit[1] == st.st_mtime_ns:
+                return hit, True
+            return (st.st_ino, st.st_mtime_ns) + scan_dir(path), False
+        except OSError as e:
+            return e, False
+
+    records = {}
+    updates = []
+    levels = []
+    stats = {"scanned": 0, "cached": 0}
+    level = [root]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while level:
+            if cancel is not None and cancel.is_set():
+                if cache is not None and updates:
+                    cache.update(updates)
+                raise InterruptedError("cancelled")
+            levels.append(level)
+            next_level = []
+            for path, (result, hit) in zip(level, pool.map(visit, level)):
+                if isinstance(result, OSError):
+                    if on_error is not None:
+                        on_error(result)
+                    records[path] = (0, 0, [])
+                    continue
+                stats["cached" if hit else "scanned"] += 1
+                if not hit:
+                    updates.append((path, result))
+                records[path] = result[2:]
+                next_level.extend(os.path.join(path, name) for name in result[4])
+            level = next_level
+
+    totals = {}
+    for level in reversed(levels):
+        for path in level:
+            own, _, subdirs = records[path]
+            totals[path] = own + sum(totals[os.path.join(path, name)] for name in subdirs)
+
+    if cache is not None and (updates or len(cached) > len(records)):
+        cache.update(updates, [path for path in cached if path not in records])
+    return totals, records, stats
+
+
+def iter_du(root, display, totals, records, max_depth=None):
+    """Строки вывода du в порядке обхода: поддиректории раньше родителя, до глубины max_depth."""
+    stack = [(root, display, 0, False)]
+    while stack:
+        path, shown, depth, expanded = stack.pop()
+        subdirs = records[path][2]
+        if expanded or not subdirs or (max_depth is not None and depth >= max_depth):
+            if max_depth is None or depth <= max_depth:
+                yield totals[path], shown
+            continue
+        stack.append((path, shown, depth, True))
+        for name in sorted(subdirs, reverse=True):
+            stack.append((os.path.join(path, name), os.path.join(shown, name), depth + 1, False))
@@ -3,35 +3,101 @@
 from ansi import Colors
 from functools import wraps
 
+def report_os_error(core, command_name, error, full_command=None):
+    """
+    Выводит и логирует ошибку ОС, не прерывая выполнение команды. Используется
+    декоратором и командами, которые продолжают работу после ошибки (обход в find/grep).
+    """
+    error_msg = f"{command_name}: {str(error)}"
+    print(f"{Colors.RED}{error_msg}{Colors.RESET}")
+    core.log(full_command or command_name, False, error_msg)
+    return error_msg
+
+
+def instrument(command_name):
+    """
+    Декоратор для команд со своей обработкой ошибок (history, undo, конвейер):
+    время выполнения, фазы и счётчики команды записываются в core.metrics.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            from metrics import measure
+            with measure(self.core, command_name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def command_args(command_name, args, kwargs):
+    """
+    Аргументы вызова команды в виде, как их пишут в логе и истории при успехе:
+    списки путей сокращаются summarize_args, именованные значения становятся
+    флагами и опциями из описания команды в registry (flag_r=True -> -r).
+    """
+    from operations import summarize_args
+    from registry import COMMANDS
+
+    spec = COMMANDS.get(command_name)
+    flags = {}
+    options = {}
+    if spec is not None:
+        # Из синонимов флага (-n и --dry-run) выбирается длинная форма
+        for flag, key in sorted(spec.flags.items(), key=lambda item: not item[0].startswith("--")):
+            flags.setdefault(key, flag)
+        for option, (name, _) in spec.options.items():
+            options.setdefault(name, option)
+    positional = list(spec.positional) if spec is not None else list(kwargs)
+    keyword = sorted(kwargs.items(), key=lambda item: positional.index(item[0]) if item[0] in positional
+                     else len(positional))
+
+    result = []
+    named = []
+    for name, value in [(None, value) for value in args] + keyword:
+        if value is None or value is False:
+            continue
+        if name is None or name in positional:
+            result += summarize_args(value) if isinstance(value, (list, tuple)) else [str(value)]
+        elif (name, value) in flags:
+            named.append(flags[(name, value)])
+        elif value is True:
+            named.append(f"--{name.replace('_', '-')}")
+        else:
+            named += [options.get(name, f"--{name.replace('_', '-')}"), str(value)]
+    return result + named
+
+
 def handle_os_errors(command_name):
     """
     Декоратор для автоматической обработки стандартных ошибок системы (OSError,
-    FileNotFoundError и т.д.) для функций класса ShellCommands.
+    FileNotFoundError и т.д.) для функций класса ShellCommands. Заодно, как
+    instrument(), измеряет время выполнения команды.
     """
     def decorator(func):
         @wraps(func)
         def wrapper(self, *args, **kwargs):
+            from metrics import measure
             core = self.core
-            
-            try:
-                return func(self, *args, **kwargs)
 
-            except (OSError, IsADirectoryError, FileNotFoundError, PermissionError) as e:
-                error_msg = f"{command_name}: {str(e)}"
-                print(f"{Colors.RED}{error_msg}{Colors.RESET}")
-                
-                command_args = [a for a in args if a is not None]
-                full_command = f"{command_name} {' '.join(map(str, command_args))}"
-                
-                core.log(full_command, False, error_msg)
-                core.history_add(command_name, list(args), False)
-                
-            except Exception as e:
-                error_msg = f"{command_name}: Unexpected error: {type(e).__name__}: {str(e)}"
-                print(f"{Colors.RED}{error_msg}{Colors.RESET}")
-                
-                core.log(command_name, False, error_msg)
-                core.history_add(command_name, list(args), False)
-                
+            with measure(core, command_name):
+                try:
+                    return func(self, *args, **kwargs)
+
+                except (OSError, IsADirectoryError, FileNotFoundError, PermissionError) as e:
+                    # Парсер передаёт аргументы по имени, поэтому учитываем и kwargs
+                    call_args = command_args(command_name, args, kwargs)
+                    full_command = " ".join([command_name] + call_args)
+
+                    report_os_error(core, command_name, e, full_command)
+                    core.history_add(command_name, call_args, False)
+
+                except Exception as e:
+                    call_args = command_args(command_name, args, kwargs)
+                    error_msg = f"{command_name}: Unexpected error: {type(e).__name__}: {str(e)}"
+                    print(f"{Colors.RED}{error_msg}{Colors.RESET}")
+
+                    core.log(" ".join([command_name] + call_args), False, error_msg)
+                    core.history_add(command_name, call_args, False)
+
         return wrapper
     return decorator
\ No newline at end of file
@@ -0,0 +1,65 @@
+import os
+import mmap
+
+READ_CHUNK = 256 * 1024
+
+
+def iter_chunks(path, start=0, end=None, chunk_size=READ_CHUNK):
+    """Читает файл кусками фиксированного размера в диапазоне байт [start, end)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else max(end - start, 0)
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def head_offset(path, count, chunk_size=READ_CHUNK):
+    """Возвращает смещение конца первых count строк (None — если строк меньше)."""
+    if count <= 0:
+        return 0
+    offset = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return None
+            found = chunk.count(b"\n")
+            if found >= count:
+                idx = -1
+                for _ in range(count):
+                    idx = chunk.index(b"\n", idx + 1)
+                return offset + idx + 1
+            count -= found
+            offset += len(chunk)
+
+
+def tail_offset(path, count):
+    """
+    Возвращает смещение начала последних count строк. Поиск идёт от конца
+    файла через mmap, поэтому файл не сканируется целиком.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or count <= 0:
+            return size
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = size - 1 if mm[size - 1:size] == b"\n" else size
+            for _ in range(count):
+                pos = mm.rfind(b"\n", 0, pos)
+                if pos == -1:
+                    return 0
+            return pos + 1
+
+
+def parse_range(text):
+    """Разбирает диапазон байт вида START:END (любая граница может отсутствовать)."""
+    start, sep, end = text.partition(":")
+    if not sep or not all(part.isdigit() for part in (start, end) if part):
+        raise ValueError(f"invalid byte range '{text}' (expected START:END)")
+    return int(start) if start else 0, int(end) if end else None
@@ -0,0 +1,127 @@
+import os
+import re
+import fnmatch
+
+MAGIC = re.compile(r"[*?\[]")
+
+
+def has_magic(pattern):
+    return MAGIC.search(pattern) is not None
+
+
+def _compile(segment):
+    if segment == "**":
+        return segment
+    return re.compile(fnmatch.translate(segment)).match
+
+
+def _split(pattern):
+    """Делит шаблон на литеральный префикс (базовую директорию) и сегменты с масками."""
+    parts = pattern.replace("\\", "/").split("/") if os.sep == "\\" else pattern.split("/")
+    base = []
+    while parts and not has_magic(parts[0]):
+        base.append(parts.pop(0))
+
+    base_text = os.sep if base == [""] else os.sep.join(base)
+    return base_text, [p for p in parts if p]
+
+
+def expand(pattern, cwd):
+    """
+    Раскрывает шаблон в стиле shell (*, ?, [...], **) относительно cwd.
+    Каждая директория читается через os.scandir не больше одного раза: для неё
+    хранится множество позиций в шаблоне (как в НКА), которые могут продолжиться
+    внутри неё. Скрытые файлы подходят только под сегменты, начинающиеся с точки.
+    Возвращает отсортированный список путей в той же форме, в которой они
+    записаны в шаблоне, или [pattern], если совпадений нет (как в bash).
+    """
+    if not has_magic(pattern):
+        return [pattern]
+
+    base, segments = _split(pattern)
+    matchers = [_compile(s) for s in segments]
+    last = len(segments)
+    start_dir = os.path.join(cwd, base) if base else cwd
+
+    def closure(states):
+        # "**" может соответствовать нулю директорий
+        result = set()
+        stack = list(states)
+        while stack:
+            i = stack.pop()
+            if i in result:
+                continue
+            result.add(i)
+            if i < last and matchers[i] == "**":
+                stack.append(i + 1)
+        return result
+
+    matches = []
+    stack = [(start_dir, base, frozenset([0]))]
+    while stack:
+        dir_path, rel, states = stack.pop()
+        states = closure(states)
+        try:
+            it = os.scandir(dir_path)
+        except OSError:
+            continue
+
+        if len(states) == 1:
+            (i,) = states
+            if i + 1 == last and matchers[i] != "**":
+                # Последний сегмент без "**": тип записей не нужен, только фильтр по имени
+                matcher = matchers[i]
+                dotted = segments[i].startswith(".")
+                with it:
+                    for entry in it:
+                        name = entry.name
+                        if (dotted or not name.startswith(".")) and matcher(name):
+                            matches.append(os.path.join(rel, name) if rel else name)
+                continue
+
+        with it:
+            for entry in it:
+                name = entry.name
+                hidden = name.startswith(".")
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                matched = False
+                next_states = set()
+                for i in states:
+                    if i == last:
+                        continue
+                    matcher = matchers[i]
+                    if matcher == "**":
+                        if hidden:
+                            continue
+                        if i + 1 == last:
+                            matched = True
+                        if is_dir:
+                            next_states.add(i)
+                    elif (not hidden or segments[i].startswith(".")) and matcher(name):
+                        if i + 1 == last or (i + 2 == last and matchers[i + 1] == "**"):
+                            matched = True
+                        if is_dir and i + 1 < last:
+                            next_states.add(i + 1)
+
+                entry_rel = os.path.join(rel, name) if rel else name
+                if matched:
+                    matches.append(entry_rel)
+                if next_states and is_dir:
+                    stack.append((entry.path, entry_rel, frozenset(next_states)))
+
+    if not matches:
+        return [pattern]
+    matches.sort()
+    return matches
+
+
+def expand_all(patterns, cwd):
+    """Раскрывает список аргументов, сохраняя их порядок."""
+    result = []
+    for pattern in patterns:
+        result.extend(expand(pattern, cwd))
+    return result
@@ -0,0 +1,150 @@
+import os
+import mmap
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHMS = ("sha256", "blake2b")
+
+# hashlib отпускает GIL при обновлении буфером больше 2 КБ, поэтому крупные
+# куски хэшируются в нескольких потоках параллельно
+CHUNK_SIZE = 8 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    algo TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (dev, ino, algo)
+) WITHOUT ROWID;
+"""
+
+
+def hash_file(path, algo="sha256", mmap_threshold=1024 * 1024):
+    """
+    Контрольная сумма файла. Небольшие файлы читаются одним read(), крупные
+    отображаются через mmap и хэшируются кусками по CHUNK_SIZE без копирования в Python.
+    Возвращает (hex-строка, размер).
+    """
+    h = hashlib.new(algo)
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_threshold:
+            h.update(f.read())
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if hasattr(data, "madvise"):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(data) as view:
+                    for offset in range(0, len(view), CHUNK_SIZE):
+                        h.update(view[offset:offset + CHUNK_SIZE])
+    return h.hexdigest(), size
+
+
+class DigestCache:
+    """
+    Постоянный кэш контрольных сумм в SQLite. Запись относится к файлу
+    (устройство, inode) и действительна, пока у него не изменились размер и
+    mtime_ns, поэтому неизменные файлы повторно не читаются. Запись для
+    изменённого файла перезаписывается при следующем подсчёте.
+    Новые записи фиксируются пачками по commit_every и при flush()/close().
+    """
+
+    def __init__(self, path, commit_every=500):
+        self.path = os.path.abspath(path)
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def get(self, st, algo):
+        """Сохранённая сумма для файла с результатом stat st или None."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT size, mtime_ns, digest FROM digests WHERE dev = ? AND ino = ? AND algo = ?",
+                (st.st_dev, st.st_ino, algo),
+            ).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        return None
+
+    def put(self, st, algo, digest):
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, algo, st.st_size, st.st_mtime_ns, digest),
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self.db.commit()
+                self._pending = 0
+
+    def lookup(self, path, algo="sha256", mmap_threshold=1024 * 1024):
+        """
+        Сумма файла из кэша или, при промахе, с чтением файла.
+        Возвращает (сумма, прочитано байт): 0 байт — попадание в кэш.
+        """
+        st = os.stat(path)
+        digest = self.get(st, algo)
+        if digest is not None:
+            return digest, 0
+        digest, size = hash_file(path, algo, mmap_threshold)
+        # Файл менялся во время чтения — такую сумму не кэшируем
+        if os.stat(path).st_mtime_ns == st.st_mtime_ns:
+            self.put(st, algo, digest)
+        return digest, size
+
+    def digest(self, path, algo="sha256"):
+        return self.lookup(path, algo)[0]
+
+    def flush(self):
+        with self._lock:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self.db.commit()
+            self.db.close()
+
+
+def iter_digests(paths, algo="sha256", cache=None, jobs=8, mmap_threshold=1024 * 1024, cancel=None):
+    """
+    Считает суммы файлов paths в пуле из jobs потоков и отдаёт
+    (путь, сумма, прочитано байт, ошибка) в порядке paths. Вперёд
+    запускается не больше jobs * 4 файлов, поэтому paths может быть
+    ленивым обходом большого дерева.
+    """
+    def job(path):
+        try:
+            if cache is not None:
+                digest, nbytes = cache.lookup(path, algo, mmap_threshold)
+            else:
+                digest, nbytes = hash_file(path, algo, mmap_threshold)
+            return path, digest, nbytes, None
+        except OSError as e:
+            return path, None, 0, e
+
+    window = max(jobs, 1) * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        try:
+            for path in paths:
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError("cancelled")
+                pending.append(pool.submit(job, path))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
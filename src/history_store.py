@@ -0,0 +1,212 @@
+import os
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    command TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    other_data TEXT,
+    line TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_time ON history (time);
+CREATE INDEX IF NOT EXISTS history_failed ON history (id) WHERE status = 0;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Полнотекстовый индекс по строке команды: триграммы позволяют искать любую
+# подстроку (часть пути, аргумента) без просмотра всей таблицы
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_text
+    USING fts5(line, content='history', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS history_text_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_text (rowid, line) VALUES (new.id, new.line);
+END;
+CREATE TRIGGER IF NOT EXISTS history_text_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_text (history_text, rowid, line) VALUES ('delete', old.id, old.line);
+END;
+"""
+
+# Триграммный индекс не находит подстроки короче трёх символов
+MIN_FTS_TEXT = 3
+
+
+def command_line(command, args):
+    return " ".join([command] + [str(arg) for arg in args])
+
+
+class HistoryStore:
+    """
+    История команд в SQLite: одна строка на команду, без ограничения числа
+    записей. Поиск по подстроке идёт через FTS5 (триграммы), выборка ошибочных
+    команд — через частичный индекс, а --since — через индекс по времени,
+    поэтому запросы с лимитом не просматривают всю историю.
+
+    В буферизованном режиме (пакетное выполнение скриптов) транзакция
+    фиксируется только при flush()/close().
+    """
+
+    def __init__(self, path, buffered=False):
+        self.path = os.path.abspath(path)
+        self.buffered = buffered
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite без FTS5 или без триграмм: поиск работает через LIKE
+            self.fts = False
+
+    @staticmethod
+    def _decode(row):
+        return {
+            "id": row["id"],
+            "time": row["time"],
+            "command": row["command"],
+            "args": json.loads(row["args"]),
+            "status": bool(row["status"]),
+            "other_data": json.loads(row["other_data"]) if row["other_data"] else {},
+        }
+
+    @staticmethod
+    def _encode(record):
+        args = record.get("args", [])
+        return (
+            record.get("time", ""),
+            record["command"],
+            json.dumps(args, ensure_ascii=False),
+            1 if record.get("status", True) else 0,
+            json.dumps(record["other_data"], ensure_ascii=False) if record.get("other_data") else None,
+            command_line(record["command"], args),
+        )
+
+    def _insert(self, records):
+        self.db.executemany(
+            "INSERT INTO history (time, command, args, status, other_data, line) VALUES (?, ?, ?, ?, ?, ?)",
+            (self._encode(record) for record in records),
+        )
+
+    def migrate_legacy(self, legacy_path):
+        """
+        Один раз переносит записи старого файла истории (JSON-массив или JSON
+        Lines) в базу; после переноса файл переименовывается в *.migrated.
+        """
+        if not os.path.exists(legacy_path):
+            return 0
+        with self._lock:
+            if self.db.execute("SELECT 1 FROM meta WHERE key = 'legacy'").fetchone():
+                return 0
+            with open(legacy_path, "rb") as f:
+                data = f.read()
+            if data.lstrip().startswith(b"["):
+                records = json.loads(data)
+            else:
+                records = []
+                for line in data.splitlines():
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Недописанная при аварийном завершении строка
+                        continue
+            records = [record for record in records if isinstance(record, dict) and "command" in record]
+            with self.db:
+                self._insert(records)
+                self.db.execute("INSERT INTO meta (key, value) VALUES ('legacy', ?)", (legacy_path,))
+        os.replace(legacy_path, legacy_path + ".migrated")
+        return len(records)
+
+    def append(self, record):
+        """Добавляет запись; вне буферизованного режима сразу фиксирует транзакцию."""
+        with self._lock:
+            self._insert([record])
+            if not self.buffered:
+                self.db.commit()
+
+    def load_tail(self, count):
+        """Последние count записей в хронологическом порядке."""
+        return self.search(limit=count)
+
+    def search(self, text=None, failed=False, since=None, limit=None):
+        """
+        Записи в хронологическом порядке, подходящие под все условия: text —
+        подстрока строки команды (без учёта регистра), failed — только
+        ошибочные, since — время ISO не раньше которого выполнена команда.
+        limit — только последние limit подходящих записей.
+        """
+        conditions = []
+        params = []
+        source = "history"
+        order = "history.id"
+        if text:
+            # Ошибочных команд мало: с failed выгоднее идти по частичному индексу
+            # history_failed и проверять строку через LIKE, чем пересекать его
+            # с большим множеством совпадений FTS
+            if self.fts and len(text) >= MIN_FTS_TEXT and not failed:
+                source = "history_text JOIN history ON history.id = history_text.rowid"
+                conditions.append("history_text MATCH ?")
+                params.append('"' + text.replace('"', '""') + '"')
+                # Сортировка по rowid FTS-таблицы идёт по индексу и останавливается на limit
+                order = "history_text.rowid"
+            else:
+                conditions.append("history.line LIKE ? ESCAPE '\\'")
+                escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params.append(f"%{escaped}%")
+        if failed:
+            conditions.append("history.status = 0")
+        if since:
+            # Записи добавляются в порядке времени, поэтому границу по времени
+            # переводим в границу по id через индекс history_time; по rowid
+            # ограничивается и обход FTS-индекса
+            with self._lock:
+                first = self.db.execute(
+                    "SELECT id FROM history WHERE time >= ? ORDER BY time LIMIT 1", (since,)
+                ).fetchone()
+            if first is None:
+                return []
+            conditions.append(f"{order} >= ?")
+            params.append(first["id"])
+
+        sql = f"SELECT history.* FROM {source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [self._decode(row) for row in reversed(rows)]
+
+    def count(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def recent_lines(self, count):
+        """Последние count различных строк команд (для поиска Ctrl-R в readline), от старых к новым."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT line, MAX(id) AS last FROM "
+                "(SELECT id, line FROM history ORDER BY id DESC LIMIT ?) "
+                "GROUP BY line ORDER BY last",
+                (count * 4,),
+            ).fetchall()
+        return [row["line"] for row in rows[-count:]]
+
+    def flush(self):
+        with self._lock:
+            self.db.commit()
+
+    def close(self):
+        with self._lock:
+            self.db.commit()
+            self.db.close()
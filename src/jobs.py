@@ -0,0 +1,249 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ansi import Colors
+
+
+class JobOutput:
+    """Вывод фоновой задачи: копится в памяти (не больше limit символов) и показывается по завершении."""
+
+    def __init__(self, limit=1024 * 1024):
+        self.limit = limit
+        self.size = 0
+        self.truncated = False
+        self._parts = []
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if self.size + len(text) > self.limit:
+                text = text[:max(self.limit - self.size, 0)]
+                self.truncated = True
+            self._parts.append(text)
+            self.size += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        with self._lock:
+            text = "".join(self._parts)
+        if self.truncated:
+            text += f"{Colors.YELLOW}... output truncated{Colors.RESET}\n"
+        return text
+
+
+class RoutedStdout:
+    """
+    Замена sys.stdout: потоки фоновых задач пишут в свой JobOutput, все
+    остальные — в исходный поток. Так print() в командах не нужно менять.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def route(self, target):
+        self._local.target = target
+
+    def unroute(self):
+        self._local.target = None
+
+    def _target(self):
+        return getattr(self._local, "target", None) or self.default
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class JobContext:
+    """
+    Контекст фоновой задачи вместо System_Shell: своя текущая директория
+    (снимок на момент запуска, поэтому последующий cd её не меняет), свой
+    статус и флаг отмены. Лог, история, корзина и журналы общие с shell.
+    """
+
+    def __init__(self, core):
+        self._core = core
+        self.current_dir = core.current_dir
+        self.assume_yes = core.assume_yes
+        self.last_status = True
+        self.cancel_event = threading.Event()
+        self.progress = None
+
+    def __getattr__(self, name):
+        return getattr(self._core, name)
+
+    def change_dir(self, path):
+        self.current_dir = path
+
+    def log(self, command, status=True, error_msg=""):
+        self.last_status = status
+        self._core.write_log(command, status, error_msg)
+
+    def confirm(self, prompt):
+        """Фоновая задача не может спросить пользователя: без -y подтверждение считается отказом."""
+        if self.assume_yes is not None:
+            return self.assume_yes
+        print(f"{Colors.YELLOW}{prompt.strip()} n (background job; run with -y or in foreground){Colors.RESET}")
+        return False
+
+
+class Job:
+    def __init__(self, job_id, line, context):
+        self.id = job_id
+        self.line = line
+        self.context = context
+        self.output = JobOutput()
+        self.started = time.time()
+        self.finished = None
+        self.running = False
+        self.future = None
+        self.reported = False
+
+    @property
+    def status(self):
+        if self.finished is None:
+            return "Running" if self.running else "Waiting"
+        if self.context.cancel_event.is_set() and not self.context.last_status:
+            return "Cancelled"
+        return "Done" if self.context.last_status else "Failed"
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def describe(self):
+        line = f"[{self.id}] {self.status:<9} {self.elapsed():>8.1f}s  {self.line}"
+        progress = self.context.progress
+        if progress is not None and self.finished is None:
+            line += f"  ({progress.render()})"
+        return line
+
+
+class JobManager:
+    """
+    Фоновые задачи (команда с "&" в конце). Команды выполняются в пуле
+    потоков на отдельном экземпляре ShellCommands с JobContext; вывод каждой
+    задачи перехватывается и печатается, когда она завершится.
+    """
+
+    def __init__(self, core, workers=4, output_limit=1024 * 1024):
+        self.core = core
+        self.output_limit = output_limit
+        self.jobs = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        # Сервер (daemon.py) мог уже подменить sys.stdout — тогда используем его маршрутизацию
+        self._own_stdout = not isinstance(sys.stdout, RoutedStdout)
+        self._stdout = RoutedStdout(sys.stdout) if self._own_stdout else sys.stdout
+        sys.stdout = self._stdout
+
+    def submit(self, line, method, kwargs, origin=None):
+        """
+        Ставит команду в очередь. origin — контекст, из которого она запущена
+        (System_Shell или сессия сервера): от него берутся текущая директория и -y.
+        """
+        with self._lock:
+            job = Job(self._next_id, line, JobContext(origin or self.core))
+            job.output.limit = self.output_limit
+            self._next_id += 1
+            self.jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, method, kwargs)
+        return job
+
+    def _run(self, job, method, kwargs):
+        from operations import ShellCommands
+
+        job.running = True
+        self._stdout.route(job.output)
+        try:
+            if job.context.cancel_event.is_set():
+                raise InterruptedError("cancelled before start")
+            getattr(ShellCommands(job.context), method)(**kwargs)
+        except Exception as e:
+            job.context.last_status = False
+            print(f"{Colors.RED}{job.line}: {type(e).__name__}: {e}{Colors.RESET}")
+        finally:
+            self._stdout.unroute()
+            job.finished = time.time()
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ProcessLookupError(f"no such job {job_id}")
+        return job
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.finished is None]
+
+    def kill(self, job_id):
+        """Просит задачу остановиться; ждущая в очереди задача снимается сразу."""
+        job = self.get(job_id)
+        if job.finished is not None:
+            return False
+        job.context.cancel_event.set()
+        if job.future.cancel():
+            job.context.last_status = False
+            job.finished = time.time()
+        return True
+
+    def wait(self, job_id=None):
+        """Ждёт одну задачу или все запущенные; возвращает дождавшиеся задачи."""
+        jobs = [self.get(job_id)] if job_id is not None else list(self.jobs.values())
+        for job in jobs:
+            if not job.future.cancelled():
+                job.future.result()
+        return jobs
+
+    def report(self, jobs=None, stream=None):
+        """
+        Печатает ещё не показанные завершённые задачи вместе с их выводом и
+        забывает их (как jobs в bash), чтобы задачи и их вывод не копились в памяти.
+        """
+        stream = stream or sys.stdout
+        for job in list(jobs if jobs is not None else self.jobs.values()):
+            if job.finished is None or job.reported:
+                continue
+            job.reported = True
+            output = job.output.getvalue()
+            if output:
+                stream.write(output if output.endswith("\n") else output + "\n")
+            color = Colors.GREEN if job.status == "Done" else Colors.RED
+            stream.write(f"{color}{job.describe()}{Colors.RESET}\n")
+            with self._lock:
+                self.jobs.pop(job.id, None)
+        stream.flush()
+
+    def close(self, quiet=False):
+        """
+        Дожидается запущенных задач (Ctrl-C — отменить их) и возвращает sys.stdout.
+        quiet=True — без сообщений и отчёта о задачах (клиент сервера отключился).
+        """
+        running = self.running()
+        if running and not quiet:
+            print(f"Waiting for {len(running)} background job(s); Ctrl-C to cancel them")
+            try:
+                self.wait()
+            except KeyboardInterrupt:
+                for job in running:
+                    self.kill(job.id)
+        self._pool.shutdown(wait=True)
+        if not quiet:
+            self.report()
+        if self._own_stdout and sys.stdout is self._stdout:
+            sys.stdout = self._stdout.default
@@ -0,0 +1,80 @@
+import os
+import heapq
+import itertools
+from datetime import datetime
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIME_CACHE_SIZE = 4096
+
+# Ключи сортировки: ls -t (сначала новые) и ls -S (сначала большие)
+SORT_KEYS = {"time": 2, "size": 1}
+
+
+class TimeFormatter:
+    """Кэширует отформатированное время: у соседних файлов mtime часто совпадает до секунды."""
+
+    def __init__(self):
+        self.cache = {}
+
+    def __call__(self, timestamp):
+        key = int(timestamp)
+        text = self.cache.get(key)
+        if text is None:
+            if len(self.cache) >= TIME_CACHE_SIZE:
+                self.cache.clear()
+            text = datetime.fromtimestamp(key).strftime(TIME_FORMAT)
+            self.cache[key] = text
+        return text
+
+
+def entry_row(entry):
+    """Возвращает компактный кортеж (имя, размер, mtime, режим) по данным DirEntry."""
+    try:
+        stat = entry.stat()
+    except OSError:
+        # Битая символическая ссылка: берём данные самой ссылки
+        stat = entry.stat(follow_symlinks=False)
+    return entry.name, stat.st_size, stat.st_mtime, stat.st_mode
+
+
+def format_row(row, format_time):
+    name, size, mtime, mode = row
+    return f"{name} \t{size}\t{format_time(mtime)}\t{oct(mode)[-3:]}"
+
+
+def iter_rows(work_dir, sort_by=None, limit=None):
+    """
+    Перебирает элементы директории через os.scandir. Без сортировки элементы
+    выдаются по мере чтения; с сортировкой и limit в памяти держится только
+    limit лучших строк (heapq.nlargest).
+    """
+    with os.scandir(work_dir) as it:
+        rows = (entry_row(entry) for entry in it)
+        if sort_by is None:
+            yield from itertools.islice(rows, limit)
+            return
+
+        key_index = SORT_KEYS[sort_by]
+        if limit is not None:
+            best = heapq.nlargest(limit, rows, key=lambda row: row[key_index])
+        else:
+            best = sorted(rows, key=lambda row: row[key_index], reverse=True)
+    yield from best
+
+
+def iter_names(work_dir, limit=None):
+    """Быстрый путь для ls без флагов: только имена, без stat."""
+    with os.scandir(work_dir) as it:
+        for entry in itertools.islice(it, limit):
+            yield entry.name
+
+
+def iter_listing(work_dir, flag_l=False, sort_by=None, limit=None):
+    """Генератор строк вывода ls."""
+    if sort_by is None and not flag_l:
+        yield from iter_names(work_dir, limit)
+        return
+
+    format_time = TimeFormatter()
+    for row in iter_rows(work_dir, sort_by, limit):
+        yield format_row(row, format_time) if flag_l else row[0]
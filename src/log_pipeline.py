@@ -0,0 +1,170 @@
+import os
+import gzip
+import queue
+import shutil
+import threading
+import time
+import logging
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+
+def gzip_rotator(source, dest):
+    """Сжимает ротированный сегмент лога в dest (*.gz) и удаляет исходный файл."""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler с опциональным gzip-сжатием ротированных сегментов
+    и записью пачки записей с одним flush в конце.
+    """
+
+    def __init__(self, filename, mode="a", maxBytes=0, backupCount=0,
+                 encoding=None, delay=False, errors=None, compress=False):
+        super().__init__(filename, mode, maxBytes, backupCount, encoding, delay, errors)
+        self.compress = compress
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = gzip_rotator
+
+    def emit_batch(self, records):
+        """Записывает пачку записей, проверяя ротацию перед каждой и делая flush один раз."""
+        self.acquire()
+        try:
+            for record in records:
+                if record.levelno < self.level or not self.filter(record):
+                    continue
+                try:
+                    msg = self.format(record) + self.terminator
+                    if self.stream is None:
+                        self.stream = self._open()
+                    if self.maxBytes > 0 and self.stream.tell() + len(msg) >= self.maxBytes:
+                        self.doRollover()
+                        if self.stream is None:
+                            self.stream = self._open()
+                    self.stream.write(msg)
+                except Exception:
+                    self.handleError(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler для ограниченной очереди. Если очередь заполнена, ждёт не дольше
+    put_timeout секунд (запись считается задержанной), после чего запись отбрасывается.
+    """
+
+    def __init__(self, log_queue, put_timeout=0.05):
+        super().__init__(log_queue)
+        self.put_timeout = put_timeout
+        self.delayed = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Счётчики обновляют все потоки, которые пишут в лог (задачи, сессии сервера)
+            with self.lock:
+                self.delayed += 1
+            try:
+                self.queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+
+
+class BatchQueueListener:
+    """Фоновый поток, который забирает записи из очереди пачками и передаёт их обработчикам."""
+
+    _sentinel = None
+
+    def __init__(self, log_queue, handlers, batch_size=500):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.written = 0
+        self.batches = 0
+        self.max_lag = 0.0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _write(self, batch):
+        for handler in self.handlers:
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(batch)
+            else:
+                for record in batch:
+                    handler.handle(record)
+        self.written += len(batch)
+        self.batches += 1
+        self.max_lag = max(self.max_lag, time.time() - batch[0].created)
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = self._sentinel in batch
+            records = [r for r in batch if r is not self._sentinel]
+            if records:
+                self._write(records)
+            if stop:
+                return
+
+    def stop(self):
+        """Дописывает всё, что осталось в очереди, и останавливает поток."""
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+
+class LogPipeline:
+    """Переводит логгер в асинхронный режим: запись в файл выполняется в фоновом потоке."""
+
+    def __init__(self, logger, maxsize=10000, batch_size=500, put_timeout=0.05):
+        self.logger = logger
+        self.handlers = list(logger.handlers)
+        self.queue = queue.Queue(maxsize)
+        self.queue_handler = BoundedQueueHandler(self.queue, put_timeout)
+        self.listener = BatchQueueListener(self.queue, self.handlers, batch_size)
+
+        for handler in self.handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(self.queue_handler)
+        self.listener.start()
+        self.running = True
+
+    def stats(self):
+        return {
+            "written": self.listener.written,
+            "batches": self.listener.batches,
+            "delayed": self.queue_handler.delayed,
+            "dropped": self.queue_handler.dropped,
+            "max_lag": round(self.listener.max_lag, 3),
+        }
+
+    def stop(self):
+        """Гарантированно сбрасывает очередь и возвращает логгеру синхронные обработчики."""
+        if not self.running:
+            return
+        self.running = False
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            handler.flush()
+            self.logger.addHandler(handler)
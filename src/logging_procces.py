@@ -1,21 +1,53 @@
-import os
+import copy
 import logging
 import logging.config
-import json
+import sqlite3
 from datetime import datetime
-from config import LOGGING_CONFIG
+from config import LOGGING_CONFIG, LOG_QUEUE_CONFIG, HISTORY_CONFIG
 from ansi import Colors
+from log_pipeline import LogPipeline
 
 
-def setup_logging():
-    """Загружает конфигурацию для логирования из файла config.py и возвращает логгер."""
+def setup_logging(filename=None):
+    """
+    Загружает конфигурацию для логирования из файла config.py и возвращает логгер.
+    filename — путь к файлу лога вместо указанного в конфигурации (shell передаёт
+    абсолютный путь, чтобы cd до первой записи не менял место лога).
+    """
+    config = LOGGING_CONFIG
+    if filename is not None:
+        config = copy.deepcopy(LOGGING_CONFIG)
+        config["handlers"]["file"]["filename"] = filename
     try:
-        logging.config.dictConfig(LOGGING_CONFIG)
+        logging.config.dictConfig(config)
         return logging.getLogger("shell_logger")
     except Exception as e:
         print(f"{Colors.RED}Ошибка при настройке логирования: {e}{Colors.RESET}")
         return logging.getLogger("default") # Возвращаем дефолтный на случай ошибки
 
+def start_log_pipeline(logger):
+    """Переводит запись лога в фоновый поток, если это включено в LOG_QUEUE_CONFIG."""
+    if not LOG_QUEUE_CONFIG["enabled"] or not logger.handlers:
+        return None
+    return LogPipeline(
+        logger,
+        maxsize=LOG_QUEUE_CONFIG["maxsize"],
+        batch_size=LOG_QUEUE_CONFIG["batch_size"],
+        put_timeout=LOG_QUEUE_CONFIG["put_timeout"],
+    )
+
+def stop_log_pipeline(pipeline):
+    """Дописывает очередь лога на диск и сообщает о задержанных и потерянных записях."""
+    if pipeline is None:
+        return
+    pipeline.stop()
+    stats = pipeline.stats()
+    if stats["dropped"] or stats["delayed"]:
+        message = (f"log queue: {stats['dropped']} dropped, {stats['delayed']} delayed, "
+                   f"max lag {stats['max_lag']}s")
+        print(f"{Colors.YELLOW}{message}{Colors.RESET}")
+        pipeline.logger.warning(message)
+
 def add_log(logger, command, status=True, error_msg=""):
     """
     Добавляет записи в лог-файл shell.log.
@@ -24,27 +56,19 @@ def add_log(logger, command, status=True, error_msg=""):
     logger.info(f"{command} - {status_str}")
 
 
-def check_history(history_file, history_list):
-    """Загружает историю команд из файла."""
+def check_history(store, history_list, legacy_path=HISTORY_CONFIG["legacy"],
+                  count=HISTORY_CONFIG["load_entries"]):
+    """Загружает из базы последние count команд (старый файл .history переносится в неё)."""
     try:
-        if os.path.exists(history_file):
-            with open(history_file, "r", encoding="utf-8") as f:
-                history_list.extend(json.load(f))
-    except OSError:
+        store.migrate_legacy(legacy_path)
+        history_list.extend(store.load_tail(count))
+    except (OSError, ValueError, sqlite3.Error):
         print(f"{Colors.RED}Файл истории не найден или ошибка чтения.{Colors.RESET}")
 
 
-def save_history(history_file, history_list):
-    """Сохраняет последние 10 команд из списка в файл."""
-    try:
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(history_list[-10:], f, ensure_ascii=False, indent=4)
-    except OSError:
-        print(f"{Colors.YELLOW}Не удалось сохранить историю команд.{Colors.RESET}")
-
-def add_to_history(history_list, history_file, command, args, status=True, other_data=None):
+def add_to_history(history_list, store, command, args, status=True, other_data=None):
     """
-    Добавляет команду и информацию о ней в список и сохраняет историю.
+    Добавляет команду и информацию о ней в список и в базу истории.
     """
     command_history_info = {
         "time": datetime.now().isoformat(),
@@ -54,4 +78,7 @@ def add_to_history(history_list, history_file, command, args, status=True, other
         "other_data": other_data or {},
     }
     history_list.append(command_history_info)
-    save_history(history_file, history_list)
\ No newline at end of file
+    try:
+        store.append(command_history_info)
+    except (OSError, sqlite3.Error):
+        print(f"{Colors.YELLOW}Не удалось сохранить историю команд.{Colors.RESET}")
@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import mmap
+import time
+import bisect
+from datetime import datetime, timedelta
+
+# Запись лога: "[2025-10-20 03:26:55] cp a b - SUCCESS" или "... - ERROR: сообщение"
+STAMP = re.compile(rb"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ")
+RECORD = re.compile(rb"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] (.*?) - (SUCCESS|ERROR(?:: (.*))?)\s*\Z", re.S)
+STAMP_LEN = 21  # "[YYYY-MM-DD HH:MM:SS]"
+
+RELATIVE = re.compile(r"(\d+)([smhdw])")
+UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"]
+
+
+def parse_time(value, now=None):
+    """
+    Время для --since/--until: "2025-10-20", "2025-10-20 03:27[:00]" (или с "T")
+    либо относительное "30m", "2h", "7d" назад. Возвращает bytes в формате лога,
+    которые можно сравнивать с метками записей напрямую.
+    """
+    match = RELATIVE.fullmatch(value)
+    if match:
+        now = now or datetime.now()
+        moment = now - timedelta(**{UNITS[match.group(2)]: int(match.group(1))})
+    else:
+        for fmt in FORMATS:
+            try:
+                moment = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"invalid time '{value}' (expected YYYY-MM-DD[ HH:MM[:SS]] or 30m/2h/7d)")
+    return moment.strftime("%Y-%m-%d %H:%M:%S").encode()
+
+
+def _is_record(data, pos):
+    return STAMP.match(data, pos) is not None
+
+
+def record_start(data, pos, end=None):
+    """Начало первой записи, начинающейся не раньше pos (или end, если таких нет)."""
+    end = len(data) if end is None else end
+    if pos <= 0:
+        if _is_record(data, 0):
+            return 0
+        pos = 1
+    while pos < end:
+        newline = data.find(b"\n", pos - 1, end)
+        if newline < 0 or newline + 1 >= end:
+            return end
+        if _is_record(data, newline + 1):
+            return newline + 1
+        pos = newline + 2
+    return end
+
+
+def stamp_at(data, pos):
+    return data[pos + 1:pos + STAMP_LEN - 1]
+
+
+def lower_bound(data, key, lo=0, hi=None):
+    """
+    Бинарный поиск по байтовым смещениям: начало первой записи с меткой
+    времени >= key. Записи лога упорядочены по времени, а их границы
+    находятся по ближайшему переводу строки, поэтому файл не читается целиком.
+    Требуется, чтобы записи до lo были раньше key, а запись в hi — не раньше.
+    """
+    hi = len(data) if hi is None else hi
+    lo = record_start(data, lo, hi)
+    hi_start = hi
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = record_start(data, mid, hi_start)
+        if start >= hi_start:
+            hi = mid
+        elif stamp_at(data, start) < key:
+            lo = start + 1
+        else:
+            hi = mid
+            hi_start = start
+    return record_start(data, lo, hi_start)
+
+
+class LogIndex:
+    """
+    Разреженный индекс лога в файле рядом с ним (shell.log.idx): смещение и
+    метка времени первой записи после каждых stride байт. Строится не проходом
+    по файлу, а чтением одной строки в каждой точке, дописывается, когда лог
+    растёт, и перестраивается после ротации (сменился inode или файл стал меньше).
+    """
+
+    def __init__(self, log_path, stride=64 * 1024):
+        self.log_path = log_path
+        self.path = log_path + ".idx"
+        self.stride = stride
+        self.ino = None
+        self.size = 0
+        self.offsets = []
+        self.stamps = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("stride") != self.stride:
+            return
+        self.ino = state["ino"]
+        self.size = state["size"]
+        self.offsets = [offset for offset, _ in state["entries"]]
+        self.stamps = [stamp.encode() for _, stamp in state["entries"]]
+
+    def _save(self):
+        state = {
+            "ino": self.ino,
+            "size": self.size,
+            "stride": self.stride,
+            "entries": [[offset, stamp.decode()] for offset, stamp in zip(self.offsets, self.stamps)],
+        }
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def update(self, data, ino):
+        """Приводит индекс в соответствие с содержимым data (mmap лога). Возвращает True, если он изменился."""
+        size = len(data)
+        valid = (
+            ino == self.ino
+            and size >= self.size
+            and all(stamp_at(data, offset) == stamp
+                    for offset, stamp in zip(self.offsets[-1:], self.stamps[-1:]))
+        )
+        if not valid:
+            self.ino, self.size, self.offsets, self.stamps = ino, 0, [], []
+        if size == self.size:
+            return not valid
+
+        position = self.size - self.size % self.stride
+        while position < size:
+            start = record_start(data, position)
+            if start < size and (not self.offsets or start > self.offsets[-1]):
+                self.offsets.append(start)
+                self.stamps.append(stamp_at(data, start))
+            position += self.stride
+        self.size = size
+        self._save()
+        return True
+
+    def bounds(self, key, size):
+        """Диапазон смещений, в котором лежит первая запись с меткой >= key."""
+        i = bisect.bisect_left(self.stamps, key)
+        lo = self.offsets[i - 1] if i > 0 else 0
+        hi = self.offsets[i] if i < len(self.offsets) else size
+        return lo, hi
+
+
+def parse_record(raw):
+    """Разбирает запись лога в словарь (для JSON-вывода и фильтров)."""
+    text = raw.rstrip(b"\r\n")
+    match = RECORD.match(text)
+    if match is None:
+        stamp = STAMP.match(text)
+        return {"time": stamp.group(1).decode() if stamp else "", "command": "",
+                "line": text[STAMP_LEN + 1:].decode("utf-8", "replace"), "status": "", "error": ""}
+    line = match.group(2).decode("utf-8", "replace")
+    return {
+        "time": match.group(1).decode(),
+        "command": line.split(" ", 1)[0],
+        "line": line,
+        "status": "SUCCESS" if match.group(3) == b"SUCCESS" else "ERROR",
+        "error": (match.group(4) or b"").decode("utf-8", "replace"),
+    }
+
+
+def iter_records(data, start, end):
+    """Записи (bytes) между смещениями start и end; строки без метки относятся к предыдущей записи."""
+    pos = start
+    while pos < end:
+        following = record_start(data, pos + 1, end)
+        yield data[pos:following]
+        pos = following
+
+
+def iter_records_reverse(data, start, end):
+    """Записи между start и end от последней к первой (для -n без чтения всего диапазона)."""
+    stop = end
+    pos = end
+    while pos > start:
+        newline = data.rfind(b"\n", start, pos - 1)
+        candidate = newline + 1 if newline >= 0 else start
+        if candidate == start or _is_record(data, candidate):
+            yield data[candidate:stop]
+            stop = candidate
+        pos = candidate
+
+
+def make_filter(command=None, status=None):
+    """Проверка записи по имени команды и статусу (SUCCESS/ERROR) без полного разбора."""
+    command_prefix = command.encode() if command else None
+    status = status.upper() if status else None
+
+    def matches(raw):
+        if command_prefix is not None:
+            rest = raw[STAMP_LEN + 1:]
+            if not (rest.startswith(command_prefix)
+                    and rest[len(command_prefix):len(command_prefix) + 1] in (b" ", b"")):
+                return False
+        if status is not None:
+            if (status == "SUCCESS") != raw.rstrip().endswith(b" - SUCCESS"):
+                return False
+        return True
+
+    return matches
+
+
+def query(path, since=None, until=None, command=None, status=None, last=None, index=True):
+    """
+    Записи лога path (bytes) в диапазоне [since, until] с фильтрами по
+    команде и статусу; last — только последние last подходящих записей.
+    Границы диапазона находятся бинарным поиском по mmap (с разреженным
+    индексом, если index=True). Возвращает (список записей, смещение конца файла).
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], 0
+    with f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return [], 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            sparse = None
+            if index and (since is not None or until is not None):
+                sparse = LogIndex(path)
+                sparse.update(data, st.st_ino)
+
+            def bound(key):
+                lo, hi = sparse.bounds(key, size) if sparse is not None else (0, size)
+                return lower_bound(data, key, lo, hi)
+
+            start = bound(since) if since is not None else record_start(data, 0)
+            # Первая запись позже until: ключ с нулевым байтом больше любой метки, равной until
+            end = bound(until + b"\0") if until is not None else size
+            matches = make_filter(command, status)
+
+            if last is None:
+                records = [raw for raw in iter_records(data, start, end) if matches(raw)]
+            else:
+                records = []
+                for raw in iter_records_reverse(data, start, end):
+                    if len(records) >= last:
+                        break
+                    if matches(raw):
+                        records.append(raw)
+                records.reverse()
+            return records, size
+
+
+def follow(path, offset, command=None, status=None, interval=0.25, cancel=None):
+    """
+    Генератор новых записей лога, начиная со смещения offset (как tail -f).
+    Пока файл не меняется, проверяется только его размер; после ротации
+    (сменился inode или файл стал меньше) чтение продолжается с начала нового файла.
+    """
+    matches = make_filter(command, status)
+    try:
+        ino = os.stat(path).st_ino
+    except FileNotFoundError:
+        ino = None
+    pending = b""
+    while cancel is None or not cancel.is_set():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and (st.st_ino != ino or st.st_size < offset):
+            ino, offset, pending = st.st_ino, 0, b""
+        if st is None or st.st_size == offset:
+            if cancel is not None:
+                cancel.wait(interval)
+            else:
+                time.sleep(interval)
+            continue
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read(st.st_size - offset)
+        offset += len(chunk)
+        data = pending + chunk
+        # Последняя строка может быть записана не полностью
+        cut = data.rfind(b"\n") + 1
+        data, pending = data[:cut], data[cut:]
+        if data:
+            for raw in iter_records(data, record_start(data, 0), len(data)):
+                if matches(raw):
+                    yield raw
+
+
+def format_record(raw, as_json=False):
+    if as_json:
+        record = parse_record(raw)
+        record["time"] = record["time"].replace(" ", "T")
+        return json.dumps(record, ensure_ascii=False)
+    return raw.rstrip(b"\r\n").decode("utf-8", "replace")
@@ -1,9 +1,58 @@
+import sys
 from shell_core import System_Shell
 from parser import ShellParser
+from config import SCRIPT_CONFIG
 
-if __name__ == "__main__":
-    shell_core = System_Shell()
 
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="System_Shell")
+    parser.add_argument("-f", "--file", help="execute commands from a script file")
+    parser.add_argument("-i", "--interactive", action="store_true",
+                        help="force the interactive prompt even if stdin is not a TTY")
+    parser.add_argument("--fail-fast", action="store_true", help="stop at the first failed command")
+    parser.add_argument("--flush-every", type=int, default=SCRIPT_CONFIG["flush_every"],
+                        help="flush history to disk every N commands in script mode")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="answer 'yes' to confirmations in script mode")
+    parser.add_argument("--serve", action="store_true",
+                        help="run as a server on a Unix socket (see src/client.py)")
+    parser.add_argument("--socket", help="server socket path")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv) if argv else None
+    script = options.file if options else None
+    interactive = options.interactive if options else False
+
+    if script is None and not interactive and sys.stdin.isatty():
+        interactive = True
+
+    shell_core = System_Shell()
     shell_parser = ShellParser(shell_core)
 
-    shell_parser.run()
\ No newline at end of file
+    try:
+        if options and options.serve:
+            from daemon import serve
+            return serve(shell_core, options.socket)
+
+        if interactive:
+            shell_parser.run()
+            return 0
+
+        shell_core.batch_mode = True
+        shell_core.assume_yes = bool(options and options.yes)
+        fail_fast = bool(options and options.fail_fast)
+        flush_every = options.flush_every if options else SCRIPT_CONFIG["flush_every"]
+        if script is None:
+            return shell_parser.run_script(sys.stdin, fail_fast, flush_every)
+        with open(script, "r", encoding="utf-8") as f:
+            return shell_parser.run_script(f, fail_fast, flush_every)
+    finally:
+        shell_core.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+import sys
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Нижняя граница и шаг корзин гистограммы: 1 мкс, каждая следующая корзина на 5% шире
+BASE = 1e-6
+GROWTH = 1.05
+
+# Измерение команды, выполняемой в текущем потоке (фоновые задачи и сессии
+# сервера выполняются в своих потоках и видят только свои измерения)
+_current = contextvars.ContextVar("measurement", default=None)
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с логарифмическими корзинами: память не зависит
+    от числа измерений, а перцентили вычисляются с погрешностью не больше 5%.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = int(math.log(max(seconds, BASE) / BASE, GROWTH))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(BASE * GROWTH ** (index + 1), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(0.5) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "total_ms": round(self.total * 1000, 3),
+        }
+
+
+class CommandStats:
+    def __init__(self):
+        self.wall = Histogram()
+        self.errors = 0
+        self.files = 0
+        self.bytes = 0
+        self.phases = {}
+
+
+class Measurement:
+    """Время, фазы и счётчики одного выполнения команды."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.bytes = 0
+        self.phases = {}
+        self.progress = []
+
+    def finish(self):
+        # Счётчики копирования (CopyProgress) ведёт copy_engine, забираем их в конце
+        for progress in self.progress:
+            self.files += progress.files
+            self.bytes += progress.bytes
+        return time.perf_counter() - self.started
+
+
+class Metrics:
+    """
+    Статистика выполнения команд за сессию: гистограммы времени (всей команды
+    и её фаз) и счётчики файлов, байт и ошибок по каждой команде.
+    Общая для shell, фоновых задач и сессий сервера, поэтому защищена блокировкой.
+    """
+
+    def __init__(self, export_every=100):
+        self.export_every = export_every
+        self.commands = {}
+        self._unexported = 0
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, measurement, ok=True):
+        """Учитывает выполнение команды. Возвращает True, когда пора выгрузить статистику в лог."""
+        with self._lock:
+            stats = self.commands.get(name)
+            if stats is None:
+                stats = self.commands[name] = CommandStats()
+            stats.wall.add(seconds)
+            stats.errors += 0 if ok else 1
+            stats.files += measurement.files
+            stats.bytes += measurement.bytes
+            for phase_name, spent in measurement.phases.items():
+                stats.phases.setdefault(phase_name, Histogram()).add(spent)
+            self._unexported += 1
+            return bool(self.export_every) and self._unexported >= self.export_every
+
+    def snapshot(self):
+        """Статистика по командам в виде словаря (для stats --json и выгрузки в лог)."""
+        with self._lock:
+            result = {}
+            for name, stats in sorted(self.commands.items()):
+                entry = stats.wall.summary()
+                entry.update(errors=stats.errors, files=stats.files, bytes=stats.bytes)
+                entry["phases"] = {phase_name: histogram.summary()
+                                   for phase_name, histogram in sorted(stats.phases.items())}
+                result[name] = entry
+            return result
+
+    def mark_exported(self):
+        """Отмечает выгрузку. Возвращает False, если с прошлой выгрузки ничего не выполнялось."""
+        with self._lock:
+            pending = self._unexported
+            self._unexported = 0
+            return pending > 0
+
+    def reset(self):
+        with self._lock:
+            self.commands.clear()
+            self._unexported = 0
+
+
+@contextmanager
+def measure(core, name):
+    """
+    Измеряет выполнение команды name и записывает результат в core.metrics.
+    Команда считается ошибочной, если выбросила исключение или выставила
+    core.last_status = False. Без core.metrics (тестовые заглушки) ничего не делает.
+    """
+    metrics = getattr(core, "metrics", None)
+    if metrics is None:
+        yield None
+        return
+
+    measurement = Measurement()
+    token = _current.set(measurement)
+    ok = False
+    try:
+        yield measurement
+        ok = getattr(core, "last_status", True)
+    finally:
+        _current.reset(token)
+        if metrics.record(name, measurement.finish(), measurement, ok):
+            core.export_metrics()
+
+
+def add(files=0, nbytes=0):
+    """Учитывает обработанные файлы и байты в измерении текущей команды."""
+    measurement = _current.get()
+    if measurement is not None:
+        measurement.files += files
+        measurement.bytes += nbytes
+
+
+def count_bytes(chunks):
+    """Пропускает поток байтовых кусков, учитывая их размер в измерении текущей команды."""
+    measurement = _current.get()
+    for chunk in chunks:
+        if measurement is not None:
+            measurement.bytes += len(chunk)
+        yield chunk
+
+
+def track(progress):
+    """Подключает счётчики CopyProgress к измерению текущей команды."""
+    measurement = _current.get()
+    if measurement is not None:
+        measurement.progress.append(progress)
+
+
+@contextmanager
+def phase(name):
+    """Отдельно измеряет фазу команды (обход, копирование, запись журналов)."""
+    measurement = _current.get()
+    if measurement is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurement.phases[name] = measurement.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def profile(func, top=15, sort="cumulative", stream=None):
+    """Выполняет func под cProfile и выводит top самых затратных функций."""
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        stats = pstats.Stats(profiler, stream=stream or sys.stdout)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
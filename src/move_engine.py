@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import uuid
+import errno
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from copy_engine import (
+    CopyProgress, copy_file_chunked, parallel_copytree, plan_tree, _same_file_state,
+)
+
+# Состояния перемещения между устройствами в порядке выполнения
+COPYING = "copying"
+COMMITTING = "committing"
+REMOVING = "removing"
+
+
+class MoveJournal:
+    """
+    Журнал незавершённых перемещений между устройствами: по JSON-файлу на
+    перемещение. Файл переписывается атомарно (временный файл + os.replace)
+    при каждой смене состояния и удаляется, когда перемещение завершено.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, record):
+        return os.path.join(self.directory, f"{record['id']}.json")
+
+    def save(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(record)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def remove(self, record):
+        try:
+            os.remove(self._path(record))
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """Незавершённые перемещения в порядке их начала."""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        records = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(records, key=lambda record: record["started"])
+
+
+def file_digest(path, algo="blake2b"):
+    """Контрольная сумма файла (для проверки копии при mv --verify)."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, algo).hexdigest()
+
+
+def _same_content(src, dst, digest=None):
+    if os.path.islink(src):
+        return os.path.islink(dst) and os.readlink(src) == os.readlink(dst)
+    digest = digest or file_digest
+    try:
+        return digest(src) == digest(dst)
+    except FileNotFoundError:
+        return False
+
+
+def verify_copy(src, dst, jobs=8, digest=None):
+    """
+    Сравнивает контрольные суммы всех файлов src и их копий в dst. Возвращает несовпавшие пути копий.
+    digest(path) — функция подсчёта суммы (например, через кэш hashing.DigestCache).
+    """
+    if os.path.isdir(src) and not os.path.islink(src):
+        _, files = plan_tree(src, dst, symlinks=True)
+        pairs = [(src_path, dst_path) for src_path, dst_path, _ in files]
+    else:
+        pairs = [(src, dst)]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        same = list(pool.map(lambda pair: _same_content(*pair, digest), pairs))
+    return [dst_path for (_, dst_path), ok in zip(pairs, same) if not ok]
+
+
+def staging_path(dst, move_id):
+    """Временное имя рядом с местом назначения: переименование в dst атомарно в пределах одной ФС."""
+    return os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.mv-{move_id}.partial")
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _copy(record, jobs, progress_interval, show_progress, cancel, progress_hook):
+    src = record["src"]
+    staging = record["staging"]
+    if record["is_dir"]:
+        parallel_copytree(
+            src, staging, jobs=jobs, progress_interval=progress_interval, show_progress=show_progress,
+            cancel=cancel, progress_hook=progress_hook, symlinks=True, resume=os.path.lexists(staging),
+        )
+        return
+    if os.path.islink(src):
+        if os.path.lexists(staging):
+            os.remove(staging)
+        os.symlink(os.readlink(src), staging)
+        return
+    if _same_file_state(src, staging):
+        return
+
+    if show_progress is None:
+        show_progress = sys.stdout.isatty()
+    progress = CopyProgress(1, os.stat(src).st_size, progress_interval, sys.stdout if show_progress else None)
+    if progress_hook is not None:
+        progress_hook(progress)
+    progress.start()
+    try:
+        copy_file_chunked(src, staging, jobs=jobs, progress=progress, cancel=cancel)
+        progress.add(0)
+    finally:
+        progress.stop()
+
+
+def resume_move(record, journal=None, jobs=8, verify=None, progress_interval=0.5, show_progress=None,
+                cancel=None, progress_hook=None, digest=None):
+    """
+    Выполняет (или продолжает по записи журнала) перемещение между устройствами:
+    копирование в staging → проверка → атомарное переименование → удаление источника.
+    Состояние сохраняется в журнал перед каждым шагом, поэтому прерванное
+    перемещение можно продолжить с того же места: уже скопированные файлы
+    (совпадают размер и mtime) не копируются повторно.
+    """
+    save = journal.save if journal is not None else (lambda record: None)
+    src, dst, staging = record["src"], record["dst"], record["staging"]
+    verify = record.get("verify", False) if verify is None else verify
+
+    if record["state"] == COPYING:
+        if not os.path.lexists(src):
+            raise FileNotFoundError(errno.ENOENT, "source of interrupted move is gone", src)
+        _copy(record, jobs, progress_interval, show_progress, cancel, progress_hook)
+        if verify:
+            bad = verify_copy(src, staging, jobs, digest)
+            if bad:
+                # Испорченные копии удаляем, чтобы повторный запуск скопировал их заново
+                for path in bad:
+                    if os.path.lexists(path):
+                        os.remove(path)
+                raise OSError(errno.EIO, f"checksum mismatch in {len(bad)} file(s), run mv --resume to retry", src)
+        record["state"] = COMMITTING
+        save(record)
+
+    if record["state"] == COMMITTING:
+        # Если staging уже нет, а dst есть — переименование успело пройти до сбоя
+        if os.path.lexists(staging) or not os.path.lexists(dst):
+            os.replace(staging, dst)
+        record["state"] = REMOVING
+        save(record)
+
+    if record["state"] == REMOVING:
+        _remove(src)
+        if journal is not None:
+            journal.remove(record)
+    return record
+
+
+def move_path(src, dst, journal=None, jobs=8, verify=False, progress_interval=0.5, show_progress=None,
+              cancel=None, progress_hook=None, digest=None):
+    """
+    Перемещает src в dst. В пределах одного устройства это один os.rename за
+    O(1). Между устройствами (EXDEV) данные копируются параллельно во временное
+    имя рядом с dst, при verify сверяются контрольные суммы, затем копия
+    атомарно переименовывается в dst и только после этого удаляется источник.
+    Возвращает "rename" или "copy".
+    """
+    try:
+        os.rename(src, dst)
+        return "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    move_id = uuid.uuid4().hex[:8]
+    record = {
+        "id": move_id,
+        "src": src,
+        "dst": dst,
+        "staging": staging_path(dst, move_id),
+        "is_dir": os.path.isdir(src) and not os.path.islink(src),
+        "verify": verify,
+        "state": COPYING,
+        "started": time.time(),
+    }
+    if journal is not None:
+        journal.save(record)
+    resume_move(record, journal, jobs, verify, progress_interval, show_progress, cancel, progress_hook, digest)
+    return "copy"
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+
+class JsonLinesFile:
+    """
+    Файл записей в формате JSON Lines: записи дописываются в конец, fsync
+    выполняется пачками (раз в fsync_every записей или fsync_interval секунд).
+    """
+
+    def __init__(self, path, fsync_every=20, fsync_interval=1.0, buffered=False):
+        self.path = os.path.abspath(path)
+        # В буферизованном режиме (пакетное выполнение скриптов) записи копятся
+        # в буфере файла и попадают на диск только при flush()/close()
+        self.buffered = buffered
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def _encode(record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        return (line + "\n").encode("utf-8")
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _sync_locked(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _close_locked(self):
+        if self._file is not None:
+            self._sync_locked()
+            self._file.close()
+            self._file = None
+
+    def read_all(self):
+        """Построчно читает все записи от начала к концу."""
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Недописанная при аварийном завершении строка
+                    continue
+
+    def append(self, record):
+        """Дописывает одну запись."""
+        line = self._encode(record)
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            self._pending += 1
+            if not self.buffered:
+                f.flush()
+                if (self._pending >= self.fsync_every
+                        or time.monotonic() - self._last_sync >= self.fsync_interval):
+                    self._sync_locked()
+
+    def rewrite(self, records):
+        """Атомарно заменяет содержимое файла переданными записями."""
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            self._close_locked()
+            with open(tmp_path, "wb") as f:
+                for record in records:
+                    f.write(self._encode(record))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def flush(self):
+        """Сбрасывает на диск все накопленные записи."""
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+
+class OperationJournal:
+    """
+    Журнал отменяемых операций (cp, mv, rm), отдельный от истории команд.
+
+    Операции хранятся двумя стеками: выполненные (для undo) и отменённые
+    (для redo), поэтому каждый шаг undo/redo занимает O(1). На диске журнал
+    хранится как последовательность событий do/undo/redo в формате JSON Lines
+    и восстанавливается при запуске. Когда событий накапливается слишком
+    много, файл заменяется одним снимком состояния.
+    """
+
+    def __init__(self, path, compact_every=1000, buffered=False):
+        self.storage = JsonLinesFile(path, buffered=buffered)
+        self.compact_every = compact_every
+        self.done = []
+        self.undone = []
+        self.next_id = 1
+        self._events = 0
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        return self.storage.path
+
+    def load(self):
+        """Восстанавливает стеки, проигрывая события из файла."""
+        with self._lock:
+            self.done.clear()
+            self.undone.clear()
+            self._events = 0
+            for event in self.storage.read_all():
+                self._apply(event)
+                self._events += 1
+
+            ids = [op["id"] for op in self.done + self.undone]
+            self.next_id = max(ids, default=0) + 1
+
+    def _apply(self, event):
+        kind = event.get("event")
+        if kind == "snapshot":
+            self.done[:] = event["done"]
+            self.undone[:] = event["undone"]
+        elif kind == "do":
+            self.done.append(event["op"])
+            self.undone.clear()
+        elif kind == "undo" and self.done:
+            self.undone.append(self.done.pop())
+        elif kind == "redo" and self.undone:
+            self.undone.pop()
+            self.done.append(event["op"])
+
+    def _write(self, event):
+        self._apply(event)
+        self.storage.append(event)
+        self._events += 1
+        if self._events > self.compact_every + len(self.done) + len(self.undone):
+            self.compact()
+
+    def compact(self):
+        """Заменяет файл журнала одним снимком текущего состояния."""
+        with self._lock:
+            self.storage.rewrite(
+                [{"event": "snapshot", "done": self.done, "undone": self.undone}]
+            )
+            self._events = 1
+
+    def push(self, command, args, items, time=None):
+        """Регистрирует выполненную операцию. items — список затронутых путей."""
+        with self._lock:
+            op = {
+                "id": self.next_id,
+                "time": time or datetime.now().isoformat(),
+                "command": command,
+                "args": args,
+                "items": items,
+            }
+            self.next_id += 1
+            self._write({"event": "do", "op": op})
+            return op
+
+    def last_done(self):
+        with self._lock:
+            return self.done[-1] if self.done else None
+
+    def last_undone(self):
+        with self._lock:
+            return self.undone[-1] if self.undone else None
+
+    def mark_undone(self):
+        """Переносит последнюю операцию в стек отменённых."""
+        with self._lock:
+            self._write({"event": "undo"})
+
+    def mark_redone(self, op):
+        """Возвращает операцию в стек выполненных (op — с обновлёнными путями)."""
+        with self._lock:
+            self._write({"event": "redo", "op": op})
+
+    def seed(self, history):
+        """Переносит отменяемые операции из старой истории команд при первом запуске."""
+        if os.path.exists(self.path):
+            return
+        for info in history:
+            other_data = info.get("other_data") or {}
+            if info.get("command") in ("cp", "mv", "rm") and info.get("status", True) and other_data:
+                self.push(info["command"], info.get("args", []), [other_data], info.get("time"))
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
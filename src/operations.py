@@ -1,29 +1,64 @@
 import os
-import shutil
-from datetime import datetime
+import stat
 from ansi import Colors
-from exception_handler import handle_os_errors
+from config import COPY_CONFIG, DU_CONFIG, HASH_CONFIG, LOG_QUERY_CONFIG, MOVE_CONFIG, SEARCH_CONFIG
+from exception_handler import handle_os_errors, instrument, report_os_error
+import metrics
+
+# Модули с реализацией команд (listing, file_reader, copy_engine, shutil и т.д.)
+# импортируются внутри методов, чтобы запуск shell не платил за команды,
+# которые в этой сессии не вызываются.
+
+SORT_FLAGS = {"time": "-t ", "size": "-S "}
+SUMMARY_LIMIT = 20
+# Атрибуты ядра с путями состояния shell и служебные файлы рядом с ними
+# (SQLite в режиме WAL, индекс лога): sync и dedupe их не трогают
+STATE_ATTRS = ("history_file", "legacy_history_file", "log_file", "trash_dir", "moves_dir",
+               "operations_file", "size_cache_file", "digest_cache_file")
+STATE_SUFFIXES = ("-wal", "-shm", "-journal", ".idx")
+
+
+def summarize_args(paths, limit=SUMMARY_LIMIT):
+    """Сокращает длинный список путей для лога и истории: первые limit и счётчик остальных."""
+    if len(paths) <= limit:
+        return list(paths)
+    return list(paths[:limit]) + [f"... (+{len(paths) - limit} more)"]
+
+
+def state_filter(core):
+    """
+    Предикат для абсолютного пути: относится ли он к состоянию самого shell —
+    базе истории, логу, корзине, журналам операций и перемещений, кэшам du и
+    hashsum вместе с их служебными и временными файлами и архивами лога.
+    """
+    roots = {os.path.abspath(path) for path in (getattr(core, attr, None) for attr in STATE_ATTRS) if path}
+    exact = roots | {root + suffix for root in roots for suffix in STATE_SUFFIXES}
+    prefixes = tuple(root + os.sep for root in roots) + tuple(root + "." for root in roots)
+
+    def is_state(path):
+        return path in exact or path.startswith(prefixes)
+    return is_state
 
 class ShellCommands:
     def __init__(self, core):
         self.core = core
 
+    def iter_ls(self, path=None, flag_l=False, sort_by=None, limit=None, stdin=None):
+        from listing import iter_listing
+
+        work_dir = os.path.join(self.core.current_dir, path) if path else self.core.current_dir
+        return iter_listing(work_dir, flag_l, sort_by, limit)
+
     @handle_os_errors("ls")
-    def ls(self, path=None, flag_l=False):
-        work_dir = path if path else self.core.current_dir
+    def ls(self, path=None, flag_l=False, sort_by=None, limit=None):
+        from streams import write_lines
 
-        elems = os.listdir(work_dir)
-        if not flag_l:
-            print("\n".join(elems))
-        else:
-            for elem in elems:
-                full_path = os.path.join(work_dir, elem)
-                stat = os.stat(full_path)
-                print(
-                    f"{elem} \t{stat.st_size}\t{datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')}\t{oct(stat.st_mode)[-3:]}"
-                )
-        
-        self.core.log(f"ls {'-l ' if flag_l else ''}{path if path else ''}")
+        metrics.add(files=write_lines(self.iter_ls(path, flag_l, sort_by, limit)))
+
+        flags = f"{'-l ' if flag_l else ''}{SORT_FLAGS.get(sort_by, '')}"
+        if limit is not None:
+            flags += f"--limit {limit} "
+        self.core.log(f"ls {flags}{path if path else ''}")
         self.core.history_add("ls", [path] if path else [])
 
 
@@ -39,217 +74,1347 @@ class ShellCommands:
         if not os.path.exists(new_dir):
             raise FileNotFoundError(f"Directory '{new_dir}' doesn't exist")
 
-        os.chdir(new_dir)
-        self.core.current_dir = new_dir
+        self.core.change_dir(new_dir)
         
         self.core.log(f"cd {path}")
         self.core.history_add("cd", [path])
 
 
+    def _file_path(self, path):
+        full_path = os.path.join(self.core.current_dir, path)
+        if os.path.isdir(full_path):
+            raise IsADirectoryError(f"{path} is a directory")
+        return full_path
+
+    def iter_cat(self, path=None, binary=False, byte_range=None, stdin=None):
+        """Строки файла (или входа конвейера) по мере чтения, без загрузки файла целиком."""
+        from file_reader import iter_chunks
+        from streams import iter_text_lines
+
+        if path is None:
+            if stdin is None:
+                raise FileNotFoundError("missing file operand")
+            yield from stdin
+            return
+        start, end = byte_range or (0, None)
+        yield from iter_text_lines(iter_chunks(self._file_path(path), start, end))
+
+    def iter_head(self, path=None, count=10, stdin=None):
+        """Первые count строк; на входе конвейера чтение останавливается сразу после них."""
+        from itertools import islice
+        from file_reader import iter_chunks, head_offset
+        from streams import iter_text_lines
+
+        if stdin is not None and (path is None or path.isdigit()):
+            # В конвейере допускается и краткая форма: head 20
+            yield from islice(stdin, int(path) if path else count)
+            return
+        if path is None:
+            raise FileNotFoundError("missing file operand")
+        full_path = self._file_path(path)
+        yield from iter_text_lines(iter_chunks(full_path, 0, head_offset(full_path, count)))
+
+    def iter_tail(self, path=None, count=10, stdin=None):
+        """Последние count строк; вход конвейера проходит через окно из count строк."""
+        from collections import deque
+        from file_reader import iter_chunks, tail_offset
+        from streams import iter_text_lines
+
+        if stdin is not None and (path is None or path.isdigit()):
+            yield from deque(stdin, maxlen=int(path) if path else count)
+            return
+        if path is None:
+            raise FileNotFoundError("missing file operand")
+        full_path = self._file_path(path)
+        yield from iter_text_lines(iter_chunks(full_path, tail_offset(full_path, count)))
+
     @handle_os_errors("cat")
-    def cat(self, path):
+    def cat(self, path, binary=False, byte_range=None):
+        from file_reader import iter_chunks
+        from streams import write_chunks
+
         full_path = os.path.join(self.core.current_dir, path)
 
         if os.path.isdir(full_path):
             raise IsADirectoryError(f"{path} is a directory")
 
-        with open(full_path, "r", encoding="utf-8") as f:
-            print(f"{Colors.BLUE}{f.read()}{Colors.RESET}")
-            
-        self.core.log(f"cat {path}")
+        start, end = byte_range or (0, None)
+        write_chunks(
+            metrics.count_bytes(iter_chunks(full_path, start, end)),
+            binary=binary,
+            prefix=Colors.BLUE,
+            suffix=Colors.RESET,
+        )
+
+        flags = f"{'-b ' if binary else ''}"
+        if byte_range:
+            flags += f"--range {start}:{'' if end is None else end} "
+        self.core.log(f"cat {flags}{path}")
         self.core.history_add("cat", [path])
 
-    @handle_os_errors("cp")
-    def cp(self, src, dst, flag_r=False):
-        src_path = os.path.join(self.core.current_dir, src)
+    @handle_os_errors("head")
+    def head(self, path, count=10):
+        from file_reader import iter_chunks, head_offset
+        from streams import write_chunks
+
+        full_path = os.path.join(self.core.current_dir, path)
+
+        if os.path.isdir(full_path):
+            raise IsADirectoryError(f"{path} is a directory")
+
+        write_chunks(metrics.count_bytes(iter_chunks(full_path, 0, head_offset(full_path, count))))
+
+        self.core.log(f"head -n {count} {path}")
+        self.core.history_add("head", ["-n", str(count), path])
+
+    @handle_os_errors("tail")
+    def tail(self, path, count=10):
+        from file_reader import iter_chunks, tail_offset
+        from streams import write_chunks
+
+        full_path = os.path.join(self.core.current_dir, path)
+
+        if os.path.isdir(full_path):
+            raise IsADirectoryError(f"{path} is a directory")
+
+        write_chunks(metrics.count_bytes(iter_chunks(full_path, tail_offset(full_path, count))))
+
+        self.core.log(f"tail -n {count} {path}")
+        self.core.history_add("tail", ["-n", str(count), path])
+
+    def _check_cancel(self):
+        """Точка кооперативной отмены для фоновых задач (kill)."""
+        cancel = self.core.cancel_event
+        if cancel is not None and cancel.is_set():
+            raise InterruptedError("cancelled")
+
+    def _track(self, progress):
+        self.core.progress = progress
+        metrics.track(progress)
+
+    def _resolve_targets(self, sources, dst, flag_r=True):
+        """
+        Проверяет источники cp/mv (один os.stat на каждый) и вычисляет пути назначения.
+        Возвращает список (src_path, dst_path, is_dir).
+        """
         dst_path = os.path.join(self.core.current_dir, dst)
+        dst_is_dir = os.path.isdir(dst_path)
+        if len(sources) > 1 and not dst_is_dir:
+            raise NotADirectoryError(f"Target '{dst}' is not a directory")
 
-        if not os.path.exists(src_path):
-            raise FileNotFoundError(f"File '{src}' doesn't exist")
+        plan = []
+        for name in sources:
+            src_path = os.path.join(self.core.current_dir, name)
+            try:
+                is_dir = stat.S_ISDIR(os.stat(src_path).st_mode)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"File '{name}' doesn't exist")
+            if is_dir and not flag_r:
+                raise IsADirectoryError(f"'{name}' is a directory")
+
+            target = dst_path
+            if dst_is_dir:
+                target = os.path.join(dst_path, os.path.basename(os.path.normpath(src_path)))
+            plan.append((src_path, target, is_dir))
+        return plan
+
+    def _push(self, command, args, items):
+        """Кладёт операцию в журнал и сбрасывает кэш du для затронутых путей."""
+        self.core.op_push(command, args, items)
+        self._invalidate(items)
+
+    def _invalidate(self, items):
+        """Сбрасывает кэш du и обновляет индекс дополнения путей для затронутых путей."""
+        paths = [item[key] for item in items for key in ("src_path", "dst_path", "path", "trash_path") if key in item]
+        self.core.invalidate_sizes(paths)
+        self.core.refresh_completion(paths)
+
+    def _record(self, command, args, items):
+        """Одна запись в лог, историю и журнал операций на всю (в том числе пакетную) операцию."""
+        other_data = items[0] if len(items) == 1 else {"count": len(items)}
+        with metrics.phase("journal"):
+            self.core.log(f"{command} {' '.join(args)}")
+            self.core.history_add(command, args, other_data=other_data)
+            self._push(command, args, items)
+
+    @handle_os_errors("cp")
+    def cp(self, src, dst, flag_r=False, jobs=None, update=False, link=False, reflink=None):
+        import time
+        from copy_engine import parallel_copytree
+
+        if link and reflink:
+            raise OSError("--link and --reflink can't be used together")
+        mode = "link" if link else reflink or "copy"
+        sources = [src] if isinstance(src, str) else list(src)
+        with metrics.phase("stat"):
+            plan = self._resolve_targets(sources, dst, flag_r)
+            if mode == "link":
+                self._check_same_device(plan)
+            elif mode == "reflink-always":
+                self._check_reflink(os.path.dirname(plan[0][1]))
+        args = summarize_args(sources) + [dst] + (["-r"] if flag_r else []) + (["--update"] if update else [])
+        args += {"link": ["--link"], "reflink": ["--reflink=auto"], "reflink-always": ["--reflink=always"]}.get(mode, [])
+        extra = {"mode": mode} if mode != "copy" else {}
 
+        started = time.monotonic()
+        if update:
+            totals = self._cp_update(plan, args, jobs, mode, extra)
+        else:
+            totals = [0, 0, 0]
+            items = []
+            pending = None
+            try:
+                with metrics.phase("copy"):
+                    for src_path, dst_path, is_dir in plan:
+                        self._check_cancel()
+                        if is_dir:
+                            # Частично скопированное дерево (ошибка, kill) тоже попадает в журнал для undo
+                            if not os.path.lexists(dst_path):
+                                pending = dict(src_path=src_path, dst_path=dst_path, **extra)
+                            progress = parallel_copytree(
+                                src_path,
+                                dst_path,
+                                jobs=jobs or COPY_CONFIG["jobs"],
+                                progress_interval=COPY_CONFIG["progress_interval"],
+                                cancel=self.core.cancel_event,
+                                progress_hook=self._track,
+                                mode=mode,
+                            )
+                            pending = None
+                            self._add_totals(totals, progress.files, progress.bytes, progress.total_bytes)
+                        else:
+                            written = self._copy_one(src_path, dst_path, mode)
+                            self._add_totals(totals, 1, written, os.path.getsize(src_path))
+                            metrics.add(files=1, nbytes=written)
+                        items.append(dict(src_path=src_path, dst_path=dst_path, **extra))
+            except BaseException:
+                # Уже скопированное остаётся отменяемым через undo
+                if pending is not None and os.path.lexists(pending["dst_path"]):
+                    items.append(pending)
+                if items:
+                    self._push("cp", args, items)
+                raise
+            self._record("cp", args, items)
+
+        if mode != "copy":
+            self._report_savings(mode, totals, time.monotonic() - started)
+
+    @staticmethod
+    def _copy_one(src_path, dst_path, mode="copy"):
+        """Копирует один файл (как shutil.copy2) выбранным способом. Возвращает число записанных байт."""
+        import shutil
+        from copy_engine import copy_file
+
+        if mode == "copy":
+            shutil.copy2(src_path, dst_path)
+            return os.path.getsize(dst_path)
         if os.path.isdir(dst_path):
             dst_path = os.path.join(dst_path, os.path.basename(src_path))
+        return copy_file(src_path, dst_path, mode=mode)
+
+    @staticmethod
+    def _add_totals(totals, files, written, total):
+        totals[0] += files
+        totals[1] += written
+        totals[2] += total
 
-        if os.path.isdir(src_path) and not flag_r:
-            raise IsADirectoryError(f"'{src}' is a directory")
+    @staticmethod
+    def _report_savings(mode, totals, elapsed):
+        """Сколько байт записано вместо полного копирования (cp --link/--reflink)."""
+        from dirsize import human_size
 
-        if flag_r and os.path.isdir(src_path):
-            shutil.copytree(src_path, dst_path)
+        files, written, total = totals
+        how = "hard links" if mode == "link" else "reflinks"
+        print(f"cp: {files} file(s), {human_size(written)} of {human_size(total)} bytes written, "
+              f"{human_size(total - written)} saved by {how} in {elapsed:.1f}s")
+
+    @staticmethod
+    def _check_reflink(directory):
+        from copy_engine import reflink_supported
+
+        if not reflink_supported(directory or "."):
+            raise OSError(f"Filesystem of '{directory}' doesn't support reflinks")
+
+    def _check_same_device(self, plan):
+        """Жёсткие ссылки возможны только в пределах одной ФС — проверяем до начала копирования."""
+        for src_path, dst_path, _ in plan:
+            if os.stat(src_path).st_dev != os.stat(os.path.dirname(dst_path) or ".").st_dev:
+                raise OSError(f"Can't hard link '{src_path}' into another filesystem")
+
+    def _cp_update(self, plan, args, jobs=None, mode="copy", extra=None):
+        """
+        cp --update: копирует только новые и изменившиеся файлы (sync без удаления лишнего).
+        Объекты другого типа, чем в источнике (файл на месте директории и наоборот),
+        переносятся в корзину, поэтому undo их возвращает.
+        Возвращает [файлы, записано байт, всего байт].
+        """
+        from sync_engine import compare_trees, needs_copy
+
+        extra = extra or {}
+        totals = [0, 0, 0]
+        items = []
+        try:
+            for src_path, dst_path, is_dir in plan:
+                self._check_cancel()
+                if is_dir:
+                    with metrics.phase("compare"):
+                        tree = compare_trees(src_path, dst_path, symlinks=False, jobs=jobs or COPY_CONFIG["jobs"],
+                                             cancel=self.core.cancel_event)
+                    self._trash_removes(tree, items)
+                    try:
+                        with metrics.phase("copy"):
+                            progress, _ = self._apply_sync(tree, jobs, symlinks=False, mode=mode)
+                    except BaseException:
+                        items.extend(dict(src_path=s, dst_path=d, **extra) for s, d in tree.created
+                                     if os.path.lexists(d))
+                        raise
+                    self._add_totals(totals, progress.files, progress.bytes, progress.total_bytes)
+                    items.extend(dict(src_path=s, dst_path=d, **extra) for s, d in tree.created)
+                elif needs_copy(src_path, dst_path):
+                    with metrics.phase("copy"):
+                        written = self._copy_one(src_path, dst_path, mode)
+                    self._add_totals(totals, 1, written, os.path.getsize(src_path))
+                    metrics.add(files=1, nbytes=written)
+                    items.append(dict(src_path=src_path, dst_path=dst_path, **extra))
+        except BaseException:
+            if items:
+                self._push("cp", args, items)
+            raise
+
+        self._record_changes("cp", args, items)
+        return totals
+
+    def _record_changes(self, command, args, items):
+        """Как _record, но без записи в журнал операций, если ничего не создано и не удалено."""
+        if items:
+            self._record(command, args, items)
         else:
-            shutil.copy2(src_path, dst_path)
-        
-        self.core.log(f"cp {'-r ' if flag_r else ''}{src} {dst}")
-        self.core.history_add(
-            "cp",
-            [src, dst, "-r"] if flag_r else [src, dst],
-            other_data={"src_path": src_path, "dst_path": dst_path},
+            self.core.log(f"{command} {' '.join(args)}")
+            self.core.history_add(command, args)
+
+    def _trash_removes(self, plan, items):
+        """
+        Переносит plan.removes в корзину, добавляя в items записи для undo, и
+        очищает список: apply_plan остаётся только создать и скопировать.
+        """
+        with metrics.phase("trash"), self.core.trash.batch():
+            for path in plan.removes:
+                self._check_cancel()
+                item = self.core.trash.put(path)
+                items.append({"path": item["original_path"], "trash_path": item["trash_path"]})
+        plan.removes = []
+
+    def _apply_sync(self, plan, jobs=None, remove=None, symlinks=True, mode="copy"):
+        from sync_engine import apply_plan
+
+        return apply_plan(
+            plan,
+            jobs=jobs or COPY_CONFIG["jobs"],
+            remove=remove,
+            symlinks=symlinks,
+            mode=mode,
+            progress_interval=COPY_CONFIG["progress_interval"],
+            cancel=self.core.cancel_event,
+            progress_hook=self._track,
         )
 
-    @handle_os_errors("mv")
-    def mv(self, src, dst):
-        src_path = os.path.join(self.core.current_dir, src)
-        dst_path = os.path.join(self.core.current_dir, dst)
+    @handle_os_errors("sync")
+    def sync(self, src, dst, delete=False, checksum=False, dry_run=False, jobs=None):
+        """
+        Делает dst копией src, копируя только новые и изменившиеся файлы.
+        Лишние файлы (--delete) и объекты, тип которых изменился, переносятся
+        в корзину, поэтому undo возвращает их и удаляет созданное. Обновлённые
+        на месте файлы undo не откатывает (как перезапись файла в cp).
+        """
+        import time
+        from dirsize import human_size
+        from streams import write_lines
+        from sync_engine import compare_trees
 
-        if not os.path.exists(src_path):
-            raise FileNotFoundError(f"File '{src}' doesn't exist")
+        src_path = os.path.abspath(os.path.join(self.core.current_dir, src))
+        dst_path = os.path.abspath(os.path.join(self.core.current_dir, dst))
+        if not os.path.isdir(src_path):
+            raise NotADirectoryError(f"'{src}' is not a directory")
+        if dst_path == src_path or dst_path.startswith(src_path + os.sep):
+            raise OSError(f"Can't sync '{src}' into itself")
+        if self.core.trash.contains(dst_path):
+            raise PermissionError("Can't sync into trash directory")
 
-        if os.path.isdir(dst_path):
-            dst_path = os.path.join(dst_path, os.path.basename(src_path))
+        is_state = state_filter(self.core)
 
-        shutil.move(src_path, dst_path)
-        
-        self.core.log(f"mv {src} {dst}")
-        self.core.history_add(
-            "mv",
-            [src, dst],
-            other_data={"src_path": src_path, "dst_path": dst_path},
+        def exclude(path):
+            # Файлы shell и сам src (когда dst — его родитель) sync не трогает
+            return path == src_path or is_state(path)
+
+        started = time.monotonic()
+        with metrics.phase("compare"):
+            plan = compare_trees(src_path, dst_path, delete=delete, checksum=checksum,
+                                 jobs=jobs or COPY_CONFIG["jobs"], cancel=self.core.cancel_event,
+                                 digest=self._digest if checksum else None, exclude=exclude)
+        new = sum(1 for *_, reason in plan.copies if reason == "new")
+        changed = len(plan.copies) - new
+        args = [src, dst] + [flag for flag, on in (("--delete", delete), ("--checksum", checksum),
+                                                    ("--dry-run", dry_run)) if on]
+
+        if dry_run:
+            lines = [f"delete {os.path.relpath(path, dst_path)}" for path in plan.removes]
+            lines += [f"new     {os.path.relpath(path, dst_path)}/" for _, path in plan.dirs if path != dst_path]
+            lines += [f"{reason:<7} {os.path.relpath(path, dst_path)}" for _, path, _, reason in plan.copies]
+            write_lines(lines)
+            print(f"sync: would copy {new} new and {changed} changed file(s) ({human_size(plan.copy_bytes)} bytes), "
+                  f"delete {len(plan.removes)}; {plan.checked - len(plan.copies)} unchanged")
+            self.core.log(f"sync {' '.join(args)}")
+            self.core.history_add("sync", args)
+            return
+
+        items = []
+        try:
+            deleted = len(plan.removes)
+            self._trash_removes(plan, items)
+            with metrics.phase("copy"):
+                self._apply_sync(plan, jobs)
+            items.extend({"src_path": s, "dst_path": d} for s, d in plan.created)
+        except BaseException:
+            if not plan.removes:
+                items.extend({"src_path": s, "dst_path": d} for s, d in plan.created if os.path.lexists(d))
+            if items:
+                self._push("sync", args, items)
+            raise
+
+        print(f"sync: copied {new} new and {changed} changed file(s) ({human_size(plan.copy_bytes)} bytes), "
+              f"deleted {deleted}, {plan.checked - len(plan.copies)} unchanged "
+              f"in {time.monotonic() - started:.1f}s")
+        self._record_changes("sync", args, items)
+
+    def _digest(self, path):
+        """Контрольная сумма файла через постоянный кэш (sync --checksum, mv --verify)."""
+        return self.core.digest_cache.digest(path, HASH_CONFIG["algo"])
+
+    @handle_os_errors("dedupe")
+    def dedupe(self, path=".", reflink=False, dry_run=False, min_size=1, jobs=None):
+        """
+        Находит одинаковые файлы в дереве path (по размеру, затем по контрольной
+        сумме) и заменяет дубликаты жёсткими ссылками (или клонами с --reflink)
+        на первый по имени файл группы. undo снова делает их отдельными копиями.
+        """
+        import time
+        from dedupe import find_duplicates, replace_with_link
+        from search import make_filter, parallel_walk
+
+        root = os.path.join(self.core.current_dir, path)
+        if not os.path.isdir(root):
+            raise NotADirectoryError(f"'{path}' is not a directory")
+        mode = "reflink" if reflink else "link"
+        if reflink:
+            self._check_reflink(root)
+        args = [path] + (["--reflink"] if reflink else []) + (["--dry-run"] if dry_run else [])
+        if min_size != 1:
+            args += ["--min-size", str(min_size)]
+        errors = []
+
+        def on_error(e):
+            errors.append(report_os_error(self.core, "dedupe", e))
+
+        started = time.monotonic()
+        with metrics.phase("stat"):
+            is_state = state_filter(self.core)
+            # Пустые файлы не занимают места: заменять их ссылками бессмысленно
+            min_size = max(min_size, 1)
+            entries = []
+            for _, entry in parallel_walk(root, path, SEARCH_CONFIG["walk_jobs"], make_filter(kind="f"), on_error):
+                if is_state(os.path.abspath(entry.path)):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    on_error(e)
+                    continue
+                if st.st_size >= min_size:
+                    entries.append((entry.path, st))
+        with metrics.phase("hash"):
+            try:
+                groups = find_duplicates(entries, self.core.digest_cache, HASH_CONFIG["algo"],
+                                         jobs or HASH_CONFIG["jobs"], on_error, self.core.cancel_event)
+            finally:
+                self.core.digest_cache.flush()
+
+        duplicates = sum(len(group) - 1 for group in groups)
+        reclaim = sum(group[0][1].st_size * (len(group) - 1) for group in groups)
+        if dry_run:
+            from dirsize import human_size
+            from streams import write_lines
+
+            def lines():
+                for group in groups:
+                    yield os.path.relpath(group[0][0], self.core.current_dir)
+                    for dup, _ in group[1:]:
+                        yield f"  = {os.path.relpath(dup, self.core.current_dir)}"
+
+            write_lines(lines())
+            print(f"dedupe: {duplicates} duplicate(s) in {len(groups)} group(s), {human_size(reclaim)} bytes reclaimable")
+            self.core.log(f"dedupe {' '.join(args)}", not errors, f"dedupe: {len(errors)} errors" if errors else "")
+            self.core.history_add("dedupe", args, not errors)
+            return
+
+        items = []
+        saved = 0
+        try:
+            with metrics.phase("link"):
+                for group in groups:
+                    keep = group[0][0]
+                    for dup, st in group[1:]:
+                        self._check_cancel()
+                        try:
+                            items.append(replace_with_link(keep, dup, mode, expected=st))
+                        except OSError as e:
+                            on_error(e)
+                            continue
+                        saved += st.st_size
+                        metrics.add(files=1)
+        except BaseException:
+            if items:
+                self._push("dedupe", args, items)
+            raise
+
+        from dirsize import human_size
+        how = "hard links" if mode == "link" else "reflinks"
+        print(f"dedupe: replaced {len(items)} duplicate(s) with {how}, {human_size(saved)} bytes reclaimed "
+              f"in {time.monotonic() - started:.1f}s")
+        if errors:
+            self.core.log(f"dedupe {' '.join(args)}", False, f"dedupe: {len(errors)} errors")
+            self.core.history_add("dedupe", args, False)
+            if items:
+                self._push("dedupe", args, items)
+        else:
+            self._record_changes("dedupe", args, items)
+
+    def _move(self, src_path, dst_path, verify=False, jobs=None):
+        """Перемещение через move_engine: rename на одном устройстве, иначе копия с журналом."""
+        from move_engine import MoveJournal, move_path
+
+        return move_path(
+            src_path,
+            dst_path,
+            journal=MoveJournal(self.core.moves_dir),
+            jobs=jobs or COPY_CONFIG["jobs"],
+            verify=verify or MOVE_CONFIG["verify"],
+            progress_interval=COPY_CONFIG["progress_interval"],
+            cancel=self.core.cancel_event,
+            progress_hook=self._track,
+            digest=self._digest,
         )
 
+    @handle_os_errors("mv")
+    def mv(self, src=None, dst=None, verify=False, jobs=None, resume=False):
+        if resume:
+            self._resume_moves(verify, jobs)
+            return
+
+        sources = [src] if isinstance(src, str) else list(src)
+        with metrics.phase("stat"):
+            plan = self._resolve_targets(sources, dst)
+        args = summarize_args(sources) + [dst] + (["--verify"] if verify else [])
+
+        items = []
+        try:
+            with metrics.phase("move"):
+                for src_path, dst_path, _ in plan:
+                    self._check_cancel()
+                    # При копировании между устройствами файлы и байты считает CopyProgress
+                    if self._move(src_path, dst_path, verify, jobs) == "rename":
+                        metrics.add(files=1)
+                    items.append({"src_path": src_path, "dst_path": dst_path})
+        except BaseException:
+            if items:
+                self._push("mv", args, items)
+            from move_engine import MoveJournal
+            if MoveJournal(self.core.moves_dir).pending():
+                print(f"{Colors.YELLOW}mv: unfinished move kept in journal; run 'mv --resume' to finish it{Colors.RESET}")
+            raise
+
+        self._record("mv", args, items)
+
+    def _resume_moves(self, verify=False, jobs=None):
+        """mv --resume: доводит до конца перемещения, прерванные сбоем или kill."""
+        from move_engine import MoveJournal, resume_move
+
+        journal = MoveJournal(self.core.moves_dir)
+        records = journal.pending()
+        if not records:
+            print("mv: no interrupted moves")
+            self.core.log("mv --resume")
+            return
+
+        items = []
+        try:
+            for record in records:
+                self._check_cancel()
+                print(f"Resuming {record['src']} -> {record['dst']} ({record['state']})")
+                resume_move(
+                    record,
+                    journal,
+                    jobs=jobs or COPY_CONFIG["jobs"],
+                    verify=verify or None,
+                    progress_interval=COPY_CONFIG["progress_interval"],
+                    cancel=self.core.cancel_event,
+                    progress_hook=self._track,
+                    digest=self._digest,
+                )
+                items.append({"src_path": record["src"], "dst_path": record["dst"]})
+        except BaseException:
+            if items:
+                self._push("mv", ["--resume"], items)
+            raise
+
+        self._record("mv", ["--resume"], items)
+
     @handle_os_errors("rm")
     def rm(self, file, flag_r=False):
-        path = os.path.join(self.core.current_dir, file)
-
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"File '{file}' doesn't exist")
+        files = [file] if isinstance(file, str) else list(file)
 
-        if file in ["/", ".."] or os.path.abspath(path) == os.path.abspath("/"):
-            raise PermissionError("Can't delete root directory")
+        paths = []
+        dirs = 0
+        with metrics.phase("stat"):
+            for name in files:
+                path = os.path.join(self.core.current_dir, name)
+                try:
+                    mode = os.lstat(path).st_mode
+                except FileNotFoundError:
+                    raise FileNotFoundError(f"File '{name}' doesn't exist")
 
-        if not os.path.exists(self.core.trash_dir):
-            os.makedirs(self.core.trash_dir)
+                if name in ["/", ".."] or os.path.abspath(path) == os.path.abspath("/"):
+                    raise PermissionError("Can't delete root directory")
 
-        time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.basename(path)
-        trash_path = os.path.join(self.core.trash_dir, f"{base_name}_{time}")
+                if self.core.trash.contains(path):
+                    raise PermissionError("Can't delete trash directory")
 
-        rel_path = os.path.relpath(path, self.core.current_dir)
-        if os.path.dirname(rel_path) and os.path.dirname(rel_path) != ".":
-            trash_subdir = os.path.join(self.core.trash_dir, os.path.dirname(rel_path))
-            if not os.path.exists(trash_subdir):
-                os.makedirs(trash_subdir, exist_ok=True)
-            trash_path = os.path.join(trash_subdir, f"{base_name}_{time}")
+                if stat.S_ISDIR(mode):
+                    if not flag_r:
+                        raise IsADirectoryError(f"'{name}' is a directory")
+                    dirs += 1
+                paths.append(path)
 
-        if flag_r and os.path.isdir(path):
-            confirm = input(f"Remove directory '{file}' recursively? (y/n): ")
-            if confirm.lower() == "y":
-                shutil.move(path, trash_path)
-            else:
+        if dirs:
+            what = f"directory '{files[0]}'" if len(files) == 1 else f"{dirs} directories"
+            if not self.core.confirm(f"Remove {what} recursively? (y/n): "):
                 print("Operation cancelled")
                 return
+
+        args = summarize_args(files) + (["-r"] if flag_r else [])
+        items = []
+        try:
+            with metrics.phase("trash"), self.core.trash.batch():
+                for path in paths:
+                    self._check_cancel()
+                    item = self.core.trash.put(path)
+                    items.append({"path": item["original_path"], "trash_path": item["trash_path"]})
+                    metrics.add(files=1)
+        except BaseException:
+            if items:
+                self._push("rm", args, items)
+            raise
+
+        self._record("rm", args, items)
+
+
+
+    @handle_os_errors("trash")
+    def trash(self, action="ls", limit=None, older_than=None):
+        """trash ls|purge|stats: просмотр, очистка и сводка по корзине."""
+        import time
+        from dirsize import human_size
+
+        trash = self.core.trash
+        if action == "ls":
+            items = trash.list_items(limit)
+            for item in items:
+                deleted = time.strftime("%Y-%m-%d %H:%M", time.localtime(item["deleted_at"]))
+                size = human_size(item["size"]) if item["size"] is not None else "?"
+                stored = human_size(item["stored_size"]) if item["stored_size"] is not None else "?"
+                kind = "/" if item["is_dir"] else ""
+                print(f"{deleted}  {size:>6} {stored:>6} {item['codec'] or '-':<5} {item['original_path']}{kind}")
+            if not items:
+                print("Trash is empty")
+
+        elif action == "stats":
+            stats = trash.stats()
+            ratio = stats["stored_size"] / stats["size"] if stats["size"] else 1.0
+            print(f"items:      {stats['items']} ({stats['compressed'] or 0} compressed)")
+            print(f"size:       {human_size(stats['size'])}, on disk {human_size(stats['stored_size'])} ({ratio:.0%})")
+            if stats["quota"] is not None:
+                print(f"quota:      {human_size(stats['quota'])}")
+            if stats["oldest"] is not None:
+                print(f"oldest:     {(time.time() - stats['oldest']) / 86400:.1f} days ago")
+            if stats["max_age"] is not None:
+                print(f"max age:    {stats['max_age'] / 86400:g} days")
+
         else:
-            if os.path.isdir(path):
-                raise IsADirectoryError(f"'{file}' is a directory")
+            what = f"items older than {older_than} days" if older_than is not None else "all items"
+            if not self.core.confirm(f"Permanently delete {what} from trash? (y/n): "):
+                print("Operation cancelled")
+                return
+            cutoff = time.time() - older_than * 86400 if older_than is not None else None
+            print(f"Purged {trash.purge(older_than=cutoff)} item(s)")
 
-            try:
-                shutil.copy2(path, trash_path)
-                os.remove(path)
-            except Exception:
-                shutil.move(path, trash_path)
-
-        self.core.log(f"rm {'-r ' if flag_r else ''}{file}")
-        self.core.history_add(
-            "rm",
-            [file, "-r"] if flag_r else [file],
-            other_data={"path": path, "trash_path": trash_path},
+        args = [action] + (["--older-than", str(older_than)] if older_than is not None else [])
+        self.core.log(f"trash {' '.join(args)}")
+        self.core.history_add("trash", args)
+
+    def iter_find(self, path=".", name=None, kind=None, size=None, age=None, jobs=None,
+                  stdin=None, errors=None):
+        from search import PathEntry, make_filter, parallel_walk, parse_age, parse_size
+
+        root = os.path.join(self.core.current_dir, path)
+        try:
+            root_entry = PathEntry(root)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"'{path}' doesn't exist")
+
+        select = make_filter(
+            name,
+            kind,
+            parse_size(size) if size else None,
+            parse_age(age) if age else None,
         )
+        errors = [] if errors is None else errors
 
+        def on_error(e):
+            errors.append(report_os_error(self.core, "find", e))
 
+        if select is None or select(root_entry):
+            yield path
+        if root_entry.is_dir(follow_symlinks=False):
+            walk = parallel_walk(root, path, jobs or SEARCH_CONFIG["walk_jobs"], select, on_error)
+            for shown, _ in walk:
+                self._check_cancel()
+                yield shown
 
-    def show_history(self, count=5):
-        try:
-            history = self.core.history
-            if not history:
-                print(f"{Colors.YELLOW}No command in history{Colors.RESET}")
-                return
+    @handle_os_errors("find")
+    def find(self, path=".", name=None, kind=None, size=None, age=None, jobs=None):
+        from streams import write_lines
+
+        errors = []
+        found = write_lines(self.iter_find(path, name, kind, size, age, jobs, errors=errors),
+                            flush_interval=SEARCH_CONFIG["flush_interval"])
+        metrics.add(files=found)
+
+        args = [path]
+        for option, value in (("--name", name), ("--type", kind), ("--size", size), ("--mtime", age)):
+            if value is not None:
+                args += [option, value]
+        self.core.log(f"find {' '.join(args)}", not errors, f"find: {len(errors)} errors" if errors else "")
+        self.core.history_add("find", args, not errors)
+
+    def iter_grep(self, pattern, path=None, flag_r=False, ignore_case=False, line_numbers=False,
+                  names_only=False, jobs=None, stdin=None, errors=None, color=False):
+        """Совпадения в файлах или, если файлы не заданы, во входе конвейера."""
+        import search
+        from search import make_filter, parallel_walk
+
+        magenta, green, reset = (Colors.MAGENTA, Colors.GREEN, Colors.RESET) if color else ("", "", "")
+        if not path:
+            if stdin is None:
+                raise FileNotFoundError("no input files")
+            import re
+            regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            for lineno, line in enumerate(stdin, 1):
+                if regex.search(line):
+                    if names_only:
+                        yield "(standard input)"
+                        return
+                    yield f"{green}{lineno}{reset}:{line}" if line_numbers else line
+            return
 
-            if len(self.history) > count:
-                start_idx = len(self.history) - count
+        paths = [path] if isinstance(path, str) else list(path)
+        errors = [] if errors is None else errors
+
+        def on_error(e):
+            errors.append(report_os_error(self.core, "grep", e))
+
+        def files():
+            for name in paths:
+                full_path = os.path.join(self.core.current_dir, name)
+                if not os.path.isdir(full_path):
+                    yield name, full_path
+                elif not flag_r:
+                    on_error(IsADirectoryError(f"{name} is a directory"))
+                else:
+                    walk = parallel_walk(full_path, name, SEARCH_CONFIG["walk_jobs"],
+                                         make_filter(kind="f"), on_error)
+                    for shown, entry in walk:
+                        yield shown, entry.path
+
+        show_names = flag_r or len(paths) > 1
+        results = search.iter_grep(
+            files(),
+            pattern,
+            ignore_case,
+            names_only,
+            jobs=jobs or SEARCH_CONFIG["grep_jobs"],
+            batch_size=SEARCH_CONFIG["batch_size"],
+            inline_files=SEARCH_CONFIG["inline_files"],
+            mmap_threshold=SEARCH_CONFIG["mmap_threshold"],
+        )
+        for shown, matches, binary, error in results:
+            self._check_cancel()
+            if error is not None:
+                on_error(error)
+            elif not matches:
+                continue
+            elif names_only:
+                yield f"{magenta}{shown}{reset}"
+            elif binary:
+                yield f"Binary file {shown} matches"
             else:
-                start_idx = 0
+                prefix = f"{magenta}{shown}{reset}:" if show_names else ""
+                for lineno, text in matches:
+                    number = f"{green}{lineno}{reset}:" if line_numbers else ""
+                    yield f"{prefix}{number}{text}"
+
+    @handle_os_errors("grep")
+    def grep(self, pattern, path, flag_r=False, ignore_case=False, line_numbers=False,
+             names_only=False, jobs=None):
+        from streams import write_lines
+
+        paths = [path] if isinstance(path, str) else list(path)
+        errors = []
+        lines = self.iter_grep(pattern, paths, flag_r, ignore_case, line_numbers, names_only, jobs,
+                               errors=errors, color=True)
+        write_lines(lines, flush_interval=SEARCH_CONFIG["flush_interval"])
+
+        flags = "".join(f for f, on in (("r", flag_r), ("i", ignore_case), ("n", line_numbers),
+                                        ("l", names_only)) if on)
+        args = ([f"-{flags}"] if flags else []) + [pattern] + summarize_args(paths)
+        self.core.log(f"grep {' '.join(args)}", not errors, f"grep: {len(errors)} errors" if errors else "")
+        self.core.history_add("grep", args, not errors)
 
-            i = start_idx + 1
-            for info in history[start_idx:]:
-                if info.get("status", True):
-                    status = "SUCCESS"
+    def iter_hashsum(self, path=None, flag_r=False, algo=None, jobs=None, stdin=None, errors=None):
+        """Строки "сумма  путь" для файлов path или, в конвейере, для путей из входа."""
+        from hashing import iter_digests
+        from search import make_filter, parallel_walk
+
+        errors = [] if errors is None else errors
+
+        def on_error(e):
+            errors.append(report_os_error(self.core, "hashsum", e))
+
+        if path:
+            paths = [path] if isinstance(path, str) else list(path)
+        elif stdin is not None:
+            paths = (line.rstrip("\n") for line in stdin if line.strip())
+        else:
+            raise FileNotFoundError("no input files")
+
+        def files():
+            for name in paths:
+                full_path = os.path.join(self.core.current_dir, name)
+                if not os.path.isdir(full_path):
+                    yield name, full_path
+                elif not flag_r:
+                    on_error(IsADirectoryError(f"{name} is a directory"))
                 else:
-                    status = "ERROR"
-                time = datetime.fromisoformat(info["time"]).strftime("%H:%M:%S")
-                args = []
-                for arg in info["args"]:
-                    args.append(str(arg))   
-
-                str_args = " ".join(args)
-                print(f"{i} {status} [{time}] {info['command']} {str_args}")
-                i += 1
-
-            self.core.log(f"history {count}")
-            self.core.history_add("history", [str(count)])
-            
+                    walk = parallel_walk(full_path, name, SEARCH_CONFIG["walk_jobs"],
+                                         make_filter(kind="f"), on_error)
+                    for shown, entry in walk:
+                        yield shown, entry.path
+
+        shown_paths = {}
+
+        def full_paths():
+            for shown, full_path in files():
+                shown_paths[full_path] = shown
+                yield full_path
+
+        digests = iter_digests(
+            full_paths(),
+            algo or HASH_CONFIG["algo"],
+            cache=self.core.digest_cache,
+            jobs=jobs or HASH_CONFIG["jobs"],
+            mmap_threshold=HASH_CONFIG["mmap_threshold"],
+            cancel=self.core.cancel_event,
+        )
+        for full_path, digest, nbytes, error in digests:
+            shown = shown_paths.pop(full_path)
+            if error is not None:
+                on_error(error)
+                continue
+            # Попадания в кэш учитываются как файлы без прочитанных байт
+            metrics.add(files=1, nbytes=nbytes)
+            yield f"{digest}  {shown}"
+
+    @handle_os_errors("hashsum")
+    def hashsum(self, path, flag_r=False, algo=None, jobs=None):
+        from streams import write_lines
+
+        paths = [path] if isinstance(path, str) else list(path)
+        errors = []
+        try:
+            write_lines(self.iter_hashsum(paths, flag_r, algo, jobs, errors=errors))
+        finally:
+            self.core.digest_cache.flush()
+
+        args = (["-r"] if flag_r else []) + (["--algo", algo] if algo else []) + summarize_args(paths)
+        self.core.log(f"hashsum {' '.join(args)}", not errors, f"hashsum: {len(errors)} errors" if errors else "")
+        self.core.history_add("hashsum", args, not errors)
+
+    def iter_du(self, path=".", summarize=False, human=False, depth=None, stdin=None, errors=None):
+        from dirsize import dir_sizes, human_size, iter_du
+
+        root = os.path.join(self.core.current_dir, path)
+        try:
+            st = os.lstat(root)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"'{path}' doesn't exist")
+
+        fmt = human_size if human else str
+        errors = [] if errors is None else errors
+        if not stat.S_ISDIR(st.st_mode):
+            yield f"{fmt(st.st_size)}\t{path}"
+            return
+
+        root = os.path.abspath(root)
+        totals, records, _ = dir_sizes(
+            root,
+            self.core.size_cache,
+            jobs=DU_CONFIG["jobs"],
+            on_error=lambda e: errors.append(report_os_error(self.core, "du", e)),
+            cancel=self.core.cancel_event,
+        )
+        max_depth = 0 if summarize else depth
+        for size, shown in iter_du(root, path, totals, records, max_depth):
+            yield f"{fmt(size)}\t{shown}"
+
+    @handle_os_errors("du")
+    def du(self, path=".", summarize=False, human=False, depth=None):
+        from streams import write_lines
+
+        errors = []
+        write_lines(self.iter_du(path, summarize, human, depth, errors=errors))
+
+        args = (["-s"] if summarize else []) + (["-h"] if human else [])
+        if depth is not None:
+            args += ["--depth", str(depth)]
+        args.append(path)
+        self.core.log(f"du {' '.join(args)}", not errors, f"du: {len(errors)} errors" if errors else "")
+        self.core.history_add("du", args, not errors)
+
+    def iter_log(self, since=None, until=None, command=None, status=None, last=None, as_json=False,
+                 follow=False, stdin=None):
+        import logquery
+
+        path = self.core.log_file
+        records, offset = logquery.query(
+            path,
+            since=logquery.parse_time(since) if since else None,
+            until=logquery.parse_time(until) if until else None,
+            command=command,
+            status=status,
+            last=last,
+            index=LOG_QUERY_CONFIG["index"],
+        )
+        for raw in records:
+            yield logquery.format_record(raw, as_json)
+        if follow:
+            for raw in logquery.follow(path, offset, command, status, LOG_QUERY_CONFIG["follow_interval"],
+                                       self.core.cancel_event):
+                yield logquery.format_record(raw, as_json)
+
+    @handle_os_errors("log")
+    def log(self, since=None, until=None, command=None, status=None, last=None, as_json=False, follow=False):
+        from streams import write_lines
+
+        args = []
+        for flag, value in [("--since", since), ("--until", until), ("--command", command),
+                            ("--status", status), ("-n", last)]:
+            if value is not None:
+                args += [flag, str(value)]
+        args += (["--json"] if as_json else []) + (["-f"] if follow else [])
+
+        lines = self.iter_log(since, until, command, status, last, as_json, follow)
+        if not as_json:
+            lines = (f"{Colors.RED}{line}{Colors.RESET}" if not line.rstrip().endswith(" - SUCCESS") else line
+                     for line in lines)
+        try:
+            write_lines(lines, flush_interval=LOG_QUERY_CONFIG["follow_interval"] if follow else None)
+        except KeyboardInterrupt:
+            # Ctrl-C — обычный способ выйти из log -f
+            print()
+
+        self.core.log(f"log {' '.join(args)}".rstrip())
+        self.core.history_add("log", args)
+
+    @instrument("pipeline")
+    def pipeline(self, stages, line):
+        """
+        Выполняет конвейер: stages — [(команда, имя iter_-метода, kwargs)]. Выход
+        каждой стадии — генератор строк, который лениво читает следующая, поэтому
+        память не зависит от объёма данных, а когда последняя стадия (например,
+        head) закончила, чтение выше по конвейеру прекращается и все стадии закрываются.
+        """
+        from streams import FLUSH_INTERVAL, write_lines
+
+        failed = []
+
+        def stage(name, lines):
+            try:
+                for line_ in lines:
+                    self._check_cancel()
+                    yield line_
+            except (OSError, ValueError):
+                if not failed:
+                    failed.append(name)
+                raise
+
+        generators = []
+        lines = None
+        for name, method, kwargs in stages:
+            lines = stage(name, getattr(self, method)(stdin=lines, **kwargs))
+            generators.append(lines)
+
+        tokens = line.split()
+        try:
+            write_lines(lines, flush_interval=FLUSH_INTERVAL)
+        except (OSError, ValueError) as e:
+            report_os_error(self.core, failed[0] if failed else stages[0][0], e, line)
+            self.core.history_add(tokens[0], tokens[1:], False)
+            return
+        finally:
+            for generator in reversed(generators):
+                generator.close()
+
+        self.core.log(line)
+        self.core.history_add(tokens[0], tokens[1:])
+
+    @handle_os_errors("jobs")
+    def jobs(self):
+        manager = self.core.jobs
+        if not manager.jobs:
+            print(f"{Colors.YELLOW}No background jobs{Colors.RESET}")
+        for job in manager.jobs.values():
+            print(job.describe())
+
+        self.core.log("jobs")
+        self.core.history_add("jobs", [])
+
+    @handle_os_errors("wait")
+    def wait(self, job_id=None):
+        manager = self.core.jobs
+        manager.report(manager.wait(job_id))
+
+        args = [] if job_id is None else [str(job_id)]
+        self.core.log(f"wait {' '.join(args)}".strip())
+        self.core.history_add("wait", args)
+
+    @handle_os_errors("kill")
+    def kill(self, job_id):
+        if self.core.jobs.kill(job_id):
+            print(f"[{job_id}] cancelling")
+        else:
+            print(f"{Colors.YELLOW}[{job_id}] already finished{Colors.RESET}")
+
+        self.core.log(f"kill {job_id}")
+        self.core.history_add("kill", [str(job_id)])
+
+    @handle_os_errors("stats")
+    def stats(self, as_json=False, reset=False):
+        """Время выполнения (p50/p95/max), фазы и счётчики команд за сессию."""
+        import json
+        from dirsize import human_size
+
+        snapshot = self.core.metrics.snapshot()
+        if as_json:
+            print(json.dumps(snapshot, indent=2))
+        elif not snapshot:
+            print(f"{Colors.YELLOW}No commands measured yet{Colors.RESET}")
+        else:
+            print(f"{'command':<12} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+                  f"{'files':>8} {'bytes':>7}")
+            for name, entry in snapshot.items():
+                print(f"{name:<12} {entry['count']:>7} {entry['errors']:>6} {entry['p50_ms']:>9.3f} "
+                      f"{entry['p95_ms']:>9.3f} {entry['max_ms']:>9.3f} {entry['files']:>8} "
+                      f"{human_size(entry['bytes']):>7}")
+                for phase_name, phase in entry["phases"].items():
+                    print(f"{Colors.BRIGHT_BLACK}  {phase_name:<10} {phase['count']:>7} {'':>6} "
+                          f"{phase['p50_ms']:>9.3f} {phase['p95_ms']:>9.3f} {phase['max_ms']:>9.3f}{Colors.RESET}")
+        if reset:
+            self.core.metrics.reset()
+
+        args = (["--json"] if as_json else []) + (["--reset"] if reset else [])
+        self.core.log(f"stats {' '.join(args)}".rstrip())
+        self.core.history_add("stats", args)
+
+    def iter_history(self, action=None, pattern=None, failed=False, since=None, last=None, stdin=None):
+        """
+        Строки истории из базы: history [N] — последние N команд (по умолчанию 5),
+        history grep TEXT — команды, содержащие TEXT; --failed и --since сужают
+        выборку, -n задаёт число последних совпадений.
+        """
+        from datetime import datetime
+        from config import HISTORY_CONFIG
+
+        if action == "grep":
+            if not pattern:
+                raise ValueError("expected TEXT after grep")
+        elif pattern is not None:
+            raise ValueError(f"unexpected argument '{pattern}'")
+        count = action if isinstance(action, int) else None
+        searching = action == "grep" or failed or since is not None
+        limit = last or count or (HISTORY_CONFIG["search_limit"] if searching else 5)
+        if since is not None:
+            from logquery import parse_time
+            since = parse_time(since).decode().replace(" ", "T")
+
+        today = datetime.now().date()
+        for info in self.core.history_store.search(pattern, failed, since, limit):
+            status = "SUCCESS" if info.get("status", True) else "ERROR"
+            moment = datetime.fromisoformat(info["time"])
+            # Для команд не за сегодня показываем и дату
+            time = moment.strftime("%H:%M:%S" if moment.date() == today else "%Y-%m-%d %H:%M:%S")
+            yield f"{info['id']} {status} [{time}] {info['command']} {' '.join(map(str, info['args']))}"
+
+    @instrument("history")
+    def show_history(self, action=None, pattern=None, failed=False, since=None, last=None):
+        from streams import write_lines
+
+        args = [str(value) for value in (action, pattern) if value is not None]
+        args += ["--failed"] if failed else []
+        for flag, value in [("--since", since), ("-n", last)]:
+            if value is not None:
+                args += [flag, str(value)]
+        line = f"history {' '.join(args)}".rstrip()
+
+        try:
+            if not write_lines(self.iter_history(action, pattern, failed, since, last)):
+                message = "No matching commands" if args else "No command in history"
+                print(f"{Colors.YELLOW}{message}{Colors.RESET}")
+
+            self.core.log(line)
+            self.core.history_add("history", args)
+
         except Exception as e:
             error_msg = f"history: {str(e)}"
             print(f"{Colors.RED}{error_msg}{Colors.RESET}")
-            self.core.log(f"history {count}", False, error_msg)
-            self.core.history_add("history", [str(count)], False)
+            self.core.log(line, False, error_msg)
+            self.core.history_add("history", args, False)
 
-    def undo(self):
-        try:
-            history = self.core.history
-            if not history:
-                print(f"{Colors.YELLOW}No commands to cancel{Colors.RESET}")
-                return
+    def _undo_item(self, command, item):
+        """Отменяет действие над одним путём. Возвращает False, если отмена невозможна."""
+        import shutil
 
-            last_command = None
-            for info in reversed(history):
-                if info["command"] in ["cp", "mv", "rm"] and info.get("status", True):
-                    last_command = info
-                    break
+        if command in ("sync", "cp"):
+            # sync и cp --update переносят заменяемое в корзину (как rm) и создают новые объекты (как cp)
+            command = "rm" if "trash_path" in item else "cp"
 
-            if not last_command:
-                print(f"{Colors.YELLOW}No cancellable successful commands found{Colors.RESET}")
-                return
+        if command == "cp":
+            dst_path = item.get("dst_path")
+            if not dst_path or not os.path.lexists(dst_path):
+                return False
+            if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+                shutil.rmtree(dst_path)
+            else:
+                os.remove(dst_path)
 
-            command = last_command["command"]
-            other_data = last_command.get("other_data", {})
-            success = True
-
-            if command == "cp":
-                dst_path = other_data.get("dst_path")
-                if dst_path and os.path.exists(dst_path):
-                    if os.path.isfile(dst_path):
-                        os.remove(dst_path)
-                    elif os.path.isdir(dst_path):
-                        shutil.rmtree(dst_path)
-                else:
-                    success = False
+        elif command == "mv":
+            src_path = item.get("src_path")
+            dst_path = item.get("dst_path")
+            if not (dst_path and src_path and os.path.lexists(dst_path)) or os.path.lexists(src_path):
+                return False
+            self._move(dst_path, src_path)
 
-            elif command == "mv":
-                src_path = other_data.get("src_path")
-                dst_path = other_data.get("dst_path")
-                if dst_path and os.path.exists(dst_path) and src_path:
-                    shutil.move(dst_path, src_path)
-                else:
-                    success = False
+        elif command == "dedupe":
+            from dedupe import restore_copy
 
-            elif command == "rm":
-                trash_path = other_data.get("trash_path")
-                path = other_data.get("path")
-                if os.path.exists(trash_path) and not os.path.exists(path):
-                    shutil.move(trash_path, path)
-                else:
-                    success = False
+            if not os.path.isfile(item.get("path", "")):
+                return False
+            restore_copy(item)
+
+        elif command == "rm":
+            trash_path = item.get("trash_path")
+            path = item.get("path")
+            if not (trash_path and path and self.core.trash.exists(trash_path)) or os.path.lexists(path):
+                return False
+            self.core.trash.restore(trash_path, path)
 
-            if success:
-                history.remove(last_command)
-                self.core.history_save()
-                self.core.log("undo")
-                self.core.history_add("undo", [])
+        return True
+
+    def _redo_item(self, command, item):
+        """Повторяет действие над одним путём. Возвращает обновлённые данные или None."""
+        import shutil
+        from copy_engine import parallel_copytree
+
+        if command in ("sync", "cp"):
+            command = "rm" if "trash_path" in item else "cp"
+
+        if command == "cp":
+            src_path = item.get("src_path")
+            dst_path = item.get("dst_path")
+            if not os.path.exists(src_path) or os.path.lexists(dst_path):
+                return None
+            mode = item.get("mode", "copy")
+            if os.path.isdir(src_path):
+                parallel_copytree(src_path, dst_path, jobs=COPY_CONFIG["jobs"], mode=mode)
             else:
-                print(f"{Colors.RED}Couldn't cancel operation for command '{command}'.{Colors.RESET}")
-                self.core.log("undo", False, f"Failed to cancel {command}")
-                self.core.history_add("undo", [], False)
+                self._copy_one(src_path, dst_path, mode)
+            return item
+
+        if command == "dedupe":
+            from dedupe import replace_with_link
+
+            if not (os.path.isfile(item.get("path", "")) and os.path.isfile(item.get("src_path", ""))):
+                return None
+            return replace_with_link(item["src_path"], item["path"], item["mode"])
+
+        if command == "mv":
+            src_path = item.get("src_path")
+            dst_path = item.get("dst_path")
+            if not os.path.lexists(src_path) or os.path.lexists(dst_path):
+                return None
+            self._move(src_path, dst_path)
+            return item
+
+        if command == "rm":
+            path = item.get("path")
+            if not os.path.lexists(path):
+                return None
+            trashed = self.core.trash.put(path)
+            return {"path": trashed["original_path"], "trash_path": trashed["trash_path"]}
+
+        return None
+
+    def _rollback_undo(self, op, count):
+        """
+        undo прервался, отменив последние count элементов операции op: повторяет
+        их, чтобы операция осталась на вершине стека целиком. Элемент, который
+        повторить не удалось, остаётся отменённым и убирается из операции.
+        """
+        if not count:
+            return
+        command = op["command"]
+        split = len(op["items"]) - count
+        items = op["items"][:split]
+        for item in op["items"][split:]:
+            try:
+                new_item = self._redo_item(command, item)
+            except OSError:
+                new_item = None
+            if new_item is not None:
+                items.append(new_item)
+        self._invalidate(op["items"] + items)
+        # Повтор меняет пути (rm кладёт файлы в корзину под новыми именами): операция записывается заново
+        self.core.operations.mark_undone()
+        self.core.operations.mark_redone(dict(op, items=items))
+
+    @instrument("undo")
+    def undo(self, count=1, show_list=False):
+        if show_list:
+            self.undo_list()
+            return
+
+        try:
+            undone = 0
+            for _ in range(count):
+                op = self.core.operations.last_done()
+                if op is None:
+                    if not undone:
+                        print(f"{Colors.YELLOW}No commands to cancel{Colors.RESET}")
+                    break
+
+                command = op["command"]
+                self._invalidate(op["items"])
+                cancelled = 0
+                try:
+                    for item in reversed(op["items"]):
+                        if not self._undo_item(command, item):
+                            raise OSError(f"Couldn't cancel operation for command '{command}'")
+                        cancelled += 1
+                except OSError:
+                    self._rollback_undo(op, cancelled)
+                    raise
+                self.core.operations.mark_undone()
+                undone += 1
+
+            self.core.log(f"undo {count}")
+            self.core.history_add("undo", [str(count)])
 
         except OSError as e:
             error_msg = f"undo: {str(e)}"
             print(f"{Colors.RED}{error_msg}{Colors.RESET}")
-            self.core.log("undo", False, error_msg)
-            self.core.history_add("undo", [], False)
\ No newline at end of file
+            self.core.log(f"undo {count}", False, error_msg)
+            self.core.history_add("undo", [str(count)], False)
+
+    def _rollback_redo(self, op, redone):
+        """
+        redo прервался, повторив первые элементы операции op (redone — их
+        обновлённые записи): отменяет их, чтобы операция осталась в стеке redo
+        целиком. Элемент, который отменить не удалось, остаётся повторённым и
+        убирается из операции.
+        """
+        if not redone:
+            return
+        command = op["command"]
+        items = []
+        for item in reversed(redone):
+            try:
+                cancelled = self._undo_item(command, item)
+            except OSError:
+                cancelled = False
+            if cancelled:
+                items.insert(0, item)
+        items += op["items"][len(redone):]
+        self._invalidate(op["items"] + redone)
+        # Отмена возвращает элементы по обновлённым записям (новые имена в корзине): операция записывается заново
+        self.core.operations.mark_redone(dict(op, items=items))
+        self.core.operations.mark_undone()
+
+    @instrument("redo")
+    def redo(self, count=1):
+        try:
+            redone = 0
+            for _ in range(count):
+                op = self.core.operations.last_undone()
+                if op is None:
+                    if not redone:
+                        print(f"{Colors.YELLOW}No commands to redo{Colors.RESET}")
+                    break
+
+                command = op["command"]
+                items = []
+                try:
+                    for item in op["items"]:
+                        new_item = self._redo_item(command, item)
+                        if new_item is None:
+                            raise OSError(f"Couldn't repeat operation for command '{command}'")
+                        items.append(new_item)
+                except OSError:
+                    self._rollback_redo(op, items)
+                    raise
+                self._invalidate(op["items"] + items)
+                self.core.operations.mark_redone(dict(op, items=items))
+                redone += 1
+
+            self.core.log(f"redo {count}")
+            self.core.history_add("redo", [str(count)])
+
+        except OSError as e:
+            error_msg = f"redo: {str(e)}"
+            print(f"{Colors.RED}{error_msg}{Colors.RESET}")
+            self.core.log(f"redo {count}", False, error_msg)
+            self.core.history_add("redo", [str(count)], False)
+
+    def undo_list(self):
+        """Выводит стек отменяемых операций (сверху — ближайшая к отмене) и стек redo."""
+        from datetime import datetime
+
+        operations = self.core.operations
+        if not operations.done and not operations.undone:
+            print(f"{Colors.YELLOW}No cancellable operations{Colors.RESET}")
+        for op in reversed(operations.done):
+            time = datetime.fromisoformat(op["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{op['id']} [{time}] {op['command']} {' '.join(map(str, op['args']))}")
+        for op in reversed(operations.undone):
+            time = datetime.fromisoformat(op["time"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{Colors.BRIGHT_BLACK}{op['id']} [{time}] {op['command']} "
+                  f"{' '.join(map(str, op['args']))} (undone){Colors.RESET}")
+
+        self.core.log("undo --list")
+        self.core.history_add("undo", ["--list"])
@@ -1,73 +1,203 @@
+import sys
+import time
 from ansi import Colors
 from operations import ShellCommands
+from registry import COMMANDS, UsageError
 
 class ShellParser:
     def __init__(self, core):
         self.core = core
         self.commands = ShellCommands(core)
 
+    def execute(self, command):
+        """
+        Выполняет одну команду: поиск в реестре COMMANDS, разбор аргументов и вызов метода.
+        Команда с "&" в конце запускается фоновой задачей (jobs.py), с флагом
+        --profile — под cProfile.
+        Возвращает True, если команда завершилась (или запустилась) успешно.
+        """
+        background = command[-1].endswith("&")
+        if background:
+            command = command[:-1] + ([command[-1][:-1]] if command[-1] != "&" else [])
+            if not command:
+                print("Syntax error near '&'")
+                return False
+
+        if "--profile" in command:
+            return self.execute_profiled([token for token in command if token != "--profile"], background)
+
+        if "|" in command:
+            return self.execute_pipeline(command, background)
+
+        cmd = command[0]
+        args = command[1:]
+
+        spec = COMMANDS.get(cmd)
+        if spec is None:
+            print(f"Unknown command: {cmd}")
+            return False
+
+        try:
+            kwargs = spec.parse(args, self.expand)
+        except UsageError as e:
+            print(f"{cmd}: {e}")
+            return False
+
+        if background:
+            # Шаблоны уже раскрыты относительно текущей директории на момент запуска
+            job = self.core.jobs.submit(" ".join(command), spec.method, kwargs, origin=self.core)
+            print(f"[{job.id}] {job.line}")
+            return True
+
+        self.core.last_status = True
+        getattr(self.commands, spec.method)(**kwargs)
+        return self.core.last_status
+
+    def execute_profiled(self, command, background=False):
+        """Команда с --profile: выполняется под cProfile, после вывода команды печатаются самые затратные функции."""
+        from config import METRICS_CONFIG
+        from metrics import profile
+
+        if background or not command:
+            print("--profile can't be used with background jobs" if command else "Syntax error near '--profile'")
+            return False
+        return profile(lambda: self.execute(command), METRICS_CONFIG["profile_top"], METRICS_CONFIG["profile_sort"])
+
+    def execute_pipeline(self, command, background=False):
+        """Разбирает все стадии конвейера "a | b | c" до запуска и выполняет их как одну команду."""
+        line = " ".join(command)
+        stages = []
+        parts = [[]]
+        for token in command:
+            if token == "|":
+                parts.append([])
+            else:
+                parts[-1].append(token)
+
+        for index, part in enumerate(parts):
+            if not part:
+                print("Syntax error near '|'")
+                return False
+            cmd = part[0]
+            spec = COMMANDS.get(cmd)
+            if spec is None:
+                print(f"Unknown command: {cmd}")
+                return False
+            if spec.stream is None:
+                print(f"{cmd}: can't be used in a pipeline")
+                return False
+            try:
+                kwargs = spec.parse(part[1:], self.expand, piped=index > 0)
+            except UsageError as e:
+                print(f"{cmd}: {e}")
+                return False
+            stages.append((cmd, spec.stream, kwargs))
+
+        kwargs = {"stages": stages, "line": line}
+        if background:
+            job = self.core.jobs.submit(line, "pipeline", kwargs, origin=self.core)
+            print(f"[{job.id}] {job.line}")
+            return True
+
+        self.core.last_status = True
+        self.commands.pipeline(**kwargs)
+        return self.core.last_status
+
+    def expand(self, values):
+        """Раскрывает шаблоны в аргументах относительно текущей директории."""
+        from globbing import expand_all
+        return expand_all(values, self.core.current_dir)
+
+    def setup_completion(self):
+        """Включает дополнение по Tab и поиск по истории Ctrl-R, если доступен readline. Возвращает True при успехе."""
+        from completion import Completer, load_readline_history, setup_readline
+        from config import HISTORY_CONFIG
+        if not setup_readline(Completer(self.core, COMMANDS, self.core.path_index)):
+            return False
+        # Ctrl-R ищет по истории readline: заполняем её командами прошлых сессий из базы
+        try:
+            load_readline_history(self.core.history_store.recent_lines(HISTORY_CONFIG["readline_entries"]))
+        except Exception:
+            pass
+        return True
+
     def run(self):
         """Запускает основной цикл выполнения программы и обрабатывает ввод."""
         print("System_Shell start. Type 'exit' to quit.")
+        # readline должен знать, какие символы приглашения не занимают места на экране
+        start, end = ("\001", "\002") if self.setup_completion() else ("", "")
         while True:
             try:
+                self.core.notify_jobs()
                 command = (
-                    input(f"{Colors.BRIGHT_GREEN}{self.core.current_dir}{Colors.RESET} $ ")
+                    input(f"{start}{Colors.BRIGHT_GREEN}{end}{self.core.current_dir}"
+                          f"{start}{Colors.RESET}{end} $ ")
                     .strip()
                     .split()
                 )
                 if not command:
                     continue
 
-                cmd = command[0]
-                args = command[1:]
-
-                if cmd == "exit":
+                if command[0] == "exit":
                     break
-                elif cmd == "ls":
-                    not_flag_args = [arg for arg in args if arg != "-l"]
-                    flag_l = "-l" in args
-                    path = not_flag_args[0] if not_flag_args else None
-                    self.commands.ls(path, flag_l)
-                elif cmd == "cd":
-                    if len(args) != 1:
-                        print("cd: not enough arguments")
-                    else:
-                        self.commands.cd(args[0])
-                elif cmd == "cat":
-                    if len(args) != 1:
-                        print("cat: not enough arguments")
-                    else:
-                        self.commands.cat(args[0])
-                elif cmd == "cp":
-                    flag_r = "-r" in args
-                    files = [arg for arg in args if arg != "-r"]
-                    if len(files) != 2:
-                        print("cp: not enough arguments (expected 2 files/dirs)")
-                    else:
-                        self.commands.cp(files[0], files[1], flag_r)
-                elif cmd == "mv":
-                    if len(args) != 2:
-                        print("mv: not enough arguments (expected 2 files/dirs)")
-                    else:
-                        self.commands.mv(args[0], args[1])
-                elif cmd == "rm":
-                    not_flag_args = [arg for arg in args if arg != "-r"]
-                    flag_r = "-r" in args
-                    path = not_flag_args[0] if not_flag_args else None
-                    if not path:
-                        print("rm: not enough arguments")
-                    else:
-                        self.commands.rm(path, flag_r)
-                elif cmd == "history":
-                    count = int(args[0]) if args and args[0].isdigit() else 5
-                    self.commands.show_history(count)
-                elif cmd == "undo":
-                    self.commands.undo()
-                else:
-                    print(f"Unknown command: {cmd}")
+                self.execute(command)
 
             except KeyboardInterrupt:
                 print("\nUse 'exit' to quit")
             except Exception as e:
-                print(f"Unexpected error: {str(e)}")
\ No newline at end of file
+                print(f"Unexpected error: {str(e)}")
+
+    def run_script(self, lines, fail_fast=False, flush_every=500):
+        """
+        Выполняет команды из итерируемого источника строк без приглашения ввода.
+        История и журнал операций сбрасываются на диск раз в flush_every команд
+        и в конце. В stderr выводится сводка времени выполнения по командам.
+        Возвращает код завершения: 0 — все команды успешны, 1 — были ошибки.
+        """
+        timings = {}
+        executed = 0
+        failed = 0
+        started = time.perf_counter()
+
+        for lineno, line in enumerate(lines, 1):
+            command = line.strip().split()
+            if not command or command[0].startswith("#"):
+                continue
+            if command[0] == "exit":
+                break
+
+            start = time.perf_counter()
+            try:
+                ok = self.execute(command)
+            except Exception as e:
+                print(f"Unexpected error: {str(e)}")
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            stat = timings.setdefault(command[0], [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] = max(stat[2], elapsed)
+            executed += 1
+            if flush_every and executed % flush_every == 0:
+                self.core.flush()
+
+            if not ok:
+                failed += 1
+                if fail_fast:
+                    print(f"{Colors.RED}Stopped at line {lineno}: {line.strip()}{Colors.RESET}",
+                          file=sys.stderr)
+                    break
+
+        self.core.flush()
+        self.print_summary(timings, executed, failed, time.perf_counter() - started)
+        return 1 if failed else 0
+
+    def print_summary(self, timings, executed, failed, total):
+        out = sys.stderr
+        print(f"{'command':<10} {'count':>8} {'total ms':>10} {'avg ms':>9} {'max ms':>9}", file=out)
+        for cmd, (count, spent, slowest) in sorted(timings.items(), key=lambda t: -t[1][1]):
+            print(f"{cmd:<10} {count:>8} {spent * 1000:>10.1f} {spent / count * 1000:>9.3f} "
+                  f"{slowest * 1000:>9.3f}", file=out)
+        rate = executed / total if total else 0.0
+        print(f"{executed} commands, {failed} failed, {total:.2f} s, {rate:.0f} commands/s", file=out)
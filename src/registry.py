@@ -0,0 +1,387 @@
+class UsageError(ValueError):
+    """Ошибка разбора аргументов команды."""
+
+
+def positive_int(value):
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError("expects a positive number")
+    return int(value)
+
+
+def non_negative_int(value):
+    if not value.isdigit():
+        raise ValueError("expects a number")
+    return int(value)
+
+
+def byte_range(value):
+    from file_reader import parse_range
+    return parse_range(value)
+
+
+def regex(value):
+    import re
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise ValueError(f"invalid regular expression: {e}")
+    return value
+
+
+def trash_action(value):
+    if value not in ("ls", "purge", "stats"):
+        raise ValueError("expects ls, purge or stats")
+    return value
+
+
+def history_action(value):
+    if value == "grep":
+        return value
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError("expects a positive number or grep")
+    return int(value)
+
+
+def hash_algo(value):
+    from hashing import ALGORITHMS
+    if value not in ALGORITHMS:
+        raise ValueError(f"expects {' or '.join(ALGORITHMS)}")
+    return value
+
+
+def reflink_mode(value):
+    modes = {"auto": "reflink", "always": "reflink-always", "never": None}
+    if value not in modes:
+        raise ValueError("expects auto, always or never")
+    return modes[value]
+
+
+def byte_size(value):
+    from search import parse_size
+    if value[:1] in ("+", "-"):
+        raise ValueError(f"invalid size '{value}' (expected N[c|k|M|G])")
+    return parse_size(value)[1]
+
+
+def log_time(value):
+    from logquery import parse_time
+    parse_time(value)
+    return value
+
+
+def log_status(value):
+    if value.upper() not in ("SUCCESS", "ERROR"):
+        raise ValueError("expects success or error")
+    return value.upper()
+
+
+def find_type(value):
+    from search import parse_type
+    parse_type(value)
+    return value
+
+
+def find_size(value):
+    from search import parse_size
+    parse_size(value)
+    return value
+
+
+def find_age(value):
+    from search import parse_age
+    parse_age(value)
+    return value
+
+
+class CommandSpec:
+    """
+    Описание команды: имя метода ShellCommands и схема аргументов.
+
+    flags      — флаги без значения: {"-r": ("flag_r", True)};
+    options    — флаги со значением: {"--jobs": ("jobs", positive_int)},
+                 значение передаётся следующим аргументом или через "=";
+    positional — имена позиционных аргументов по порядку, первые required обязательны;
+    converters — преобразования позиционных аргументов: {"count": positive_int};
+    variadic   — позиционный аргумент, принимающий список значений (cp a b c dst);
+    glob       — раскрывать ли шаблоны (*, ?, [...], **) в позиционных аргументах:
+                 True — во всех, кортеж имён — только в перечисленных (grep PATTERN FILES);
+    stream     — имя метода-генератора строк для использования в конвейере (|);
+    piped_required — сколько позиционных аргументов обязательно, когда вход
+                 команды — предыдущая стадия конвейера (cat big.log | grep ERROR);
+    optional_with — флаг, с которым позиционные аргументы не нужны (mv --resume).
+    """
+
+    def __init__(self, method, positional=(), required=0, flags=None, options=None,
+                 converters=None, combine_flags=False, variadic=None, glob=False,
+                 stream=None, piped_required=None, optional_with=None,
+                 arity_error="not enough arguments"):
+        self.method = method
+        self.positional = positional
+        self.required = required
+        self.flags = flags or {}
+        self.options = options or {}
+        self.converters = converters or {}
+        self.combine_flags = combine_flags
+        self.variadic = variadic
+        self.glob = glob
+        self.stream = stream
+        self.piped_required = required if piped_required is None else piped_required
+        self.optional_with = optional_with
+        self.arity_error = arity_error
+
+    def _is_combined(self, arg):
+        return (self.combine_flags and arg.startswith("-") and not arg.startswith("--")
+                and len(arg) > 2 and all(f"-{c}" in self.flags for c in arg[1:]))
+
+    def _group(self, values, required):
+        """Распределяет значения по позиционным аргументам с учётом variadic."""
+        if self.variadic is None:
+            if len(values) < required or len(values) > len(self.positional):
+                raise UsageError(self.arity_error)
+            return list(zip(self.positional, values))
+
+        fixed = len(self.positional) - 1
+        if len(values) < required:
+            raise UsageError(self.arity_error)
+        if len(values) < fixed + 1:
+            # Для конвейера variadic-аргумент может быть пустым (grep PATTERN)
+            return list(zip(self.positional, values))
+        index = self.positional.index(self.variadic)
+        count = len(values) - fixed
+        grouped = []
+        for i, name in enumerate(self.positional):
+            if i < index:
+                grouped.append((name, values[i]))
+            elif i == index:
+                grouped.append((name, values[i:i + count]))
+            else:
+                grouped.append((name, values[i + count - 1]))
+        return grouped
+
+    def parse(self, args, expand=None, piped=False):
+        """
+        Превращает список аргументов в kwargs для метода команды.
+        expand — функция раскрытия шаблонов для команд с glob=True;
+        piped — команда читает выход предыдущей стадии конвейера.
+        """
+        kwargs = {}
+        values = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            name, eq, inline = arg.partition("=") if arg.startswith("--") else (arg, "", "")
+            if arg in self.flags:
+                key, value = self.flags[arg]
+                kwargs[key] = value
+            elif name in self.options:
+                key, convert = self.options[name]
+                if not eq:
+                    i += 1
+                    if i >= len(args):
+                        raise UsageError(f"{name} expects a value")
+                    inline = args[i]
+                try:
+                    kwargs[key] = convert(inline)
+                except ValueError as e:
+                    raise UsageError(f"{name} {e}")
+            elif self._is_combined(arg):
+                for c in arg[1:]:
+                    key, value = self.flags[f"-{c}"]
+                    kwargs[key] = value
+            else:
+                values.append(arg)
+            i += 1
+
+        if self.glob is True and expand is not None:
+            values = expand(values)
+
+        if self.optional_with is not None and kwargs.get(self.optional_with):
+            if values:
+                raise UsageError(f"unexpected arguments: {' '.join(values)}")
+            return kwargs
+
+        for name, value in self._group(values, self.piped_required if piped else self.required):
+            if self.glob and self.glob is not True and name in self.glob and expand is not None:
+                value = expand(value) if isinstance(value, list) else value
+            convert = self.converters.get(name)
+            if convert is not None:
+                try:
+                    value = convert(value)
+                except ValueError as e:
+                    raise UsageError(f"{name} {e}")
+            kwargs[name] = value
+        return kwargs
+
+
+HEAD_TAIL_OPTIONS = {"-n": ("count", non_negative_int)}
+TWO_PATHS_ERROR = "not enough arguments (expected 2 files/dirs)"
+
+COMMANDS = {
+    "ls": CommandSpec(
+        "ls",
+        stream="iter_ls",
+        positional=("path",),
+        flags={"-l": ("flag_l", True), "-t": ("sort_by", "time"), "-S": ("sort_by", "size")},
+        options={"--limit": ("limit", non_negative_int)},
+        combine_flags=True,
+    ),
+    "cd": CommandSpec("cd", positional=("path",), required=1),
+    "cat": CommandSpec(
+        "cat",
+        positional=("path",),
+        required=1,
+        stream="iter_cat",
+        piped_required=0,
+        flags={"-b": ("binary", True), "--binary": ("binary", True)},
+        options={"--range": ("byte_range", byte_range)},
+    ),
+    "head": CommandSpec("head", positional=("path",), required=1, options=HEAD_TAIL_OPTIONS,
+                        stream="iter_head", piped_required=0),
+    "tail": CommandSpec("tail", positional=("path",), required=1, options=HEAD_TAIL_OPTIONS,
+                        stream="iter_tail", piped_required=0),
+    "cp": CommandSpec(
+        "cp",
+        positional=("src", "dst"),
+        required=2,
+        flags={
+            "-r": ("flag_r", True),
+            "-u": ("update", True),
+            "--update": ("update", True),
+            "-l": ("link", True),
+            "--link": ("link", True),
+        },
+        options={"--jobs": ("jobs", positive_int), "--reflink": ("reflink", reflink_mode)},
+        combine_flags=True,
+        variadic="src",
+        glob=True,
+        arity_error=TWO_PATHS_ERROR,
+    ),
+    "sync": CommandSpec(
+        "sync",
+        positional=("src", "dst"),
+        required=2,
+        flags={
+            "--delete": ("delete", True),
+            "-c": ("checksum", True),
+            "--checksum": ("checksum", True),
+            "-n": ("dry_run", True),
+            "--dry-run": ("dry_run", True),
+        },
+        options={"--jobs": ("jobs", positive_int)},
+        combine_flags=True,
+        arity_error=TWO_PATHS_ERROR,
+    ),
+    "dedupe": CommandSpec(
+        "dedupe",
+        positional=("path",),
+        flags={"--reflink": ("reflink", True), "-n": ("dry_run", True), "--dry-run": ("dry_run", True)},
+        options={"--min-size": ("min_size", byte_size), "--jobs": ("jobs", positive_int)},
+    ),
+    "mv": CommandSpec(
+        "mv",
+        positional=("src", "dst"),
+        required=2,
+        flags={"--verify": ("verify", True), "--resume": ("resume", True)},
+        options={"--jobs": ("jobs", positive_int)},
+        optional_with="resume",
+        variadic="src",
+        glob=True,
+        arity_error=TWO_PATHS_ERROR,
+    ),
+    "rm": CommandSpec(
+        "rm",
+        positional=("file",),
+        required=1,
+        flags={"-r": ("flag_r", True)},
+        variadic="file",
+        glob=True,
+    ),
+    "find": CommandSpec(
+        "find",
+        stream="iter_find",
+        positional=("path",),
+        options={
+            "--name": ("name", str),
+            "--type": ("kind", find_type),
+            "--size": ("size", find_size),
+            "--mtime": ("age", find_age),
+            "--jobs": ("jobs", positive_int),
+        },
+    ),
+    "grep": CommandSpec(
+        "grep",
+        positional=("pattern", "path"),
+        required=2,
+        flags={
+            "-r": ("flag_r", True),
+            "-i": ("ignore_case", True),
+            "-n": ("line_numbers", True),
+            "-l": ("names_only", True),
+        },
+        options={"--jobs": ("jobs", positive_int)},
+        converters={"pattern": regex},
+        combine_flags=True,
+        variadic="path",
+        glob=("path",),
+        stream="iter_grep",
+        piped_required=1,
+        arity_error="not enough arguments (expected PATTERN FILE...)",
+    ),
+    "du": CommandSpec(
+        "du",
+        stream="iter_du",
+        positional=("path",),
+        flags={"-s": ("summarize", True), "-h": ("human", True)},
+        options={"--depth": ("depth", non_negative_int)},
+        combine_flags=True,
+    ),
+    "hashsum": CommandSpec(
+        "hashsum",
+        stream="iter_hashsum",
+        positional=("path",),
+        required=1,
+        piped_required=0,
+        flags={"-r": ("flag_r", True)},
+        options={"--algo": ("algo", hash_algo), "--jobs": ("jobs", positive_int)},
+        variadic="path",
+        glob=True,
+        arity_error="not enough arguments (expected FILE...)",
+    ),
+    "log": CommandSpec(
+        "log",
+        stream="iter_log",
+        flags={"--json": ("as_json", True), "-f": ("follow", True)},
+        options={
+            "--since": ("since", log_time),
+            "--until": ("until", log_time),
+            "--command": ("command", str),
+            "--status": ("status", log_status),
+            "-n": ("last", positive_int),
+        },
+    ),
+    "trash": CommandSpec(
+        "trash",
+        positional=("action",),
+        options={"--limit": ("limit", non_negative_int), "--older-than": ("older_than", non_negative_int)},
+        converters={"action": trash_action},
+    ),
+    "stats": CommandSpec("stats", flags={"--json": ("as_json", True), "--reset": ("reset", True)}),
+    "jobs": CommandSpec("jobs"),
+    "wait": CommandSpec("wait", positional=("job_id",), converters={"job_id": positive_int}),
+    "kill": CommandSpec("kill", positional=("job_id",), required=1, converters={"job_id": positive_int}),
+    "history": CommandSpec(
+        "show_history",
+        stream="iter_history",
+        positional=("action", "pattern"),
+        flags={"--failed": ("failed", True)},
+        options={"--since": ("since", log_time), "-n": ("last", positive_int)},
+        converters={"action": history_action},
+    ),
+    "undo": CommandSpec(
+        "undo",
+        positional=("count",),
+        flags={"--list": ("show_list", True)},
+        converters={"count": positive_int},
+    ),
+    "redo": CommandSpec("redo", positional=("count",), converters={"count": positive_int}),
+}
@@ -0,0 +1,336 @@
+import os
+import re
+import mmap
+import stat
+import time
+import queue
+import fnmatch
+import threading
+from collections import deque
+from functools import lru_cache
+
+SIZE_UNITS = {"c": 1, "k": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+BINARY_PROBE = 8 * 1024
+_DONE = object()
+
+
+class PathEntry:
+    """Минимальная замена os.DirEntry для корня обхода, который не получен из scandir."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self._stat = os.lstat(path)
+
+    def stat(self, follow_symlinks=True):
+        return os.stat(self.path) if follow_symlinks else self._stat
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._stat.st_mode)
+
+
+def _put(results, item, stop):
+    """Кладёт item в ограниченную очередь, не зависая, если потребитель уже остановился."""
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def parallel_walk(root, display=None, jobs=8, select=None, on_error=None):
+    """
+    Обходит дерево root через os.scandir в jobs потоках с перехватом работы:
+    каждый поток берёт директории с конца своей очереди (в глубину), а когда
+    она пуста — забирает самые старые директории из очередей других потоков.
+    В симлинки на директории обход не заходит.
+
+    Генератор отдаёт пары (отображаемый путь, os.DirEntry) по мере обнаружения.
+    select(entry) вызывается в рабочих потоках, так что stat() фильтров
+    выполняется параллельно. Ошибки чтения директорий передаются в on_error
+    в потоке потребителя и не прерывают обход.
+    """
+    display = root if display is None else display
+    jobs = max(1, jobs)
+    deques = [deque() for _ in range(jobs)]
+    deques[0].append((root, display))
+    pending = [1]
+    cond = threading.Condition()
+    stop = threading.Event()
+    results = queue.Queue(maxsize=jobs * 16)
+
+    def take(index):
+        try:
+            return deques[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, jobs):
+            try:
+                return deques[(index + offset) % jobs].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def worker(index):
+        try:
+            while not stop.is_set():
+                task = take(index)
+                if task is None:
+                    with cond:
+                        if pending[0] == 0:
+                            return
+                        cond.wait(0.05)
+                    continue
+
+                path, shown = task
+                found = []
+                subdirs = []
+                error = None
+                try:
+                    with os.scandir(path) as it:
+                        for entry in it:
+                            entry_shown = os.path.join(shown, entry.name)
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append((entry.path, entry_shown))
+                            except OSError:
+                                pass
+                            if select is None or select(entry):
+                                found.append((entry_shown, entry))
+                except OSError as e:
+                    error = e
+
+                with cond:
+                    # Новые директории учитываются до завершения текущей, поэтому
+                    # счётчик не может обнулиться, пока работа ещё есть
+                    deques[index].extend(subdirs)
+                    pending[0] += len(subdirs) - 1
+                    if subdirs or pending[0] == 0:
+                        cond.notify_all()
+                if found or error is not None:
+                    _put(results, (found, error), stop)
+        finally:
+            _put(results, _DONE, stop)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(jobs)]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    try:
+        while finished < jobs:
+            item = results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            found, error = item
+            if error is not None and on_error is not None:
+                on_error(error)
+            yield from found
+    finally:
+        stop.set()
+
+
+def parse_size(text):
+    """'+10M' → ('+', 10485760): больше, меньше ('-') или равно заданному размеру."""
+    op = text[0] if text[:1] in ("+", "-") else "="
+    number = text.lstrip("+-")
+    unit = number[-1:] if number[-1:] in SIZE_UNITS else "c"
+    number = number.rstrip("".join(SIZE_UNITS))
+    if not number.isdigit():
+        raise ValueError(f"invalid size '{text}' (expected [+-]N[c|k|M|G])")
+    return op, int(number) * SIZE_UNITS[unit]
+
+
+def parse_age(text):
+    """'-2' → ('-', 172800): изменён меньше ('-') или больше ('+') N дней назад."""
+    op = text[0] if text[:1] in ("+", "-") else "="
+    try:
+        days = float(text.lstrip("+-"))
+    except ValueError:
+        raise ValueError(f"invalid age '{text}' (expected [+-]DAYS)")
+    return op, days * 86400
+
+
+def parse_type(text):
+    if text not in ("f", "d", "l"):
+        raise ValueError(f"invalid type '{text}' (expected f, d or l)")
+    return text
+
+
+def _compare(op, value, limit):
+    if op == "+":
+        return value > limit
+    if op == "-":
+        return value < limit
+    return value == limit
+
+
+def make_filter(name=None, kind=None, size=None, age=None, now=None):
+    """Собирает предикат для DirEntry из условий find; None — если условий нет."""
+    checks = []
+    if name is not None:
+        match = re.compile(fnmatch.translate(name)).match
+        checks.append(lambda entry: match(entry.name) is not None)
+    if kind is not None:
+        tests = {
+            "f": lambda entry: entry.is_file(follow_symlinks=False),
+            "d": lambda entry: entry.is_dir(follow_symlinks=False),
+            "l": lambda entry: entry.is_symlink(),
+        }
+        checks.append(tests[kind])
+    if size is not None:
+        op, limit = size
+        checks.append(lambda entry: _compare(op, entry.stat(follow_symlinks=False).st_size, limit))
+    if age is not None:
+        op, limit = age
+        now = time.time() if now is None else now
+        if op == "=":
+            # Как в find: N дней — возраст в пределах [N, N+1) суток
+            checks.append(lambda entry: 0 <= now - entry.stat(follow_symlinks=False).st_mtime - limit < 86400)
+        else:
+            checks.append(lambda entry: _compare(op, now - entry.stat(follow_symlinks=False).st_mtime, limit))
+    if not checks:
+        return None
+
+    def select(entry):
+        try:
+            return all(check(entry) for check in checks)
+        except OSError:
+            return False
+
+    return select
+
+
+@lru_cache(maxsize=32)
+def _compile(pattern, ignore_case):
+    # MULTILINE: буфер — весь файл, а ^ и $ должны совпадать на границах строк
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(pattern.encode("utf-8"), flags)
+
+
+def _scan(data, regex, names_only, max_count):
+    """
+    Ищет совпадения в буфере (bytes или mmap); возвращает [(номер строки, строка)].
+    Совпадение не может переходить через конец строки (\\s+, [^x]*): такая
+    строка проверяется повторно поиском только в её пределах.
+    """
+    matches = []
+    pos = 0
+    lineno = 1
+    counted = 0
+    while True:
+        m = regex.search(data, pos)
+        if m is None:
+            break
+        start = data.rfind(b"\n", 0, m.start()) + 1
+        if start == len(data):
+            # Пустое совпадение после завершающего перевода строки — строки там нет
+            break
+        end = data.find(b"\n", m.start())
+        if end == -1:
+            end = len(data)
+        if m.end() > end and regex.search(data, start, end) is None:
+            pos = end + 1
+            if pos > len(data):
+                break
+            continue
+        # Срез mmap — это bytes; суммарно копируется не больше размера файла
+        lineno += data[counted:start].count(b"\n")
+        counted = start
+        matches.append((lineno, bytes(data[start:end]).decode("utf-8", "replace")))
+        if names_only or len(matches) >= max_count:
+            break
+        pos = end + 1
+        if pos > len(data):
+            break
+    return matches
+
+
+def grep_file(path, pattern, ignore_case=False, names_only=False, mmap_threshold=1024 * 1024,
+              max_count=10 ** 9):
+    """
+    Ищет pattern в файле. Небольшие файлы читаются целиком, большие — через
+    mmap, так что в память не загружается весь файл. Возвращает
+    (совпадения, признак двоичного файла).
+    """
+    regex = _compile(pattern, ignore_case)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [], False
+        if size < mmap_threshold:
+            data = f.read()
+            binary = b"\0" in data[:BINARY_PROBE]
+            return _scan(data, regex, names_only or binary, max_count), binary
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            binary = data.find(b"\0", 0, BINARY_PROBE) != -1
+            return _scan(data, regex, names_only or binary, max_count), binary
+
+
+def grep_batch(files, pattern, ignore_case, names_only, mmap_threshold):
+    """Обрабатывает пачку файлов в процессе пула; ошибки возвращаются, а не выбрасываются."""
+    results = []
+    for shown, path in files:
+        try:
+            matches, binary = grep_file(path, pattern, ignore_case, names_only, mmap_threshold)
+            results.append((shown, matches, binary, None))
+        except OSError as e:
+            results.append((shown, [], False, e))
+    return results
+
+
+def iter_grep(files, pattern, ignore_case=False, names_only=False, jobs=None, batch_size=64,
+              inline_files=32, mmap_threshold=1024 * 1024):
+    """
+    Ищет pattern в потоке файлов (пары (отображаемый путь, путь)).
+    Первые inline_files файлов проверяются в текущем процессе, чтобы короткий
+    поиск не платил за запуск пула; дальше файлы отправляются пачками по
+    batch_size в ProcessPoolExecutor. Результаты отдаются по мере готовности
+    в порядке поступления файлов: (путь, совпадения, двоичный, ошибка).
+    """
+    _compile(pattern, ignore_case)  # ошибки в регулярном выражении — до запуска пула
+    files = iter(files)
+
+    for shown, path in files:
+        yield from grep_batch([(shown, path)], pattern, ignore_case, names_only, mmap_threshold)
+        inline_files -= 1
+        if inline_files <= 0:
+            break
+    else:
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+    # forkserver: процессы пула не наследуют потоки обхода и их блокировки
+    context = multiprocessing.get_context("forkserver")
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        try:
+            batch = []
+            for item in files:
+                batch.append(item)
+                if len(batch) < batch_size:
+                    continue
+                in_flight.append(pool.submit(grep_batch, batch, pattern, ignore_case, names_only,
+                                             mmap_threshold))
+                batch = []
+                while len(in_flight) > jobs * 2:
+                    yield from in_flight.popleft().result()
+            if batch:
+                in_flight.append(pool.submit(grep_batch, batch, pattern, ignore_case, names_only,
+                                             mmap_threshold))
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -1,29 +1,248 @@
 import os
-from logging_procces import setup_logging, check_history, add_log, save_history, add_to_history
+import threading
+from config import (
+    LOGGING_CONFIG, HISTORY_CONFIG, TRASH_CONFIG, OPERATIONS_CONFIG, DU_CONFIG, JOBS_CONFIG, MOVE_CONFIG,
+    COMPLETION_CONFIG, METRICS_CONFIG, HASH_CONFIG,
+)
 
 class System_Shell:
-    """Основной класс shell. Управляет логированием и историей."""
+    """
+    Основной класс shell. Управляет логированием и историей.
+
+    Логгер, история, корзина и журнал операций создаются при первом
+    обращении, чтобы запуск shell не ждал импорта logging.config, sqlite3,
+    json и чтения файлов, которые могут не понадобиться.
+
+    Фоновые задачи (jobs.py) пишут в тот же лог, историю и журнал операций,
+    поэтому их создание и запись защищены общей блокировкой.
+    """
 
     def __init__(self):
-        """Инициализирует текущую директорию, историю команд, настраивает логирование,
-        создает корзину и загружает историю."""
+        """Инициализирует текущую директорию и пути к файлам истории, корзины и журнала операций."""
         self.current_dir = os.getcwd()
-        self.history = []
-        self.history_file = ".history"
-        self.trash_dir = ".trash"
-        self.logger = setup_logging()
+        self.history_file = os.path.abspath(HISTORY_CONFIG["filename"])
+        self.legacy_history_file = os.path.abspath(HISTORY_CONFIG["legacy"])
+        self.log_file = os.path.abspath(LOGGING_CONFIG["handlers"]["file"]["filename"])
+        self.trash_dir = os.path.abspath(TRASH_CONFIG["dirname"])
+        self.operations_file = os.path.abspath(OPERATIONS_CONFIG["filename"])
+        self.size_cache_file = os.path.abspath(DU_CONFIG["cache"])
+        self.digest_cache_file = os.path.abspath(HASH_CONFIG["cache"])
+        self.moves_dir = os.path.abspath(MOVE_CONFIG["journal_dir"])
+
+        self._lock = threading.RLock()
+        self._logger = None
+        self.log_pipeline = None
+        self._history = None
+        self._history_loaded = 0
+        self._history_store = None
+        self._trash = None
+        self._operations = None
+        self._size_cache = None
+        self._digest_cache = None
+        self._jobs = None
+        self._path_index = None
+        self._metrics = None
+
+        # Статус последней выполненной команды (выставляется в log())
+        self.last_status = True
+        # Пакетный режим: журналы не сбрасываются на диск после каждой команды
+        self.batch_mode = False
+        # Ответ на запросы подтверждения, когда ввод не интерактивный (None — спрашивать)
+        self.assume_yes = None
+        # Флаг отмены и прогресс команды: есть только у фоновых задач (jobs.JobContext)
+        self.cancel_event = None
+        self.progress = None
+
+    @property
+    def logger(self):
+        with self._lock:
+            if self._logger is None:
+                from logging_procces import setup_logging, start_log_pipeline
+                self._logger = setup_logging(self.log_file)
+                self.log_pipeline = start_log_pipeline(self._logger)
+            return self._logger
+
+    @property
+    def history_store(self):
+        """База истории команд (SQLite); старый файл .history переносится в неё при первом открытии."""
+        with self._lock:
+            if self._history_store is None:
+                self.history
+            return self._history_store
+
+    @property
+    def history(self):
+        """Список команд: при первом обращении загружаются последние записи базы истории."""
+        with self._lock:
+            if self._history is None:
+                from history_store import HistoryStore
+                from logging_procces import check_history
+                self._history_store = HistoryStore(self.history_file, buffered=self.batch_mode)
+                history = []
+                check_history(self._history_store, history, self.legacy_history_file)
+                self._history_loaded = len(history)
+                self._history = history
+            return self._history
+
+    @property
+    def trash(self):
+        with self._lock:
+            if self._trash is None:
+                from trash import TrashManager
+                self._trash = TrashManager(
+                    self.trash_dir,
+                    TRASH_CONFIG["index"],
+                    quota=TRASH_CONFIG["quota"],
+                    max_age=TRASH_CONFIG["max_age"],
+                    grace=TRASH_CONFIG["grace"],
+                    codec=TRASH_CONFIG["codec"],
+                )
+                self._trash.start_worker(TRASH_CONFIG["interval"])
+            return self._trash
+
+    @property
+    def operations(self):
+        with self._lock:
+            if self._operations is None:
+                from op_journal import OperationJournal
+                operations = OperationJournal(
+                    self.operations_file,
+                    compact_every=OPERATIONS_CONFIG["compact_every"],
+                    buffered=self.batch_mode,
+                )
+                # Переносим только записи из файла, без команд текущей сессии
+                operations.seed(self.history[:self._history_loaded])
+                operations.load()
+                self._operations = operations
+            return self._operations
+
+    @property
+    def size_cache(self):
+        with self._lock:
+            if self._size_cache is None:
+                from dirsize import SizeCache
+                self._size_cache = SizeCache(self.size_cache_file)
+            return self._size_cache
+
+    @property
+    def digest_cache(self):
+        """Постоянный кэш контрольных сумм файлов (hashsum, sync --checksum, mv --verify)."""
+        with self._lock:
+            if self._digest_cache is None:
+                from hashing import DigestCache
+                self._digest_cache = DigestCache(self.digest_cache_file)
+            return self._digest_cache
 
-        if not os.path.exists(self.trash_dir):
-            os.makedirs(self.trash_dir)
+    @property
+    def jobs(self):
+        with self._lock:
+            if self._jobs is None:
+                from jobs import JobManager
+                self._jobs = JobManager(self, JOBS_CONFIG["workers"], JOBS_CONFIG["output_limit"])
+            return self._jobs
 
-        check_history(self.history_file, self.history)
+    @property
+    def path_index(self):
+        """Кэш содержимого директорий для дополнения путей по Tab."""
+        with self._lock:
+            if self._path_index is None:
+                from completion import PathIndex
+                self._path_index = PathIndex(COMPLETION_CONFIG["max_dirs"], COMPLETION_CONFIG["max_matches"])
+            return self._path_index
+
+    @property
+    def metrics(self):
+        """Время выполнения и счётчики команд за сессию (команда stats)."""
+        with self._lock:
+            if self._metrics is None:
+                from metrics import Metrics
+                self._metrics = Metrics(METRICS_CONFIG["export_every"])
+            return self._metrics
+
+    def export_metrics(self):
+        """Выгружает статистику команд в лог одной строкой JSON для мониторинга."""
+        import json
+        if self._metrics is None or not self._metrics.mark_exported():
+            return
+        self.write_log(f"metrics {json.dumps(self._metrics.snapshot(), separators=(',', ':'))}")
+
+    def refresh_completion(self, paths):
+        """Обновляет индекс дополнения для изменённых путей; пока Tab не нажимали, ничего не делает."""
+        if self._path_index is not None:
+            self._path_index.refresh(paths)
+
+    def invalidate_sizes(self, paths):
+        """Сбрасывает кэш du для изменённых путей; пока du не запускался, кэш не открывается."""
+        if self._size_cache is None and not os.path.exists(self.size_cache_file):
+            return
+        self.size_cache.invalidate(paths)
+
+    def notify_jobs(self):
+        """Показывает завершившиеся фоновые задачи (перед очередным приглашением)."""
+        if self._jobs is not None:
+            self._jobs.report()
+
+    def change_dir(self, path):
+        os.chdir(path)
+        self.current_dir = path
+        if self._path_index is not None:
+            self._path_index.warm(path)
+
+    def confirm(self, prompt):
+        """Запрашивает подтверждение; в пакетном режиме возвращает assume_yes без вопроса."""
+        if self.assume_yes is not None:
+            return self.assume_yes
+        return input(prompt).lower() == "y"
 
-   
     def log(self, command, status=True, error_msg=""):
+        self.last_status = status
+        self.write_log(command, status, error_msg)
+
+    def write_log(self, command, status=True, error_msg=""):
+        """Запись в лог без изменения last_status (её используют и фоновые задачи)."""
+        from logging_procces import add_log
         add_log(self.logger, command, status, error_msg)
 
     def history_add(self, command, args, status=True, other_data=None):
-        add_to_history(self.history, self.history_file, command, args, status, other_data)
+        from logging_procces import add_to_history
+        with self._lock:
+            history = self.history
+            add_to_history(history, self._history_store, command, args, status, other_data)
+            # В памяти остаются только последние записи, вся история — в базе
+            excess = len(history) - HISTORY_CONFIG["load_entries"]
+            if excess > 0:
+                del history[:excess]
+                self._history_loaded = max(self._history_loaded - excess, 0)
+
+    def op_push(self, command, args, items):
+        with self._lock:
+            self.operations.push(command, args, items)
+
+    def flush(self):
+        """Сбрасывает накопленные записи истории и журнала операций на диск."""
+        with self._lock:
+            if self._history_store is not None:
+                self._history_store.flush()
+            if self._operations is not None:
+                self._operations.flush()
+            if self._digest_cache is not None:
+                self._digest_cache.flush()
 
-    def history_save(self):
-        save_history(self.history_file, self.history)
\ No newline at end of file
+    def close(self):
+        """Дожидается фоновых задач и сбрасывает на диск накопленные записи истории и лога перед выходом."""
+        if self._jobs is not None:
+            self._jobs.close()
+        self.export_metrics()
+        if self._history_store is not None:
+            self._history_store.close()
+        if self._operations is not None:
+            self._operations.close()
+        if self._trash is not None:
+            self._trash.close()
+        if self._size_cache is not None:
+            self._size_cache.close()
+        if self._digest_cache is not None:
+            self._digest_cache.close()
+        if self.log_pipeline is not None:
+            from logging_procces import stop_log_pipeline
+            stop_log_pipeline(self.log_pipeline)
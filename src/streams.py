@@ -0,0 +1,89 @@
+import sys
+import time
+import codecs
+
+CHUNK_SIZE = 64 * 1024
+# Как часто выводить накопленное, когда источник медленный (конвейеры, find/grep)
+FLUSH_INTERVAL = 0.1
+
+
+def write_lines(lines, stream=None, chunk_size=CHUNK_SIZE, flush_interval=None):
+    """
+    Выводит строки буферизованными кусками примерно по chunk_size символов,
+    не собирая весь вывод в памяти. Возвращает количество выведенных строк.
+    flush_interval (секунды) — для медленных источников вроде find/grep: буфер
+    сбрасывается не реже этого интервала, чтобы результаты появлялись сразу.
+    """
+    stream = stream or sys.stdout
+    buffer = []
+    size = 0
+    count = 0
+    flushed = time.monotonic()
+    for line in lines:
+        buffer.append(line)
+        buffer.append("\n")
+        size += len(line) + 1
+        count += 1
+        if size >= chunk_size or (flush_interval is not None
+                                  and time.monotonic() - flushed >= flush_interval):
+            stream.write("".join(buffer))
+            if flush_interval is not None:
+                stream.flush()
+                flushed = time.monotonic()
+            buffer.clear()
+            size = 0
+    if buffer:
+        stream.write("".join(buffer))
+    stream.flush()
+    return count
+
+
+def iter_text_lines(chunks):
+    """
+    Превращает поток байтовых кусков в строки текста (без "\\n") с
+    инкрементальным декодированием UTF-8. В памяти держится только текущий
+    кусок и незавершённая строка.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    tail = ""
+    for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        yield from lines
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def write_chunks(chunks, binary=False, stream=None, prefix="", suffix=""):
+    """
+    Выводит поток байтовых кусков. В текстовом режиме байты декодируются
+    инкрементально как UTF-8 (некорректные последовательности заменяются),
+    в бинарном режиме пишутся в stdout как есть.
+    """
+    stream = stream or sys.stdout
+    raw = getattr(stream, "buffer", None) if binary else None
+    if raw is not None:
+        stream.flush()
+        for chunk in chunks:
+            raw.write(chunk)
+        raw.flush()
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    last = ""
+    stream.write(prefix)
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            stream.write(text)
+            last = text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        stream.write(tail)
+        last = tail
+    stream.write(suffix)
+    if last and not last.endswith("\n"):
+        stream.write("\n")
+    stream.flush()
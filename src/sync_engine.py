@@ -0,0 +1,259 @@
+import os
+import sys
+import stat
+import uuid
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from copy_engine import CopyProgress, copy_file
+
+
+class SyncPlan:
+    """
+    Что нужно сделать, чтобы dst совпал с src:
+
+    removes — пути в dst, которые удаляются (лишние при --delete или другого
+              типа, чем в src: файл на месте директории и наоборот);
+    dirs    — директории (src, dst) для создания, родители раньше детей;
+    copies  — файлы (src, dst, size, reason), reason — "new" или "changed";
+    created — новые объекты верхнего уровня (src, dst): их удаление отменяет sync;
+    checked — сколько файлов источника сравнено.
+    """
+
+    def __init__(self):
+        self.removes = []
+        self.dirs = []
+        self.copies = []
+        self.created = []
+        self.checked = 0
+
+    @property
+    def copy_bytes(self):
+        return sum(size for _, _, size, _ in self.copies)
+
+    def is_empty(self):
+        return not (self.removes or self.dirs or self.copies)
+
+
+def _entries(path):
+    """Содержимое директории {имя: os.DirEntry}; отсутствующая директория пуста."""
+    try:
+        with os.scandir(path) as it:
+            return {entry.name: entry for entry in it}
+    except FileNotFoundError:
+        return {}
+
+
+def _kind(entry, symlinks):
+    if symlinks and entry.is_symlink():
+        return "link"
+    return "dir" if entry.is_dir(follow_symlinks=not symlinks) else "file"
+
+
+def _differs(src_entry, dst_entry, kind, symlinks, checksum, digest):
+    """Отличается ли файл dst от src: ссылки — по цели, файлы — по размеру и mtime или по содержимому."""
+    if kind == "link":
+        return os.readlink(src_entry.path) != os.readlink(dst_entry.path)
+    a = src_entry.stat(follow_symlinks=not symlinks)
+    b = dst_entry.stat(follow_symlinks=not symlinks)
+    if a.st_size != b.st_size:
+        return True
+    if checksum:
+        return digest(src_entry.path) != digest(dst_entry.path)
+    # copy_file переносит mtime с точностью до наносекунд
+    return a.st_mtime_ns != b.st_mtime_ns
+
+
+def needs_copy(src, dst, checksum=False, digest=None):
+    """Нужно ли копировать отдельный файл src в dst (dst отсутствует или отличается)."""
+    try:
+        a = os.stat(src)
+        b = os.stat(dst)
+    except FileNotFoundError:
+        return True
+    if stat.S_ISDIR(b.st_mode) or a.st_size != b.st_size:
+        return True
+    if checksum:
+        if digest is None:
+            from move_engine import file_digest as digest
+        return digest(src) != digest(dst)
+    return a.st_mtime_ns != b.st_mtime_ns
+
+
+def compare_trees(src, dst, delete=False, checksum=False, symlinks=True, jobs=8, cancel=None, digest=None,
+                  exclude=None):
+    """
+    Сравнивает дерево src с dst и возвращает SyncPlan. Каждая пара
+    директорий читается одним os.scandir с обеих сторон, а пары
+    обрабатываются в пуле из jobs потоков (вместе с подсчётом контрольных
+    сумм при checksum=True), поэтому повторная проверка неизменного дерева
+    сводится к stat каждого файла без чтения содержимого.
+
+    symlinks=True — ссылки сравниваются и копируются как ссылки (sync),
+    иначе разыменовываются, как в cp -r.
+
+    exclude(путь) — пути, которые sync не трогает ни в src, ни в dst (не
+    копируются, не перезаписываются и не удаляются с --delete).
+    """
+    if checksum and digest is None:
+        from move_engine import file_digest as digest
+
+    plan = SyncPlan()
+    if not os.path.isdir(dst):
+        if os.path.lexists(dst):
+            plan.removes.append(dst)
+        plan.dirs.append((src, dst))
+        plan.created.append((src, dst))
+        dst_exists = False
+    else:
+        dst_exists = True
+
+    def scan(src_dir, dst_dir, dst_exists):
+        if cancel is not None and cancel.is_set():
+            raise InterruptedError("cancelled")
+        part = SyncPlan()
+        subdirs = []
+        dst_entries = _entries(dst_dir) if dst_exists else {}
+        for name, entry in _entries(src_dir).items():
+            dst_path = os.path.join(dst_dir, name)
+            other = dst_entries.pop(name, None)
+            if exclude is not None and (exclude(entry.path) or exclude(dst_path)):
+                continue
+            kind = _kind(entry, symlinks)
+            if other is not None and _kind(other, symlinks) != kind:
+                part.removes.append(dst_path)
+                other = None
+            top_level = dst_exists and other is None
+
+            if kind == "dir":
+                if other is None:
+                    part.dirs.append((entry.path, dst_path))
+                    if top_level:
+                        part.created.append((entry.path, dst_path))
+                subdirs.append((entry.path, dst_path, other is not None))
+                continue
+
+            part.checked += 1
+            size = entry.stat(follow_symlinks=not symlinks).st_size if kind == "file" else 0
+            if other is None:
+                part.copies.append((entry.path, dst_path, size, "new"))
+                if top_level:
+                    part.created.append((entry.path, dst_path))
+            elif _differs(entry, other, kind, symlinks, checksum, digest):
+                part.copies.append((entry.path, dst_path, size, "changed"))
+
+        if delete:
+            part.removes.extend(entry.path for entry in dst_entries.values()
+                                if exclude is None or not exclude(entry.path))
+        return part, subdirs
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        pending = {pool.submit(scan, src, dst, dst_exists)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    part, subdirs = future.result()
+                    plan.removes.extend(part.removes)
+                    plan.dirs.extend(part.dirs)
+                    plan.copies.extend(part.copies)
+                    plan.created.extend(part.created)
+                    plan.checked += part.checked
+                    # Дети отправляются после слияния родителя: порядок plan.dirs — от родителей к детям
+                    for sub in subdirs:
+                        pending.add(pool.submit(scan, *sub))
+        finally:
+            for future in pending:
+                future.cancel()
+    return plan
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def staging_path(dst):
+    """Временное имя рядом с dst: готовая копия переименовывается на место атомарно."""
+    return os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.sync-{uuid.uuid4().hex[:8]}.partial")
+
+
+def apply_plan(plan, jobs=8, remove=None, symlinks=True, progress_interval=0.5, show_progress=None,
+               cancel=None, progress_hook=None, mode="copy"):
+    """
+    Выполняет SyncPlan: удаляет объекты из plan.removes через remove(path)
+    (по умолчанию — безвозвратно), создаёт директории и копирует файлы в
+    пуле из jobs потоков. Каждый файл копируется во временное имя рядом с
+    местом назначения и переименовывается поверх старой версии, поэтому
+    читатели dst видят либо старый, либо новый файл целиком.
+
+    mode — способ создания файлов (copy_engine.COPY_MODES).
+
+    Возвращает (CopyProgress, список результатов remove). Ошибки отдельных
+    файлов собираются в shutil.Error, как в parallel_copytree.
+    """
+    remove = remove or _remove
+    removed = []
+    for path in plan.removes:
+        if cancel is not None and cancel.is_set():
+            raise InterruptedError("cancelled")
+        removed.append(remove(path))
+
+    for _, dst_dir in plan.dirs:
+        os.makedirs(dst_dir, exist_ok=True)
+
+    if show_progress is None:
+        show_progress = sys.stdout.isatty()
+    progress = CopyProgress(
+        len(plan.copies),
+        plan.copy_bytes,
+        progress_interval,
+        sys.stdout if show_progress and plan.copies else None,
+    )
+    if progress_hook is not None:
+        progress_hook(progress)
+
+    errors = []
+    slots = threading.BoundedSemaphore(max(jobs, 1) * 4)
+
+    def job(src_path, dst_path):
+        staging = staging_path(dst_path)
+        try:
+            copied = copy_file(src_path, staging, follow_symlinks=not symlinks, mode=mode)
+            os.replace(staging, dst_path)
+            progress.add(copied)
+        except OSError as e:
+            errors.append((src_path, dst_path, str(e)))
+            if os.path.lexists(staging):
+                os.remove(staging)
+        finally:
+            slots.release()
+
+    progress.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            for src_path, dst_path, _, _ in plan.copies:
+                slots.acquire()
+                if cancel is not None and cancel.is_set():
+                    slots.release()
+                    break
+                pool.submit(job, src_path, dst_path)
+    finally:
+        progress.stop()
+
+    if cancel is not None and cancel.is_set():
+        raise InterruptedError(f"cancelled after {progress.files}/{progress.total_files} files")
+
+    # Метаданные созданных директорий копируем в конце, иначе создание файлов изменит mtime
+    for src_dir, dst_dir in reversed(plan.dirs):
+        try:
+            shutil.copystat(src_dir, dst_dir)
+        except OSError as e:
+            errors.append((src_dir, dst_dir, str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+    return progress, removed
@@ -0,0 +1,428 @@
+import os
+import gzip
+import lzma
+import time
+import uuid
+import errno
+import shutil
+import sqlite3
+import tarfile
+import threading
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    original_path TEXT NOT NULL,
+    trash_path TEXT NOT NULL UNIQUE,
+    is_dir INTEGER NOT NULL,
+    size INTEGER,
+    deleted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_deleted_at ON items (deleted_at);
+"""
+
+# Столбцы, добавленные после первой версии каталога: (имя, тип)
+EXTRA_COLUMNS = [
+    ("codec", "TEXT"),            # NULL — ещё не обработан, "" — хранится как есть, "gzip"/"lzma"
+    ("stored_size", "INTEGER"),   # сколько объект занимает в корзине (после сжатия)
+    ("mode", "INTEGER"),          # права и время изменения сжатого файла для восстановления
+    ("mtime", "REAL"),
+]
+
+# Расширение сжатого файла и функция открытия потока для каждого способа сжатия
+CODECS = {
+    "gzip": (".gz", gzip.open, "gz"),
+    "lzma": (".xz", lzma.open, "xz"),
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _tree_size(path):
+    """Видимый размер файла или дерева (без разыменования ссылок)."""
+    if not (os.path.isdir(path) and not os.path.islink(path)):
+        return os.lstat(path).st_size
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames + dirnames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def move_path(src, dst):
+    """
+    Перемещает src в dst. Если оба пути на одном устройстве, выполняется
+    атомарный os.rename за O(1), иначе — потоковое копирование с удалением источника.
+    """
+    try:
+        same_device = os.lstat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev
+    except OSError:
+        same_device = False
+
+    if same_device:
+        try:
+            os.rename(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    shutil.move(src, dst)
+
+
+class TrashManager:
+    """
+    Корзина: удалённые объекты переносятся в trash_dir под уникальными
+    именами, а сведения о них хранятся в SQLite-каталоге, поэтому для
+    восстановления, просмотра и очистки корзины не нужно сканировать директорию.
+
+    Обслуживание (maintain(), в том числе в фоновом потоке start_worker()):
+    объекты старше max_age удаляются, объекты старше grace сжимаются
+    (файлы — gzip/lzma, директории — tar с тем же сжатием), а когда корзина
+    занимает больше quota байт, удаляются самые давно удалённые объекты.
+    Объекты моложе grace не сжимаются и не вытесняются, чтобы undo сразу
+    после rm всегда было возможно.
+    """
+
+    def __init__(self, trash_dir, index_name=".index.db", quota=None, max_age=None, grace=0,
+                 codec="gzip"):
+        self.trash_dir = os.path.abspath(trash_dir)
+        os.makedirs(self.trash_dir, exist_ok=True)
+        self.index_path = os.path.join(self.trash_dir, index_name)
+        self.quota = quota
+        self.max_age = max_age
+        self.grace = grace
+        self.codec = codec
+
+        self._lock = threading.Lock()
+        # Сжатие, восстановление и удаление одного объекта не должны пересекаться
+        self._item_lock = threading.Lock()
+        self._batch = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._worker = None
+        self.db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(items)")}
+        with self.db:
+            for name, kind in EXTRA_COLUMNS:
+                if name not in columns:
+                    self.db.execute(f"ALTER TABLE items ADD COLUMN {name} {kind}")
+
+    def contains(self, path):
+        """Проверяет, лежит ли path внутри корзины (или является ей самой)."""
+        path = os.path.abspath(path)
+        return path == self.trash_dir or path.startswith(self.trash_dir + os.sep)
+
+    def put(self, path):
+        """Переносит объект в корзину и регистрирует его в каталоге. Возвращает запись каталога."""
+        path = os.path.abspath(path)
+        name = os.path.basename(path)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        trash_path = os.path.join(self.trash_dir, f"{name}_{stamp}_{uuid.uuid4().hex[:8]}")
+
+        is_dir = os.path.isdir(path) and not os.path.islink(path)
+        # Размер директории посчитает фоновое обслуживание, чтобы rm -r оставался O(1)
+        size = None if is_dir else os.lstat(path).st_size
+        move_path(path, trash_path)
+
+        deleted_at = time.time()
+        with self._lock:
+            cursor = self.db.execute(
+                "INSERT INTO items (name, original_path, trash_path, is_dir, size, deleted_at, stored_size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, path, trash_path, int(is_dir), size, deleted_at, size),
+            )
+            if not self._batch:
+                self.db.commit()
+                self._wake.set()
+        return {
+            "id": cursor.lastrowid,
+            "name": name,
+            "original_path": path,
+            "trash_path": trash_path,
+            "is_dir": is_dir,
+            "size": size,
+            "deleted_at": deleted_at,
+        }
+
+    @contextmanager
+    def batch(self):
+        """Объединяет несколько put() в одну транзакцию каталога (фиксируется и при ошибке)."""
+        self._batch = True
+        try:
+            yield self
+        finally:
+            self._batch = False
+            with self._lock:
+                self.db.commit()
+            self._wake.set()
+
+    def _row(self, trash_path):
+        with self._lock:
+            row = self.db.execute("SELECT * FROM items WHERE trash_path = ?", (trash_path,)).fetchone()
+        return dict(row) if row is not None else None
+
+    @staticmethod
+    def stored_path(row):
+        """Где объект лежит на диске: trash_path или trash_path с расширением сжатия."""
+        codec = row.get("codec")
+        if not codec:
+            return row["trash_path"]
+        suffix = CODECS[codec][0]
+        return row["trash_path"] + (".tar" + suffix if row["is_dir"] else suffix)
+
+    def exists(self, trash_path):
+        """Есть ли объект в корзине (в исходном или сжатом виде)."""
+        row = self._row(trash_path)
+        if row is None:
+            return os.path.lexists(trash_path)
+        return os.path.lexists(self.stored_path(row))
+
+    def restore(self, trash_path, path):
+        """
+        Возвращает объект из корзины на место path и удаляет его из каталога.
+        Сжатый объект распаковывается во временное имя рядом с path и затем
+        переименовывается, поэтому на месте path не остаётся частичной копии.
+        """
+        with self._item_lock:
+            row = self._row(trash_path)
+            if row is None or not row.get("codec"):
+                move_path(trash_path, path)
+            else:
+                self._decompress(row, path)
+            with self._lock, self.db:
+                self.db.execute("DELETE FROM items WHERE trash_path = ?", (trash_path,))
+
+    def _decompress(self, row, path):
+        stored = self.stored_path(row)
+        _, opener, tar_mode = CODECS[row["codec"]]
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.restore-{uuid.uuid4().hex[:8]}")
+        try:
+            if row["is_dir"]:
+                # Архив лежит в корзине, которую может изменить пользователь: пути и ссылки только внутри tmp
+                try:
+                    with tarfile.open(stored, f"r:{tar_mode}") as tar:
+                        tar.extractall(tmp, filter="tar")
+                except tarfile.TarError as e:
+                    raise OSError(f"Damaged trash archive '{stored}': {e}")
+            else:
+                with opener(stored, "rb") as fsrc, open(tmp, "wb") as fdst:
+                    shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+                os.chmod(tmp, row["mode"])
+                os.utime(tmp, (row["mtime"], row["mtime"]))
+            os.rename(tmp, path)
+        except BaseException:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+            elif os.path.lexists(tmp):
+                os.remove(tmp)
+            raise
+        os.remove(stored)
+
+    def _compress(self, row):
+        """
+        Сжимает один объект во временный файл и подменяет им оригинал.
+        Возвращает (codec, stored_size, mode, mtime); если сжатие не уменьшило
+        размер или объект — ссылка, он остаётся как есть и codec пустой.
+        """
+        trash_path = row["trash_path"]
+        if os.path.islink(trash_path):
+            return "", os.lstat(trash_path).st_size, None, None
+        _, opener, tar_mode = CODECS[self.codec]
+        target = self.stored_path(dict(row, codec=self.codec))
+        tmp = target + ".tmp"
+        st = os.lstat(trash_path)
+
+        def check_stop(info):
+            if self._stop.is_set():
+                raise InterruptedError("trash worker stopped")
+            return info
+
+        try:
+            if row["is_dir"]:
+                with tarfile.open(tmp, f"w:{tar_mode}") as tar:
+                    tar.add(trash_path, arcname=".", filter=check_stop)
+            else:
+                with open(trash_path, "rb") as fsrc, opener(tmp, "wb") as fdst:
+                    while True:
+                        check_stop(None)
+                        chunk = fsrc.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        fdst.write(chunk)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            raise
+
+        stored_size = os.path.getsize(tmp)
+        if stored_size >= row["size"]:
+            os.remove(tmp)
+            return "", row["size"], None, None
+        os.rename(tmp, target)
+        if row["is_dir"]:
+            shutil.rmtree(trash_path)
+        else:
+            os.remove(trash_path)
+        return self.codec, stored_size, st.st_mode, st.st_mtime
+
+    def maintain(self, now=None):
+        """
+        Один проход обслуживания: считает размеры новых директорий, удаляет
+        устаревшие объекты, сжимает объекты старше grace и вытесняет самые
+        давно удалённые, пока корзина больше квоты.
+        Возвращает счётчики {"sized", "expired", "compressed", "evicted"}.
+        """
+        now = time.time() if now is None else now
+        stats = {"sized": 0, "expired": 0, "compressed": 0, "evicted": 0}
+
+        with self._lock:
+            unsized = self.db.execute("SELECT id, trash_path FROM items WHERE size IS NULL").fetchall()
+        for row in unsized:
+            if self._stop.is_set():
+                return stats
+            try:
+                size = _tree_size(row["trash_path"])
+            except OSError:
+                continue
+            with self._lock, self.db:
+                self.db.execute("UPDATE items SET size = ?, stored_size = ? WHERE id = ? AND codec IS NULL",
+                                (size, size, row["id"]))
+            stats["sized"] += 1
+
+        if self.max_age is not None:
+            stats["expired"] = self.purge(older_than=now - self.max_age)
+
+        with self._lock:
+            fresh = self.db.execute(
+                "SELECT * FROM items WHERE codec IS NULL AND size IS NOT NULL AND deleted_at < ? "
+                "ORDER BY deleted_at",
+                (now - self.grace,),
+            ).fetchall()
+        for row in fresh:
+            if self._stop.is_set():
+                return stats
+            with self._item_lock:
+                # Объект могли восстановить или удалить, пока шёл проход
+                if self._row(row["trash_path"]) is None:
+                    continue
+                try:
+                    result = self._compress(dict(row))
+                except InterruptedError:
+                    return stats
+                except OSError:
+                    result = ("", row["size"], None, None)
+                codec = result[0]
+                with self._lock, self.db:
+                    self.db.execute(
+                        "UPDATE items SET codec = ?, stored_size = ?, mode = ?, mtime = ? WHERE id = ?",
+                        result + (row["id"],),
+                    )
+            stats["compressed"] += bool(codec)
+
+        if self.quota is not None:
+            stats["evicted"] = self._evict(now)
+        return stats
+
+    def _evict(self, now):
+        with self._lock:
+            total = self.db.execute("SELECT COALESCE(SUM(stored_size), 0) FROM items").fetchone()[0]
+            if total <= self.quota:
+                return 0
+            rows = self.db.execute(
+                "SELECT id, stored_size FROM items WHERE deleted_at < ? ORDER BY deleted_at",
+                (now - self.grace,),
+            ).fetchall()
+        ids = []
+        for row in rows:
+            if total <= self.quota:
+                break
+            ids.append(row["id"])
+            total -= row["stored_size"] or 0
+        return self.purge(ids=ids) if ids else 0
+
+    def stats(self):
+        """Сводка по корзине: число объектов, исходный и занимаемый объём, квота."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT COUNT(*) AS items, COALESCE(SUM(size), 0) AS size, "
+                "COALESCE(SUM(stored_size), 0) AS stored_size, "
+                "SUM(CASE WHEN codec IN ('gzip', 'lzma') THEN 1 ELSE 0 END) AS compressed, "
+                "MIN(deleted_at) AS oldest FROM items"
+            ).fetchone()
+        return dict(row, quota=self.quota, max_age=self.max_age)
+
+    def start_worker(self, interval=60):
+        """Запускает фоновое обслуживание: раз в interval секунд и сразу после rm."""
+        if self._worker is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.wait(interval)
+                self._wake.clear()
+                if self._stop.is_set():
+                    break
+                try:
+                    self.maintain()
+                except (OSError, sqlite3.Error):
+                    continue
+
+        self._worker = threading.Thread(target=loop, name="trash-worker", daemon=True)
+        self._worker.start()
+
+    def list_items(self, limit=None):
+        """Возвращает записи каталога, начиная с последних удалённых."""
+        query = "SELECT * FROM items ORDER BY deleted_at DESC"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            return [dict(row) for row in self.db.execute(query, params)]
+
+    def purge(self, older_than=None, ids=None):
+        """
+        Окончательно удаляет объекты из корзины (все, удалённые раньше
+        older_than (timestamp) или с указанными id). Возвращает количество удалённых объектов.
+        """
+        query = "SELECT id, trash_path, is_dir, codec FROM items"
+        params = ()
+        if older_than is not None:
+            query += " WHERE deleted_at < ?"
+            params = (older_than,)
+        elif ids is not None:
+            query += f" WHERE id IN ({', '.join('?' * len(ids))})"
+            params = tuple(ids)
+        with self._lock:
+            rows = self.db.execute(query, params).fetchall()
+
+        purged = []
+        for row in rows:
+            with self._item_lock:
+                stored = self.stored_path(dict(row))
+                try:
+                    if os.path.isdir(stored) and not os.path.islink(stored):
+                        shutil.rmtree(stored)
+                    else:
+                        os.remove(stored)
+                except FileNotFoundError:
+                    pass
+                with self._lock, self.db:
+                    self.db.execute("DELETE FROM items WHERE id = ?", (row["id"],))
+            purged.append(row["id"])
+        return len(purged)
+
+    def close(self):
+        if self._worker is not None:
+            self._stop.set()
+            self._wake.set()
+            self._worker.join()
+        with self._lock:
+            self.db.close()
@@ -4,6 +4,43 @@ from unittest.mock import patch
 import os
 import shutil
 import json
+import hashlib
+import sys
+import tempfile
+import time
+import queue
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import logging
+from contextlib import redirect_stdout
+from io import StringIO
+from history_store import HistoryStore
+from metrics import Histogram, Metrics
+from log_pipeline import GzipRotatingFileHandler, LogPipeline
+from logging_procces import add_log, setup_logging
+from listing import iter_listing
+from file_reader import head_offset, tail_offset, parse_range
+from operations import ShellCommands
+from copy_engine import parallel_copytree, copy_file, copy_file_chunked, reflink_supported
+from sync_engine import compare_trees, apply_plan
+from hashing import DigestCache, hash_file, iter_digests
+from move_engine import MoveJournal, move_path, resume_move, staging_path
+from trash import TrashManager
+from op_journal import JsonLinesFile, OperationJournal
+from registry import COMMANDS, CommandSpec, UsageError
+from parser import ShellParser
+from shell_core import System_Shell
+from exception_handler import handle_os_errors
+from globbing import expand
+from dirsize import SizeCache, dir_sizes, human_size
+from jobs import JobManager
+from completion import Completer, PathIndex
+from daemon import ShellServer
+from client import run_lines
+import logquery
+from search import parallel_walk, make_filter, grep_file, iter_grep
 
 
 class ShellTests(unittest.TestCase):
@@ -184,5 +221,1737 @@ class ShellTests(unittest.TestCase):
                 with open(".history", "r") as f:
                     json.load(f)
 
+
+class FakeCore:
+    """Минимальная замена System_Shell для тестов команд."""
+
+    def __init__(self, current_dir):
+        self.current_dir = current_dir
+        self.trash_dir = os.path.join(current_dir, ".trash")
+        self.moves_dir = os.path.join(current_dir, ".moves")
+        self.history_file = os.path.join(current_dir, ".history.db")
+        self.log_file = os.path.join(current_dir, "shell.log")
+        self.operations_file = os.path.join(current_dir, ".operations")
+        self.size_cache_file = os.path.join(current_dir, ".du_cache.db")
+        self.digest_cache_file = os.path.join(current_dir, ".digest_cache.db")
+        self.path_index = None
+        self._trash = None
+        self._size_cache = None
+        self._digest_cache = None
+        self._digest_lock = threading.Lock()
+        self._jobs = None
+        self.cancel_event = None
+        self.progress = None
+        self.assume_yes = None
+        self.operations = OperationJournal(self.operations_file)
+        self.history = []
+        self.logs = []
+
+    @property
+    def trash(self):
+        if self._trash is None:
+            self._trash = TrashManager(self.trash_dir)
+        return self._trash
+
+    def log(self, command, status=True, error_msg=""):
+        self.last_status = status
+        self.logs.append((command, status, error_msg))
+
+    def history_add(self, command, args, status=True, other_data=None):
+        self.history.append(
+            {"command": command, "args": args, "status": status, "other_data": other_data or {}}
+        )
+
+    def op_push(self, command, args, items):
+        self.operations.push(command, args, items)
+
+    @property
+    def digest_cache(self):
+        # Кэш запрашивают потоки проверки mv --verify, как и в System_Shell — под блокировкой
+        with self._digest_lock:
+            if self._digest_cache is None:
+                self._digest_cache = DigestCache(self.digest_cache_file)
+            return self._digest_cache
+
+    @property
+    def size_cache(self):
+        if self._size_cache is None:
+            self._size_cache = SizeCache(self.size_cache_file)
+        return self._size_cache
+
+    def invalidate_sizes(self, paths):
+        if self._size_cache is not None:
+            self._size_cache.invalidate(paths)
+
+    def refresh_completion(self, paths):
+        if self.path_index is not None:
+            self.path_index.refresh(paths)
+
+    @property
+    def jobs(self):
+        if self._jobs is None:
+            self._jobs = JobManager(self, workers=2)
+        return self._jobs
+
+    def write_log(self, command, status=True, error_msg=""):
+        self.logs.append((command, status, error_msg))
+
+    def change_dir(self, path):
+        self.current_dir = path
+
+    def confirm(self, prompt):
+        return True
+
+    def flush(self):
+        pass
+
+
+class ListingTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for i, size in enumerate([30, 10, 20]):
+            path = os.path.join(self.tmp, f"file_{i}")
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+            os.utime(path, (1000 + i, 1000 + i))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_sort_by_size(self):
+        self.assertEqual(list(iter_listing(self.tmp, sort_by="size")), ["file_0", "file_2", "file_1"])
+
+    def test_sort_by_time_with_limit(self):
+        self.assertEqual(list(iter_listing(self.tmp, sort_by="time", limit=2)), ["file_2", "file_1"])
+
+    def test_ls_long(self):
+        core = FakeCore(self.tmp)
+        out = StringIO()
+        with redirect_stdout(out):
+            ShellCommands(core).ls(flag_l=True, sort_by="size", limit=1)
+
+        self.assertEqual(out.getvalue().split("\t")[0].strip(), "file_0")
+        self.assertTrue(core.logs[0][1])
+
+
+class FileReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "big.log")
+        with open(self.path, "wb") as f:
+            f.write(b"".join(f"line {i}\n".encode() for i in range(1000)))
+        self.core = FakeCore(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_command(self, name, *args):
+        out = StringIO()
+        with redirect_stdout(out):
+            getattr(ShellCommands(self.core), name)(*args)
+        return out.getvalue()
+
+    def test_head(self):
+        self.assertEqual(self.run_command("head", "big.log", 2), "line 0\nline 1\n")
+        self.assertIsNone(head_offset(self.path, 5000))
+
+    def test_tail(self):
+        self.assertEqual(self.run_command("tail", "big.log", 2), "line 998\nline 999\n")
+        self.assertEqual(tail_offset(self.path, 5000), 0)
+
+    def test_cat_range(self):
+        out = self.run_command("cat", "big.log", False, parse_range("7:14"))
+        self.assertIn("line 1\n", out)
+        self.assertNotIn("line 0", out)
+
+    def test_cat_binary_file(self):
+        with open(os.path.join(self.tmp, "data.bin"), "wb") as f:
+            f.write(bytes(range(256)))
+        self.run_command("cat", "data.bin")
+        self.assertTrue(self.core.logs[-1][1])
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("10:"), (10, None))
+        with self.assertRaises(ValueError):
+            parse_range("a:b")
+
+
+class CopyEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "src")
+        for d in ["a", "a/b", "c"]:
+            os.makedirs(os.path.join(self.src, d))
+        for i, d in enumerate(["", "a", "a/b", "c"]):
+            with open(os.path.join(self.src, d, f"f{i}.txt"), "w") as f:
+                f.write("data" * (i + 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def tree(self, root):
+        result = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                with open(path) as f:
+                    result[os.path.relpath(path, root)] = f.read()
+        return result
+
+    def test_parallel_copytree(self):
+        dst = os.path.join(self.tmp, "dst")
+        progress = parallel_copytree(self.src, dst, jobs=4, show_progress=False)
+
+        self.assertEqual(self.tree(self.src), self.tree(dst))
+        self.assertEqual(progress.files, 4)
+        self.assertEqual(progress.bytes, 4 + 8 + 12 + 16)
+
+    def test_copytree_existing_dst(self):
+        with self.assertRaises(FileExistsError):
+            parallel_copytree(self.src, os.path.join(self.src, "a"), show_progress=False)
+
+    def test_copy_file_keeps_mtime(self):
+        src = os.path.join(self.src, "f0.txt")
+        os.utime(src, (1000, 1000))
+        dst = os.path.join(self.tmp, "copy.txt")
+        self.assertEqual(copy_file(src, dst), 4)
+        self.assertEqual(os.stat(dst).st_mtime, 1000)
+
+    def test_cp_r_undo_metadata(self):
+        core = FakeCore(self.tmp)
+        ShellCommands(core).cp("src", "dst", True, 2)
+
+        other_data = core.history[-1]["other_data"]
+        self.assertEqual(other_data["dst_path"], os.path.join(self.tmp, "dst"))
+        self.assertEqual(self.tree(self.src), self.tree(other_data["dst_path"]))
+
+
+class SyncTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "src")
+        self.dst = os.path.join(self.tmp, "dst")
+        os.makedirs(os.path.join(self.src, "sub"))
+        for name, text in [("same.txt", "same"), ("changed.txt", "new"), ("sub/new.txt", "n")]:
+            self.write(self.src, name, text)
+        os.makedirs(self.dst)
+        parallel_copytree(os.path.join(self.src, "sub"), os.path.join(self.dst, "sub"), show_progress=False)
+        os.remove(os.path.join(self.dst, "sub", "new.txt"))
+        copy_file(os.path.join(self.src, "same.txt"), os.path.join(self.dst, "same.txt"))
+        self.write(self.dst, "changed.txt", "old")
+        self.write(self.dst, "extra.txt", "x")
+        # Размер совпадает, поэтому изменение видно только по mtime
+        os.utime(os.path.join(self.dst, "changed.txt"), (1000, 1000))
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+
+    def tearDown(self):
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, root, name, text):
+        with open(os.path.join(root, name), "w") as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.dst, name)) as f:
+            return f.read()
+
+    def test_plan(self):
+        plan = compare_trees(self.src, self.dst, delete=True, jobs=2)
+        self.assertEqual(sorted((os.path.relpath(d, self.dst), reason) for _, d, _, reason in plan.copies),
+                         [("changed.txt", "changed"), ("sub/new.txt", "new")])
+        self.assertEqual(plan.removes, [os.path.join(self.dst, "extra.txt")])
+        self.assertEqual(plan.checked, 3)
+
+    def test_checksum_ignores_mtime(self):
+        os.utime(os.path.join(self.dst, "same.txt"), (1000, 1000))
+        plan = compare_trees(self.src, self.dst, checksum=True)
+        self.assertEqual({os.path.basename(d): reason for _, d, _, reason in plan.copies},
+                         {"changed.txt": "changed", "new.txt": "new"})
+
+    def test_sync_and_rerun(self):
+        with redirect_stdout(StringIO()):
+            self.commands.sync("src", "dst", delete=True)
+        self.assertEqual(self.read("changed.txt"), "new")
+        self.assertEqual(self.read("sub/new.txt"), "n")
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "extra.txt")))
+        self.assertTrue(compare_trees(self.src, self.dst, delete=True).is_empty())
+
+        with redirect_stdout(StringIO()) as out:
+            self.commands.sync("src", "dst", delete=True)
+        self.assertIn("copied 0 new and 0 changed", out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.sync("src", "dst", delete=True, dry_run=True)
+        self.assertIn("delete extra.txt", out.getvalue())
+        self.assertIn("new     sub/new.txt", out.getvalue())
+        self.assertEqual(self.read("changed.txt"), "old")
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "extra.txt")))
+
+    def test_undo_restores_deleted_and_removes_created(self):
+        with redirect_stdout(StringIO()):
+            self.commands.sync("src", "dst", delete=True)
+            self.commands.undo()
+        self.assertEqual(self.read("extra.txt"), "x")
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "sub", "new.txt")))
+
+    def test_sync_into_itself(self):
+        with redirect_stdout(StringIO()):
+            self.commands.sync("src", "src/sub")
+        self.assertFalse(self.core.logs[-1][1])
+
+    def test_error_args_match_command_line(self):
+        with redirect_stdout(StringIO()):
+            self.commands.sync(src="src", dst="src/sub", delete=True, dry_run=False, jobs=2)
+            self.commands.cp(src=["nope", "other"], dst="dst", flag_r=True)
+        self.assertEqual([entry[0] for entry in self.core.logs[-2:]],
+                         ["sync src src/sub --delete --jobs 2", "cp nope other dst -r"])
+        self.assertEqual(self.core.history[-1]["args"], ["nope", "other", "dst", "-r"])
+
+    def test_delete_keeps_shell_state(self):
+        self.core.digest_cache.digest(os.path.join(self.src, "same.txt"))
+        os.makedirs(os.path.join(self.tmp, ".moves"))
+        for name in (".history.db", ".history.db-wal", ".history.db-shm", "shell.log", "shell.log.1.gz"):
+            self.write(self.tmp, name, "state")
+        self.core.trash.put(os.path.join(self.dst, "extra.txt"))
+        state = sorted(name for name in os.listdir(self.tmp) if name not in ("src", "dst"))
+
+        with redirect_stdout(StringIO()) as out:
+            self.commands.sync("src", ".", delete=True, dry_run=True)
+        self.assertEqual([line for line in out.getvalue().splitlines() if line.startswith("delete")],
+                         ["delete dst"])
+
+        with redirect_stdout(StringIO()):
+            self.commands.sync("src", ".", delete=True)
+        self.assertTrue(self.core.logs[-1][1])
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         sorted(set(state) | {".operations", "src", "same.txt", "changed.txt", "sub"}))
+
+    def test_cp_update_trashes_replaced_types(self):
+        copy = os.path.join(self.dst, "src")
+        os.makedirs(os.path.join(copy, "changed.txt"))
+        self.write(copy, "changed.txt/keep", "dir")
+        self.write(copy, "sub", "precious")
+        self.commands.cp("src", "dst", flag_r=True, update=True)
+        self.assertTrue(self.core.logs[-1][1])
+        self.assertTrue(compare_trees(self.src, copy, symlinks=False).is_empty())
+
+        self.commands.undo()
+        with open(os.path.join(copy, "sub")) as f:
+            self.assertEqual(f.read(), "precious")
+        with open(os.path.join(copy, "changed.txt", "keep")) as f:
+            self.assertEqual(f.read(), "dir")
+
+        self.commands.redo()
+        self.assertTrue(compare_trees(self.src, copy, symlinks=False).is_empty())
+
+    def test_cp_update(self):
+        os.remove(os.path.join(self.dst, "extra.txt"))
+        self.commands.cp("src", "dst", flag_r=True, update=True)
+        copy = os.path.join(self.dst, "src")
+        self.assertTrue(compare_trees(self.src, copy, symlinks=False).is_empty())
+
+        self.write(self.src, "sub/newer.txt", "z")
+        self.commands.cp("src", "dst", flag_r=True, update=True)
+        self.assertEqual(self.core.history[-1]["other_data"]["dst_path"], os.path.join(copy, "sub", "newer.txt"))
+        self.commands.undo()
+        self.assertFalse(os.path.exists(os.path.join(copy, "sub", "newer.txt")))
+        self.assertTrue(os.path.exists(os.path.join(copy, "sub", "new.txt")))
+
+
+class DedupeTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp, "art", "x"))
+        os.makedirs(os.path.join(self.tmp, "art", "y"))
+        self.blob = os.urandom(100000)
+        for name, data in [("x/blob", self.blob), ("y/blob", self.blob), ("y/other", os.urandom(100000)),
+                           ("x/s", b"s"), ("y/s", b"s")]:
+            with open(os.path.join(self.tmp, "art", name), "wb") as f:
+                f.write(data)
+        os.utime(os.path.join(self.tmp, "art/y/blob"), ns=(10 ** 9, 10 ** 9))
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+
+    def tearDown(self):
+        self.core.digest_cache.close()
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_cp_link_and_undo(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.cp("art", "copy", flag_r=True, link=True)
+        self.assertIn("0 of", out.getvalue())
+        self.assertTrue(os.path.samefile(self.path("art/x/blob"), self.path("copy/x/blob")))
+
+        self.commands.undo()
+        self.assertFalse(os.path.exists(self.path("copy")))
+        self.assertEqual(os.stat(self.path("art/x/blob")).st_nlink, 1)
+        self.commands.redo()
+        self.assertTrue(os.path.samefile(self.path("art/y/s"), self.path("copy/y/s")))
+
+    def test_cp_reflink_auto_falls_back_to_copy(self):
+        with redirect_stdout(StringIO()):
+            self.commands.cp("art/x/blob", "clone", reflink="reflink")
+        with open(self.path("clone"), "rb") as f:
+            self.assertEqual(f.read(), self.blob)
+        self.assertFalse(os.path.samefile(self.path("art/x/blob"), self.path("clone")))
+
+    def test_reflink_always_reports_unsupported(self):
+        if reflink_supported(self.tmp):
+            self.skipTest("filesystem supports reflinks")
+        with self.assertRaises(OSError):
+            copy_file(self.path("art/x/blob"), self.path("clone"), mode="reflink-always")
+        self.assertFalse(os.path.exists(self.path("clone")))
+
+    def test_dedupe_dry_run(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.dedupe("art", dry_run=True)
+        self.assertIn("2 duplicate(s) in 2 group(s)", out.getvalue())
+        self.assertEqual(os.stat(self.path("art/y/blob")).st_nlink, 1)
+
+    def test_dedupe_links_and_undo(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.dedupe("art", min_size=2)
+        self.assertIn("replaced 1 duplicate(s)", out.getvalue())
+        self.assertTrue(os.path.samefile(self.path("art/x/blob"), self.path("art/y/blob")))
+        self.assertFalse(os.path.samefile(self.path("art/x/s"), self.path("art/y/s")))
+
+        # Уже связанные файлы повторно не считаются дубликатами
+        with redirect_stdout(StringIO()) as out:
+            self.commands.dedupe("art", min_size=2)
+        self.assertIn("replaced 0 duplicate(s)", out.getvalue())
+
+        self.commands.undo()
+        self.assertFalse(os.path.samefile(self.path("art/x/blob"), self.path("art/y/blob")))
+        self.assertEqual(os.stat(self.path("art/y/blob")).st_mtime_ns, 10 ** 9)
+        with open(self.path("art/y/blob"), "rb") as f:
+            self.assertEqual(f.read(), self.blob)
+
+    def test_dedupe_skips_shell_state(self):
+        import sqlite3
+
+        self.core.digest_cache.digest(self.path("art/x/blob"))
+        self.core.digest_cache.flush()
+        db = sqlite3.connect(self.path("art/x/app.db"))
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE t (x)")
+        db.commit()
+        shutil.copy(self.path("art/x/app.db"), self.path("art/y/app.db"))
+        for name in (".history.db", "shell.log", ".trash/a", ".trash/b", "art/x/empty", "art/y/empty"):
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            with open(self.path(name), "w") as f:
+                f.write("" if name.endswith("empty") else "state")
+        try:
+            with redirect_stdout(StringIO()) as out:
+                self.commands.dedupe(".", min_size=0, dry_run=True)
+        finally:
+            db.close()
+        self.assertIn("2 duplicate(s) in 2 group(s)", out.getvalue())
+        self.assertNotIn(".history.db", out.getvalue())
+        self.assertNotIn("app.db", out.getvalue())
+
+
+class HashTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp, "d", "sub"))
+        self.data = {"d/a.bin": os.urandom(300000), "d/sub/b.txt": b"hello\n"}
+        for name, data in self.data.items():
+            with open(os.path.join(self.tmp, name), "wb") as f:
+                f.write(data)
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+
+    def tearDown(self):
+        self.core.digest_cache.close()
+        shutil.rmtree(self.tmp)
+
+    def expected(self, name, algo="sha256"):
+        return hashlib.new(algo, self.data[name]).hexdigest()
+
+    def test_hash_file_mmap_and_read(self):
+        path = os.path.join(self.tmp, "d/a.bin")
+        for threshold in (1, 10 ** 9):
+            self.assertEqual(hash_file(path, "blake2b", threshold), (self.expected("d/a.bin", "blake2b"), 300000))
+
+    def test_cache_skips_unchanged_files(self):
+        cache = self.core.digest_cache
+        path = os.path.join(self.tmp, "d/sub/b.txt")
+        self.assertEqual(cache.lookup(path), (self.expected("d/sub/b.txt"), 6))
+        self.assertEqual(cache.lookup(path), (self.expected("d/sub/b.txt"), 0))
+
+        with open(path, "wb") as f:
+            f.write(b"changed\n")
+        os.utime(path, ns=(0, 10 ** 9))
+        self.assertEqual(cache.lookup(path), (hashlib.sha256(b"changed\n").hexdigest(), 8))
+
+    def test_iter_digests_keeps_order_and_reports_errors(self):
+        paths = [os.path.join(self.tmp, name) for name in ["d/sub/b.txt", "missing", "d/a.bin"]]
+        results = list(iter_digests(paths, jobs=2))
+        self.assertEqual([path for path, *_ in results], paths)
+        self.assertIsInstance(results[1][3], FileNotFoundError)
+        self.assertEqual(results[2][1], self.expected("d/a.bin"))
+
+    def test_hashsum_command(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.hashsum(["d"], flag_r=True)
+        self.assertEqual(sorted(out.getvalue().splitlines()),
+                         sorted(f"{self.expected(name)}  {name}" for name in self.data))
+
+        with redirect_stdout(StringIO()) as out:
+            self.commands.hashsum(["d"])
+        self.assertIn("d is a directory", out.getvalue())
+        self.assertFalse(self.core.logs[-1][1])
+
+    def test_hashsum_in_pipeline(self):
+        parser = ShellParser(self.core)
+        with redirect_stdout(StringIO()) as out:
+            parser.execute(["find", "d", "--type", "f", "|", "hashsum", "--algo", "blake2b"])
+        self.assertEqual(sorted(out.getvalue().splitlines()),
+                         sorted(f"{self.expected(name, 'blake2b')}  {name}" for name in self.data))
+
+
+class MoveEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "src")
+        os.makedirs(os.path.join(self.src, "a"))
+        for name in ["f1.txt", "a/f2.txt", "a/f3.txt"]:
+            with open(os.path.join(self.src, name), "w") as f:
+                f.write(name * 100)
+        os.symlink("f1.txt", os.path.join(self.src, "link"))
+        self.journal = MoveJournal(os.path.join(self.tmp, ".moves"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def snapshot(self, root):
+        result = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path):
+                    result[os.path.relpath(path, root)] = ("link", os.readlink(path))
+                else:
+                    with open(path) as f:
+                        result[os.path.relpath(path, root)] = f.read()
+        return result
+
+    def test_same_device_rename(self):
+        expected = self.snapshot(self.src)
+        dst = os.path.join(self.tmp, "dst")
+        self.assertEqual(move_path(self.src, dst, self.journal), "rename")
+        self.assertEqual(self.snapshot(dst), expected)
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_cross_device_move(self):
+        shm = "/dev/shm"
+        if not os.path.isdir(shm) or os.stat(shm).st_dev == os.stat(self.tmp).st_dev:
+            self.skipTest("no second filesystem")
+        expected = self.snapshot(self.src)
+        other = tempfile.mkdtemp(dir=shm)
+        try:
+            dst = os.path.join(other, "dst")
+            self.assertEqual(move_path(self.src, dst, self.journal, jobs=2, verify=True, show_progress=False), "copy")
+            self.assertFalse(os.path.exists(self.src))
+            self.assertEqual(self.snapshot(dst), expected)
+            self.assertEqual(os.listdir(other), ["dst"])
+            self.assertEqual(self.journal.pending(), [])
+        finally:
+            shutil.rmtree(other)
+
+    def test_resume_interrupted_move(self):
+        expected = self.snapshot(self.src)
+        dst = os.path.join(self.tmp, "dst")
+        record = {"id": "abc", "src": self.src, "dst": dst, "staging": staging_path(dst, "abc"),
+                  "is_dir": True, "verify": True, "state": "copying", "started": 0}
+        # Копирование оборвалось после первого файла
+        os.makedirs(record["staging"])
+        copy_file(os.path.join(self.src, "f1.txt"), os.path.join(record["staging"], "f1.txt"))
+        self.journal.save(record)
+
+        core = FakeCore(self.tmp)
+        with redirect_stdout(StringIO()):
+            ShellCommands(core).mv(resume=True)
+
+        self.assertFalse(os.path.exists(self.src))
+        self.assertFalse(os.path.exists(record["staging"]))
+        self.assertEqual(self.snapshot(dst), expected)
+        self.assertEqual(self.journal.pending(), [])
+        self.assertEqual(core.history[-1]["other_data"], {"src_path": self.src, "dst_path": dst})
+
+    def test_verify_mismatch_keeps_journal(self):
+        src = os.path.join(self.src, "f1.txt")
+        dst = os.path.join(self.tmp, "moved.txt")
+        record = {"id": "bad", "src": src, "dst": dst, "staging": staging_path(dst, "bad"),
+                  "is_dir": False, "verify": True, "state": "copying", "started": 0}
+        self.journal.save(record)
+        with patch("move_engine._same_content", return_value=False):
+            with self.assertRaises(OSError):
+                resume_move(record, self.journal, jobs=1, show_progress=False)
+
+        self.assertTrue(os.path.exists(src))
+        self.assertFalse(os.path.exists(dst))
+        self.assertFalse(os.path.exists(record["staging"]))
+        self.assertEqual(self.journal.pending()[0]["state"], "copying")
+
+    def test_chunked_copy(self):
+        src = os.path.join(self.tmp, "big.bin")
+        with open(src, "wb") as f:
+            f.write(os.urandom(300 * 1024 + 17))
+        dst = os.path.join(self.tmp, "big.copy")
+        self.assertEqual(copy_file_chunked(src, dst, jobs=4, chunk_size=64 * 1024), 300 * 1024 + 17)
+        with open(src, "rb") as a, open(dst, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+
+class TrashTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+        self.path = os.path.join(self.tmp, "file.txt")
+
+    def tearDown(self):
+        self.core.trash.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_rm_uses_rename(self):
+        self.write("data")
+        inode = os.stat(self.path).st_ino
+        self.commands.rm("file.txt")
+
+        trash_path = self.core.history[-1]["other_data"]["trash_path"]
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.stat(trash_path).st_ino, inode)
+
+    def test_same_name_in_one_second(self):
+        for text in ["first", "second"]:
+            self.write(text)
+            self.commands.rm("file.txt")
+
+        items = self.core.trash.list_items()
+        self.assertEqual(len(items), 2)
+        self.assertNotEqual(items[0]["trash_path"], items[1]["trash_path"])
+
+    def test_undo_restores_and_updates_index(self):
+        self.write("data")
+        self.commands.rm("file.txt")
+        self.commands.undo()
+
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(self.core.trash.list_items(), [])
+
+    def test_purge(self):
+        self.write("data")
+        self.commands.rm("file.txt")
+        trash_path = self.core.trash.list_items()[0]["trash_path"]
+
+        self.assertEqual(self.core.trash.purge(), 1)
+        self.assertFalse(os.path.exists(trash_path))
+
+    def test_rm_trash_dir(self):
+        self.commands.rm(".trash", True)
+        self.assertFalse(self.core.logs[-1][1])
+
+    def use_trash(self, **options):
+        self.core._trash = TrashManager(self.core.trash_dir, **options)
+        return self.core._trash
+
+    def test_compressed_file_restored_by_undo(self):
+        trash = self.use_trash(codec="lzma")
+        self.write("line\n" * 1000)
+        os.chmod(self.path, 0o640)
+        os.utime(self.path, (1000, 1000))
+        self.commands.rm("file.txt")
+
+        self.assertEqual(trash.maintain()["compressed"], 1)
+        item = trash.list_items()[0]
+        self.assertEqual(item["codec"], "lzma")
+        self.assertLess(item["stored_size"], item["size"])
+        self.assertFalse(os.path.exists(item["trash_path"]))
+
+        self.commands.undo()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "line\n" * 1000)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.stat(self.path).st_mtime, 1000)
+        self.assertEqual(os.listdir(self.core.trash_dir), [".index.db"])
+
+    def test_compressed_dir_restored_by_undo(self):
+        trash = self.use_trash()
+        os.makedirs(os.path.join(self.tmp, "d", "sub"))
+        with open(os.path.join(self.tmp, "d", "sub", "a.txt"), "w") as f:
+            f.write("a" * 5000)
+        os.symlink("sub/a.txt", os.path.join(self.tmp, "d", "link"))
+        self.commands.rm("d", True)
+
+        stats = trash.maintain()
+        self.assertEqual((stats["sized"], stats["compressed"]), (1, 1))
+        self.commands.undo()
+        with open(os.path.join(self.tmp, "d", "link")) as f:
+            self.assertEqual(f.read(), "a" * 5000)
+        self.assertEqual(os.readlink(os.path.join(self.tmp, "d", "link")), "sub/a.txt")
+
+    def test_tampered_archive_stays_inside_restore_dir(self):
+        import io
+        import tarfile
+        from trash import CODECS
+
+        trash = self.use_trash()
+        os.makedirs(os.path.join(self.tmp, "d"))
+        with open(os.path.join(self.tmp, "d", "a.txt"), "w") as f:
+            f.write("a" * 5000)
+        self.commands.rm("d", True)
+        trash.maintain()
+
+        item = trash.list_items()[0]
+        with tarfile.open(trash.stored_path(item), f"w:{CODECS[item['codec']][2]}") as tar:
+            root = tarfile.TarInfo(".")
+            root.type = tarfile.DIRTYPE
+            tar.addfile(root)
+            info = tarfile.TarInfo("../escape.txt")
+            info.size = 4
+            tar.addfile(info, io.BytesIO(b"evil"))
+        with redirect_stdout(StringIO()):
+            self.commands.undo()
+        self.assertFalse(self.core.logs[-1][1])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "escape.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "d")))
+
+    def test_quota_evicts_oldest_outside_grace(self):
+        trash = self.use_trash(quota=250, grace=60)
+        for _ in range(3):
+            with open(self.path, "wb") as f:
+                f.write(os.urandom(100))
+            self.commands.rm("file.txt")
+        # Самый новый объект ещё в пределах grace и не вытесняется
+        trash.db.execute("UPDATE items SET deleted_at = deleted_at - 120 WHERE id < 3")
+        self.assertEqual(trash.maintain()["evicted"], 1)
+        self.assertEqual([item["id"] for item in trash.list_items()], [3, 2])
+
+    def test_max_age(self):
+        trash = self.use_trash(max_age=3600, grace=60)
+        self.write("data")
+        self.commands.rm("file.txt")
+        self.assertEqual(trash.maintain()["expired"], 0)
+        self.assertEqual(trash.maintain(now=time.time() + 7200)["expired"], 1)
+        self.assertEqual(trash.list_items(), [])
+
+    def test_trash_command(self):
+        self.write("data")
+        self.commands.rm("file.txt")
+        out = StringIO()
+        with redirect_stdout(out):
+            self.commands.trash("ls")
+            self.commands.trash("stats")
+            self.commands.trash("purge")
+        self.assertIn(self.path, out.getvalue())
+        self.assertIn("items:      1", out.getvalue())
+        self.assertIn("Purged 1 item(s)", out.getvalue())
+
+
+class UndoRedoTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+        with open(os.path.join(self.tmp, "a.txt"), "w") as f:
+            f.write("a")
+
+    def tearDown(self):
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.tmp, name))
+
+    def test_undo_many_and_redo(self):
+        self.commands.cp("a.txt", "b.txt")
+        self.commands.mv("b.txt", "c.txt")
+        self.commands.rm("a.txt")
+
+        self.commands.undo(2)
+        self.assertTrue(self.exists("a.txt"))
+        self.assertTrue(self.exists("b.txt"))
+        self.assertFalse(self.exists("c.txt"))
+
+        self.commands.redo()
+        self.assertTrue(self.exists("c.txt"))
+        self.commands.redo()
+        self.assertFalse(self.exists("a.txt"))
+
+        self.commands.undo(3)
+        self.assertEqual(sorted(os.listdir(self.tmp)), [".operations", ".trash", "a.txt"])
+
+    def test_failed_undo_rolls_back_partial_changes(self):
+        with open(os.path.join(self.tmp, "b.txt"), "w") as f:
+            f.write("b")
+        self.commands.rm(["a.txt", "b.txt"])
+        # Отмена идёт с конца: b.txt возвращается, a.txt — нет, место занято
+        with open(os.path.join(self.tmp, "a.txt"), "w") as f:
+            f.write("new")
+        with redirect_stdout(StringIO()):
+            self.commands.undo()
+        self.assertFalse(self.core.logs[-1][1])
+        self.assertFalse(self.exists("b.txt"))
+        op = self.core.operations.last_done()
+        self.assertEqual(op["command"], "rm")
+        self.assertEqual(len(op["items"]), 2)
+
+        os.remove(os.path.join(self.tmp, "a.txt"))
+        self.commands.undo()
+        with open(os.path.join(self.tmp, "a.txt")) as f:
+            self.assertEqual(f.read(), "a")
+        self.assertTrue(self.exists("b.txt"))
+        self.assertIsNone(self.core.operations.last_done())
+
+    def test_failed_redo_rolls_back_partial_changes(self):
+        os.makedirs(os.path.join(self.tmp, "other"))
+        for name in ("b.txt", "c.txt"):
+            self.commands.cp("a.txt", name)
+        self.commands.mv(["b.txt", "c.txt"], "other")
+        self.commands.undo()
+        # Повтор идёт по порядку: b.txt переносится, c.txt — нет, место занято
+        with open(os.path.join(self.tmp, "other", "c.txt"), "w") as f:
+            f.write("busy")
+        with redirect_stdout(StringIO()):
+            self.commands.redo()
+        self.assertFalse(self.core.logs[-1][1])
+        self.assertTrue(self.exists("b.txt"))
+        self.assertTrue(self.exists("c.txt"))
+        op = self.core.operations.last_undone()
+        self.assertEqual(op["command"], "mv")
+        self.assertEqual(len(op["items"]), 2)
+
+        os.remove(os.path.join(self.tmp, "other", "c.txt"))
+        self.commands.redo()
+        self.assertFalse(self.exists("b.txt"))
+        self.assertTrue(self.exists("other/c.txt"))
+        self.assertIsNone(self.core.operations.last_undone())
+
+    def test_new_operation_clears_redo(self):
+        self.commands.cp("a.txt", "b.txt")
+        self.commands.undo()
+        self.commands.cp("a.txt", "c.txt")
+        self.assertIsNone(self.core.operations.last_undone())
+
+    def test_journal_survives_restart(self):
+        for i in range(20):
+            self.commands.cp("a.txt", f"copy_{i}.txt")
+        self.commands.undo()
+        self.core.operations.close()
+
+        journal = OperationJournal(self.core.operations.path, compact_every=5)
+        journal.load()
+        self.assertEqual(len(journal.done), 19)
+        self.assertEqual(journal.last_undone()["args"], ["a.txt", "copy_19.txt"])
+
+        for _ in range(10):
+            journal.mark_undone()
+            journal.mark_redone(journal.last_undone())
+        journal.close()
+        with open(journal.path) as f:
+            self.assertLess(len(f.readlines()), 20)
+        journal.load()
+        self.assertEqual(len(journal.done), 19)
+
+
+class GlobTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for name in ["a.py", "b.txt", ".hidden.py", "pkg/c.py", "pkg/sub/d.py", "pkg/sub/e.txt"]:
+            path = os.path.join(self.tmp, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_star_skips_hidden(self):
+        self.assertEqual(expand("*.py", self.tmp), ["a.py"])
+        self.assertEqual(expand(".*.py", self.tmp), [".hidden.py"])
+
+    def test_recursive(self):
+        self.assertEqual(expand("**/*.py", self.tmp),
+                         ["a.py", os.path.join("pkg", "c.py"), os.path.join("pkg", "sub", "d.py")])
+        self.assertEqual(expand("pkg/*/[de].txt", self.tmp), [os.path.join("pkg", "sub", "e.txt")])
+
+    def test_no_match_keeps_pattern(self):
+        self.assertEqual(expand("*.rs", self.tmp), ["*.rs"])
+
+
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.parser = ShellParser(self.core)
+        os.makedirs(os.path.join(self.tmp, "dst"))
+        for i in range(5):
+            with open(os.path.join(self.tmp, f"f{i}.txt"), "w") as f:
+                f.write(str(i))
+
+    def tearDown(self):
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def names(self, *parts):
+        return sorted(n for n in os.listdir(os.path.join(self.tmp, *parts)) if not n.startswith("."))
+
+    def test_rm_glob_is_one_operation(self):
+        self.assertTrue(self.parser.execute(["rm", "f*.txt"]))
+        self.assertEqual(self.names(), ["dst"])
+        self.assertEqual(len(self.core.history), 1)
+        self.assertEqual(len(self.core.operations.done), 1)
+
+        self.parser.execute(["undo"])
+        self.assertEqual(self.names(), ["dst"] + [f"f{i}.txt" for i in range(5)])
+
+    def test_cp_many_into_dir(self):
+        self.assertTrue(self.parser.execute(["cp", "f1.txt", "f2.txt", "dst"]))
+        self.assertEqual(self.names("dst"), ["f1.txt", "f2.txt"])
+        self.parser.execute(["undo"])
+        self.assertEqual(self.names("dst"), [])
+
+    def test_many_sources_need_dir(self):
+        with redirect_stdout(StringIO()):
+            self.assertFalse(self.parser.execute(["mv", "f1.txt", "f2.txt", "f3.txt"]))
+        self.assertEqual(self.names("dst"), [])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "f1.txt")))
+
+
+class SearchTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+        for d in range(6):
+            for f in range(5):
+                path = os.path.join(self.tmp, f"d{d}", "sub", f"f{f}.log" if f % 2 else f"f{f}.txt")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as fh:
+                    fh.write("ok\n" * f + ("ERROR here\n" if f == 3 else ""))
+
+    def tearDown(self):
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def test_walk_finds_everything(self):
+        found = sorted(shown for shown, _ in parallel_walk(self.tmp, ".", jobs=4))
+        self.assertEqual(len(found), 6 * 2 + 30)
+        self.assertIn(os.path.join(".", "d5", "sub", "f4.txt"), found)
+
+    def test_walk_reports_errors_and_continues(self):
+        errors = []
+        found = list(parallel_walk(os.path.join(self.tmp, "missing"), on_error=errors.append))
+        self.assertEqual(found, [])
+        self.assertIsInstance(errors[0], FileNotFoundError)
+
+    def test_find_filters(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.find(".", name="*.log", size="+0")
+        lines = out.getvalue().split()
+        self.assertEqual(len(lines), 12)
+        self.assertTrue(all(line.endswith(".log") for line in lines))
+
+        select = make_filter(kind="d")
+        self.assertEqual(len(list(parallel_walk(self.tmp, select=select))), 12)
+
+    def test_grep_file_line_numbers_and_mmap(self):
+        path = os.path.join(self.tmp, "d0", "sub", "f3.log")
+        expected = [(4, "ERROR here")]
+        self.assertEqual(grep_file(path, "error", ignore_case=True)[0], expected)
+        self.assertEqual(grep_file(path, "ERROR", mmap_threshold=1)[0], expected)
+
+    def test_grep_file_anchors_stay_within_lines(self):
+        path = os.path.join(self.tmp, "anchors.txt")
+        with open(path, "w") as f:
+            f.write("alpha\nbeta\n\nbetamax end\n")
+        for threshold in (1024 * 1024, 1):
+            with self.subTest(mmap_threshold=threshold):
+                self.assertEqual(grep_file(path, "^beta", mmap_threshold=threshold)[0],
+                                 [(2, "beta"), (4, "betamax end")])
+                self.assertEqual(grep_file(path, "a$", mmap_threshold=threshold)[0], [(1, "alpha"), (2, "beta")])
+                self.assertEqual(grep_file(path, "^$", mmap_threshold=threshold)[0], [(3, "")])
+                self.assertEqual(grep_file(path, r"a\s+b", mmap_threshold=threshold)[0], [])
+                self.assertEqual(grep_file(path, "ta[^x]*", mmap_threshold=threshold)[0],
+                                 [(2, "beta"), (4, "betamax end")])
+
+    def test_grep_process_pool(self):
+        files = [(str(i), os.path.join(self.tmp, f"d{i}", "sub", "f3.log")) for i in range(6)]
+        files.append(("missing", os.path.join(self.tmp, "missing")))
+        results = list(iter_grep(files, "ERROR", inline_files=1, batch_size=2, jobs=2))
+        self.assertEqual([r[0] for r in results], [str(i) for i in range(6)] + ["missing"])
+        self.assertTrue(all(r[1] == [(4, "ERROR here")] for r in results[:6]))
+        self.assertIsInstance(results[-1][3], FileNotFoundError)
+
+    def test_grep_command(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.grep("ERROR", ".", flag_r=True, names_only=True)
+        self.assertEqual(out.getvalue().count("f3.log"), 6)
+        self.assertTrue(self.core.logs[-1][1])
+
+
+class DuTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.commands = ShellCommands(self.core)
+        self.root = os.path.join(self.tmp, "tree")
+        for name, size in [("a/x", 100), ("a/b/y", 50), ("c/z", 7), ("top", 3)]:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+
+    def tearDown(self):
+        self.core.operations.close()
+        self.core.size_cache.close()
+        shutil.rmtree(self.tmp)
+
+    def test_totals(self):
+        totals, _, stats = dir_sizes(self.root)
+        self.assertEqual(totals[self.root], 160)
+        self.assertEqual(totals[os.path.join(self.root, "a")], 150)
+        self.assertEqual(stats["scanned"], 4)
+
+    def test_cache_reuses_unchanged_dirs(self):
+        cache = self.core.size_cache
+        dir_sizes(self.root, cache)
+        with open(os.path.join(self.root, "c", "new"), "wb") as f:
+            f.write(b"x" * 10)
+
+        totals, _, stats = dir_sizes(self.root, cache)
+        self.assertEqual(totals[self.root], 170)
+        self.assertEqual(stats, {"scanned": 1, "cached": 3})
+
+    def test_cp_invalidates_cache(self):
+        with redirect_stdout(StringIO()):
+            self.commands.du("tree", summarize=True)
+        # Перезапись файла не меняет mtime директории — запись сбрасывает сам cp
+        with open(os.path.join(self.tmp, "big"), "wb") as f:
+            f.write(b"x" * 1000)
+        self.commands.cp("big", os.path.join("tree", "a", "x"))
+
+        with redirect_stdout(StringIO()) as out:
+            self.commands.du("tree", summarize=True)
+        self.assertEqual(out.getvalue(), "1060\ttree\n")
+
+    def test_depth_and_human(self):
+        with redirect_stdout(StringIO()) as out:
+            self.commands.du("tree", depth=1)
+        self.assertEqual(out.getvalue().splitlines(), ["150\ttree/a", "7\ttree/c", "160\ttree"])
+        self.assertEqual(human_size(1536), "1.5K")
+        self.assertEqual(human_size(3 * 1024 ** 3), "3.0G")
+
+
+@handle_os_errors("sleepy")
+def sleepy(self):
+    self.core.cancel_event.wait(5)
+    self._check_cancel()
+
+
+class JobTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.parser = ShellParser(self.core)
+        os.makedirs(os.path.join(self.tmp, "other"))
+        with open(os.path.join(self.tmp, "a.txt"), "w") as f:
+            f.write("a")
+
+    def tearDown(self):
+        with redirect_stdout(StringIO()):
+            self.core.jobs.close()
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def test_background_job_keeps_its_directory(self):
+        with redirect_stdout(StringIO()) as out:
+            self.assertTrue(self.parser.execute(["cp", "a.txt", "b.txt", "&"]))
+            self.parser.execute(["cd", "other"])
+            self.parser.execute(["wait"])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "b.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "other", "b.txt")))
+        self.assertIn("[1] Done", out.getvalue())
+
+    def test_output_is_captured_until_finished(self):
+        with redirect_stdout(StringIO()) as out:
+            self.parser.execute(["cat", "a.txt&"])
+            job = self.core.jobs.get(1)
+            self.core.jobs.wait(1)
+            self.assertNotIn("a\n", out.getvalue())
+            self.assertIn("a", job.output.getvalue())
+            self.core.jobs.report()
+        self.assertIn("cat a.txt", out.getvalue())
+        # Показанная задача забывается
+        self.assertEqual(self.core.jobs.jobs, {})
+
+    def test_kill_cancels_cooperatively(self):
+        with patch.object(ShellCommands, "sleepy", sleepy, create=True), redirect_stdout(StringIO()):
+            job = self.core.jobs.submit("sleepy", "sleepy", {})
+            while not job.running:
+                pass
+            self.assertTrue(self.core.jobs.kill(job.id))
+            self.core.jobs.wait(job.id)
+        self.assertEqual(job.status, "Cancelled")
+        self.assertIn("cancelled", job.output.getvalue())
+
+    def test_cancelled_copy_is_undoable(self):
+        import threading
+
+        src = os.path.join(self.tmp, "tree")
+        os.makedirs(os.path.join(src, "sub"))
+        for i in range(5):
+            with open(os.path.join(src, "sub", f"f{i}"), "w") as f:
+                f.write("x")
+        self.core.cancel_event = threading.Event()
+        commands = ShellCommands(self.core)
+        commands._track = lambda progress: self.core.cancel_event.set()
+
+        with redirect_stdout(StringIO()):
+            commands.cp("tree", "copy", flag_r=True)
+        self.assertFalse(self.core.logs[-1][1])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "copy")))
+
+        self.core.cancel_event = None
+        commands.undo()
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "copy")))
+
+    def test_unknown_job(self):
+        with redirect_stdout(StringIO()) as out:
+            self.assertFalse(self.parser.execute(["wait", "7"]))
+        self.assertIn("no such job 7", out.getvalue())
+
+
+class ConcurrentHistoryTests(unittest.TestCase):
+    def test_history_add_from_threads(self):
+        import threading
+
+        tmp = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            core = System_Shell()
+
+            def worker(n):
+                for i in range(200):
+                    core.history_add("ls", [f"{n}-{i}"])
+
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            core.close()
+
+            self.assertEqual(len(core.history), 800)
+            self.assertEqual(HistoryStore(core.history_file).count(), 800)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp)
+
+    def test_history_in_memory_is_capped(self):
+        tmp = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with patch.dict("shell_core.HISTORY_CONFIG", load_entries=50):
+                core = System_Shell()
+                for i in range(120):
+                    core.history_add("ls", [str(i)])
+                core.close()
+
+            self.assertEqual(len(core.history), 50)
+            self.assertEqual(core.history[0]["args"], ["70"])
+            self.assertEqual(HistoryStore(core.history_file).count(), 120)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp)
+
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.parser = ShellParser(self.core)
+        with open(os.path.join(self.tmp, "app.log"), "w") as f:
+            for i in range(1000):
+                f.write(f"{i} ERROR boom\n" if i % 10 == 0 else f"{i} INFO ok\n")
+
+    def tearDown(self):
+        self.core.operations.close()
+        shutil.rmtree(self.tmp)
+
+    def run_line(self, line):
+        with redirect_stdout(StringIO()) as out:
+            ok = self.parser.execute(line.split())
+        return ok, out.getvalue().splitlines()
+
+    def test_cat_grep_head(self):
+        ok, lines = self.run_line("cat app.log | grep ERROR | head 3")
+        self.assertTrue(ok)
+        self.assertEqual(lines, ["0 ERROR boom", "10 ERROR boom", "20 ERROR boom"])
+        self.assertEqual(self.core.history[-1]["command"], "cat")
+        self.assertEqual(len(self.core.history), 1)
+
+    def test_tail_and_line_numbers(self):
+        ok, lines = self.run_line("cat app.log | grep -n ERROR | tail -n 1")
+        self.assertEqual(lines, ["991:990 ERROR boom"])
+
+    def test_head_stops_reading_upstream(self):
+        consumed = []
+        closed = []
+
+        def source(stdin=None):
+            try:
+                for i in range(10 ** 9):
+                    consumed.append(i)
+                    yield str(i)
+            finally:
+                closed.append(True)
+
+        commands = ShellCommands(self.core)
+        commands.iter_source = source
+        with redirect_stdout(StringIO()) as out:
+            commands.pipeline([("source", "iter_source", {}), ("head", "iter_head", {"count": 5})],
+                              "source | head -n 5")
+        self.assertEqual(out.getvalue().split(), ["0", "1", "2", "3", "4"])
+        self.assertLessEqual(len(consumed), 6)
+        self.assertEqual(closed, [True])
+
+    def test_errors(self):
+        ok, lines = self.run_line("cat missing.log | head 2")
+        self.assertFalse(ok)
+        self.assertIn("cat:", lines[0])
+        self.assertFalse(self.run_line("cp a b | head")[0])
+        self.assertFalse(self.run_line("cat app.log | | head")[0])
+
+
+class CompletionTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for name in ["alpha.txt", "alps.log", "beta", ".hidden"]:
+            open(os.path.join(self.tmp, name), "w").close()
+        os.makedirs(os.path.join(self.tmp, "albums", "2024"))
+        self.core = FakeCore(self.tmp)
+        self.core.path_index = PathIndex(max_dirs=4, max_matches=100)
+        self.completer = Completer(self.core, COMMANDS, self.core.path_index)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_paths(self):
+        index = self.core.path_index
+        self.assertEqual(index.complete("al", self.tmp), ["albums/", "alpha.txt ", "alps.log "])
+        self.assertEqual(index.complete("albums/2", self.tmp), ["albums/2024/"])
+        self.assertEqual(index.complete(".h", self.tmp), [".hidden "])
+        self.assertNotIn(".hidden ", index.complete("", self.tmp))
+
+    def test_commands_and_flags(self):
+        self.assertEqual(self.completer.candidates("", 0, "gr"), ["grep "])
+        self.assertEqual(self.completer.candidates("cat a | he", 8, "he"), ["head "])
+        self.assertEqual(self.completer.candidates("mv --", 3, "--"), ["--jobs ", "--profile ", "--resume ", "--verify "])
+        self.assertEqual(self.completer.candidates("cat be", 4, "be"), ["beta "])
+
+    def test_mtime_invalidation(self):
+        index = self.core.path_index
+        self.assertEqual(index.complete("gam", self.tmp), [])
+        open(os.path.join(self.tmp, "gamma"), "w").close()
+        os.utime(self.tmp, ns=(0, os.stat(self.tmp).st_mtime_ns + 10 ** 9))
+        self.assertEqual(index.complete("gam", self.tmp), ["gamma "])
+
+    def test_updated_in_place_by_commands(self):
+        index = self.core.path_index
+        index.complete("", self.tmp)
+        with patch("completion.DirIndex.build") as build:
+            ShellCommands(self.core).mv("alpha.txt", "omega.txt")
+            ShellCommands(self.core).cp("albums", "copies", True)
+            self.assertEqual(index.complete("al", self.tmp), ["albums/", "alps.log "])
+            self.assertEqual(index.complete("o", self.tmp), ["omega.txt "])
+            self.assertEqual(index.complete("c", self.tmp), ["copies/"])
+            build.assert_not_called()
+
+    def test_truncated_matches_keep_common_prefix(self):
+        index = PathIndex(max_matches=10)
+        for i in range(50):
+            open(os.path.join(self.tmp, "albums", f"a{i}"), "w").close()
+        matches = index.complete("a", os.path.join(self.tmp, "albums"))
+        self.assertEqual(len(matches), 10)
+        self.assertEqual(os.path.commonprefix(matches), "a")
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.core = FakeCore(self.tmp)
+        self.core.metrics = Metrics(export_every=3)
+        self.exports = []
+        self.core.export_metrics = lambda: self.exports.append(self.core.metrics.snapshot())
+        self.parser = ShellParser(self.core)
+        with open(os.path.join(self.tmp, "a.txt"), "wb") as f:
+            f.write(b"x" * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for ms in range(1, 101):
+            histogram.add(ms / 1000)
+        self.assertAlmostEqual(histogram.percentile(0.5), 0.050, delta=0.050 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(0.95), 0.095, delta=0.095 * 0.05)
+        self.assertEqual(histogram.percentile(1.0), 0.1)
+
+    def test_commands_are_measured(self):
+        with redirect_stdout(StringIO()):
+            self.parser.execute(["cat", "a.txt"])
+            self.parser.execute(["cp", "a.txt", "b.txt"])
+            self.parser.execute(["cat", "missing.txt"])
+        snapshot = self.core.metrics.snapshot()
+
+        self.assertEqual((snapshot["cat"]["count"], snapshot["cat"]["errors"], snapshot["cat"]["bytes"]), (2, 1, 1000))
+        self.assertEqual((snapshot["cp"]["files"], snapshot["cp"]["bytes"]), (1, 1000))
+        self.assertEqual(set(snapshot["cp"]["phases"]), {"stat", "copy", "journal"})
+        # Третья команда — момент выгрузки в лог
+        self.assertEqual(len(self.exports), 1)
+
+    def test_stats_and_profile(self):
+        with redirect_stdout(StringIO()) as out:
+            self.parser.execute(["ls", "--profile"])
+        self.assertIn("function calls", out.getvalue())
+        with redirect_stdout(StringIO()) as out:
+            self.parser.execute(["stats", "--json"])
+        self.assertEqual(json.loads(out.getvalue())["ls"]["files"], 1)
+
+
+class DaemonTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for name in ["a", "b"]:
+            os.makedirs(os.path.join(self.tmp, name))
+            with open(os.path.join(self.tmp, name, f"{name}.txt"), "w") as f:
+                f.write(f"in {name}\n")
+        self.core = FakeCore(self.tmp)
+        self.server = ShellServer(self.core, os.path.join(self.tmp, "shell.sock"))
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def run_client(self, lines, **kwargs):
+        out = StringIO()
+        os.chdir(self.tmp)
+        try:
+            status = run_lines(self.server.socket_path, lines, out=out, **kwargs)
+        finally:
+            os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        return status, out.getvalue()
+
+    def test_session_cwd_and_status(self):
+        status, out = self.run_client(["cd a", "cat a.txt", "cat missing.txt"])
+        self.assertEqual(status, 1)
+        self.assertIn("in a", out)
+        self.assertIn("missing.txt", out)
+        # Новая сессия начинает в директории клиента
+        status, out = self.run_client(["cat b/b.txt"])
+        self.assertEqual(status, 0)
+        self.assertIn("in b", out)
+
+    def test_concurrent_sessions(self):
+        results = {}
+
+        def client(name):
+            results[name] = self.run_client([f"cd {name}"] + [f"cat {name}.txt"] * 20)
+
+        threads = [threading.Thread(target=client, args=(name,)) for name in ["a", "b"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name, other in [("a", "b"), ("b", "a")]:
+            status, out = results[name]
+            self.assertEqual(status, 0)
+            self.assertEqual(out.count(f"in {name}"), 20)
+            self.assertNotIn(f"in {other}", out)
+        self.assertEqual(len(self.core.history), 42)
+
+    def test_sessions_have_own_jobs(self):
+        status, out = self.run_client(["cat a/a.txt &", "wait"])
+        self.assertIn("[1] Done", out)
+        self.assertIsNone(self.core._jobs)
+        status, out = self.run_client(["jobs", "cat b/b.txt &"])
+        self.assertIn("No background jobs", out)
+        self.assertIn("[1] cat b/b.txt", out)
+
+    def test_shutdown_waits_for_running_session(self):
+        started = threading.Event()
+
+        def slow(commands):
+            started.set()
+            sleepy(commands)
+
+        with patch.dict(COMMANDS, sleepy=CommandSpec("sleepy")), \
+                patch.object(ShellCommands, "sleepy", slow, create=True):
+            results = []
+            client = threading.Thread(target=lambda: results.append(self.run_client(["sleepy", "cat a/a.txt"])))
+            client.start()
+            self.assertTrue(started.wait(5))
+            begin = time.monotonic()
+            self.server.shutdown()
+            self.server.server_close()
+            self.assertLess(time.monotonic() - begin, 4)
+            self.assertEqual(self.server.handlers, {})
+            client.join(5)
+        self.assertEqual(results[0][0], 1)
+        self.assertFalse(self.core.logs[-1][1])
+        self.assertEqual(self.core.logs[-1][0], "sleepy")
+
+    def test_confirmation_requires_yes(self):
+        status, out = self.run_client(["rm -r a"])
+        self.assertIn("connect with -y", out)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "a")))
+        self.run_client(["rm -r a"], assume_yes=True)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "a")))
+        self.core.trash.close()
+
+
+class LogQueryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "shell.log")
+        lines = []
+        for i in range(3000):
+            stamp = f"2025-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+            # По две записи в секунду, каждая пятая — ошибка, иногда многострочная
+            for j in range(2):
+                command = ["ls", "cp a b", "rm x"][(i + j) % 3]
+                if (i + j) % 5:
+                    lines.append(f"[{stamp}] {command} - SUCCESS\n")
+                else:
+                    lines.append(f"[{stamp}] {command} - ERROR: boom {i}\ntraceback line\n")
+        with open(self.path, "w") as f:
+            f.writelines(lines)
+        with open(self.path, "rb") as f:
+            self.records = list(logquery.iter_records(f.read(), 0, os.path.getsize(self.path)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def linear(self, since=None, until=None):
+        return [raw for raw in self.records
+                if (since is None or raw[1:20] >= since) and (until is None or raw[1:20] <= until)]
+
+    def test_time_range_matches_linear_scan(self):
+        for index in [False, True]:
+            for since, until in [(b"2025-01-01 00:10:00", b"2025-01-01 00:10:05"),
+                                 (b"2024-12-31 23:00:00", b"2025-01-01 00:00:01"),
+                                 (b"2025-01-01 00:49:59", None),
+                                 (b"2025-01-02 00:00:00", None)]:
+                records, _ = logquery.query(self.path, since, until, index=index)
+                self.assertEqual(records, self.linear(since, until))
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+
+    def test_filters_and_last(self):
+        records, _ = logquery.query(self.path, command="cp", status="ERROR", last=3)
+        expected = [raw for raw in self.records
+                    if raw[22:].startswith(b"cp ") and b" - ERROR" in raw][-3:]
+        self.assertEqual(records, expected)
+        self.assertIn(b"traceback line", records[-1])
+
+    def test_index_extends_when_log_grows(self):
+        logquery.query(self.path, since=b"2025-01-01 00:00:00")
+        with open(self.path, "a") as f:
+            f.write("[2025-01-02 00:00:00] cd / - SUCCESS\n")
+        records, _ = logquery.query(self.path, since=b"2025-01-02 00:00:00")
+        self.assertEqual(records, [b"[2025-01-02 00:00:00] cd / - SUCCESS\n"])
+
+    def test_json_record(self):
+        record = json.loads(logquery.format_record(self.records[0], as_json=True))
+        self.assertEqual(record["time"], "2025-01-01T00:00:00")
+        self.assertEqual((record["command"], record["status"]), ("ls", "ERROR"))
+        self.assertEqual(record["error"], "boom 0\ntraceback line")
+
+    def test_follow_and_rotation(self):
+        cancel = threading.Event()
+        _, offset = logquery.query(self.path)
+        seen = []
+
+        def reader():
+            for raw in logquery.follow(self.path, offset, status="SUCCESS", interval=0.01, cancel=cancel):
+                seen.append(raw)
+                if len(seen) == 2:
+                    cancel.set()
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        with open(self.path, "a") as f:
+            f.write("[2025-01-02 00:00:00] cd a - SUCCESS\n[2025-01-02 00:00:01] cd b - ERROR: no\n")
+        time.sleep(0.05)
+        os.rename(self.path, self.path + ".1")
+        with open(self.path, "w") as f:
+            f.write("[2025-01-02 00:00:02] cd c - SUCCESS\n")
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([raw[22:26] for raw in seen], [b"cd a", b"cd c"])
+
+    def test_command(self):
+        core = FakeCore(self.tmp)
+        core.log_file = self.path
+        out = StringIO()
+        with redirect_stdout(out):
+            ShellCommands(core).log(since="2025-01-01T00:00:01", until="2025-01-01T00:00:01", as_json=True)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        self.assertEqual(core.history[-1]["args"],
+                         ["--since", "2025-01-01T00:00:01", "--until", "2025-01-01T00:00:01", "--json"])
+
+
+class RegistryTests(unittest.TestCase):
+    def test_combined_flags_and_option(self):
+        kwargs = COMMANDS["ls"].parse(["-lS", "--limit=5", "src"])
+        self.assertEqual(kwargs, {"flag_l": True, "sort_by": "size", "limit": 5, "path": "src"})
+
+    def test_option_with_separate_value(self):
+        kwargs = COMMANDS["cp"].parse(["-r", "a", "b", "--jobs", "4"])
+        self.assertEqual(kwargs, {"flag_r": True, "src": ["a"], "dst": "b", "jobs": 4})
+
+    def test_variadic_sources(self):
+        kwargs = COMMANDS["cp"].parse(["a", "b", "-r", "dir"])
+        self.assertEqual(kwargs, {"src": ["a", "b"], "dst": "dir", "flag_r": True})
+        self.assertEqual(COMMANDS["rm"].parse(["x", "y"]), {"file": ["x", "y"]})
+
+    def test_glob_only_named_arguments(self):
+        expand = lambda values: [v.replace("*", "1") for v in values]
+        kwargs = COMMANDS["grep"].parse(["-rn", "a*", "f*"], expand)
+        self.assertEqual(kwargs, {"flag_r": True, "line_numbers": True, "pattern": "a*", "path": ["f1"]})
+
+    def test_arity_error(self):
+        with self.assertRaises(UsageError):
+            COMMANDS["mv"].parse(["a"])
+
+    def test_flag_without_positionals(self):
+        self.assertEqual(COMMANDS["mv"].parse(["--resume"]), {"resume": True})
+        with self.assertRaises(UsageError):
+            COMMANDS["mv"].parse(["--resume", "a"])
+
+    def test_invalid_value(self):
+        with self.assertRaises(UsageError):
+            COMMANDS["undo"].parse(["zero"])
+
+    def test_history_arguments(self):
+        self.assertEqual(COMMANDS["history"].parse(["10"]), {"action": 10})
+        self.assertEqual(COMMANDS["history"].parse(["grep", "cp", "--failed", "-n", "3"]),
+                         {"action": "grep", "pattern": "cp", "failed": True, "last": 3})
+        with self.assertRaises(UsageError):
+            COMMANDS["history"].parse(["find"])
+
+    def test_methods_exist(self):
+        for spec in COMMANDS.values():
+            self.assertTrue(callable(getattr(ShellCommands, spec.method)))
+
+
+class ScriptModeTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.parser = ShellParser(FakeCore(self.tmp))
+        with open(os.path.join(self.tmp, "a.txt"), "w") as f:
+            f.write("a")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_script(self, lines, fail_fast=False):
+        with redirect_stdout(StringIO()), patch("sys.stderr", StringIO()) as err:
+            code = self.parser.run_script(lines, fail_fast)
+        return code, err.getvalue()
+
+    def test_script_runs_all_commands(self):
+        code, summary = self.run_script(["# comment", "cp a.txt b.txt", "", "cat b.txt", "exit", "ls"])
+        self.assertEqual(code, 0)
+        self.assertIn("2 commands, 0 failed", summary)
+
+    def test_fail_fast(self):
+        code, summary = self.run_script(["cat missing.txt", "cp a.txt b.txt"], fail_fast=True)
+        self.assertEqual(code, 1)
+        self.assertIn("Stopped at line 1", summary)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "b.txt")))
+
+
+class JsonLinesFileTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, ".operations")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_append_read_and_rewrite(self):
+        journal = JsonLinesFile(self.path)
+        for i in range(50):
+            journal.append({"event": "do", "id": i})
+        journal.close()
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 50)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"event": "do", "id"')
+
+        journal = JsonLinesFile(self.path)
+        self.assertEqual([r["id"] for r in journal.read_all()], list(range(50)))
+        journal.rewrite([{"event": "snapshot"}])
+        journal.append({"event": "undo"})
+        journal.close()
+        self.assertEqual([r["event"] for r in journal.read_all()], ["snapshot", "undo"])
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, ".history.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def fill(self, store):
+        for i in range(30):
+            store.append({
+                "time": f"2025-10-{1 + i // 10:02d}T12:00:{i:02d}",
+                "command": "cp" if i % 3 else "rm",
+                "args": [f"src/file_{i}.txt", "backup"],
+                "status": i % 7 != 0,
+            })
+
+    def test_search(self):
+        store = HistoryStore(self.path)
+        self.fill(store)
+
+        self.assertEqual([r["args"][0] for r in store.load_tail(2)], ["src/file_28.txt", "src/file_29.txt"])
+        self.assertEqual([r["id"] for r in store.search("FILE_2", limit=3)], [28, 29, 30])
+        self.assertEqual([r["id"] for r in store.search("rm src", failed=True)], [1, 22])
+        self.assertEqual(len(store.search("_1", limit=None)), 11)
+        self.assertEqual([r["id"] for r in store.search(since="2025-10-03T12:00:25")], list(range(26, 31)))
+        self.assertEqual(store.search("x%y"), [])
+        store.close()
+
+    def test_legacy_migration(self):
+        legacy = os.path.join(self.tmp, ".history")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([{"time": "2025-10-01T10:00:00", "command": "cd", "args": [".."]},
+                       {"time": "2025-10-01T10:00:01", "command": "ls", "args": [], "status": False}], f)
+
+        store = HistoryStore(self.path)
+        self.assertEqual(store.migrate_legacy(legacy), 2)
+        self.assertFalse(os.path.exists(legacy))
+        self.assertEqual(store.migrate_legacy(legacy), 0)
+        self.assertEqual([r["command"] for r in store.search(failed=True)], ["ls"])
+        store.close()
+
+    def test_history_command(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        try:
+            with open(".history", "w", encoding="utf-8") as f:
+                f.write(json.dumps({"time": "2025-10-01T10:00:00", "command": "cat", "args": ["notes.txt"]}) + "\n")
+            core = System_Shell()
+            parser = ShellParser(core)
+            with redirect_stdout(StringIO()):
+                parser.execute(["cat", "missing.txt"])
+            with redirect_stdout(StringIO()) as out:
+                parser.execute(["history", "grep", "txt"])
+                parser.execute(["history", "--failed"])
+            core.close()
+        finally:
+            os.chdir(cwd)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "1 SUCCESS [2025-10-01 10:00:00] cat notes.txt")
+        self.assertTrue(lines[1].startswith("2 ERROR ") and lines[1].endswith("cat missing.txt"))
+        self.assertEqual(lines[2], lines[1])
+
+
+class LogPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "shell.log")
+        self.logger = logging.getLogger(f"test_pipeline_{id(self)}")
+        self.logger.propagate = False
+        self.handler = GzipRotatingFileHandler(
+            self.path, maxBytes=1024, backupCount=3, encoding="utf-8", compress=True
+        )
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.handler.close()
+        shutil.rmtree(self.tmp)
+
+    def test_flush_on_stop(self):
+        pipeline = LogPipeline(self.logger, batch_size=10)
+        for i in range(100):
+            self.logger.warning(f"ls {i} - SUCCESS")
+        pipeline.stop()
+
+        self.assertEqual(pipeline.stats()["written"], 100)
+        self.assertEqual(pipeline.stats()["dropped"], 0)
+        self.assertIn(self.handler, self.logger.handlers)
+
+    def test_queue_counters_from_threads(self):
+        from log_pipeline import BoundedQueueHandler
+
+        full = queue.Queue(1)
+        full.put(None)
+        handler = BoundedQueueHandler(full, put_timeout=0)
+        record = logging.makeLogRecord({"msg": "ls"})
+
+        def worker():
+            for _ in range(500):
+                handler.enqueue(record)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((handler.delayed, handler.dropped), (4000, 4000))
+
+    def test_setup_logging_ignores_cwd(self):
+        other = os.path.join(self.tmp, "other")
+        os.makedirs(other)
+        cwd = os.getcwd()
+        os.chdir(other)
+        try:
+            logger = setup_logging(os.path.join(self.tmp, "abs.log"))
+            add_log(logger, "cd other")
+        finally:
+            os.chdir(cwd)
+            for handler in list(logger.handlers):
+                handler.close()
+                logger.removeHandler(handler)
+        with open(os.path.join(self.tmp, "abs.log"), encoding="utf-8") as f:
+            self.assertIn("cd other - SUCCESS", f.read())
+        self.assertEqual(os.listdir(other), [])
+
+    def test_rotation_with_gzip(self):
+        pipeline = LogPipeline(self.logger)
+        for i in range(200):
+            self.logger.warning(f"cp file_{i} dst - SUCCESS")
+        pipeline.stop()
+
+        self.assertTrue(os.path.exists(self.path + ".1.gz"))
+        self.assertLessEqual(os.path.getsize(self.path), 1024)
+
 if __name__ == "__main__":
     unittest.main()